@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for core.app hot paths against a fake Docker client
+
+    python -m benchmarks.bench_app --fleet-size 100 --latency-ms 1 --save-baseline
+    python -m benchmarks.bench_app --fleet-size 100 --latency-ms 1 --compare
+
+Exits with status 1 when --compare finds a benchmark slower than the baseline
+by more than --tolerance.
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.harness import FakeFleet, measure, save_baseline, load_baseline, compare
+
+
+def build_app(fleet, tracked_fraction):
+    import core.app as app_module
+
+    flask_app = app_module.create_app({
+        'TESTING': True,
+        'DOCKER_CLIENT': fleet.client,
+        'START_SERVICES': False,
+        'CONTAINER_STATE_DB': None,
+        'LOG_LEVEL': 'WARNING'
+    })
+    app_module.active_containers.replace_all(fleet.records(tracked_fraction))
+    return app_module, flask_app.test_client()
+
+
+def benchmarks(app_module, test_client, fleet, tracked_fraction):
+    """Benchmark name -> zero-argument callable"""
+    exec_id = fleet.ids[0]
+
+    def reset_tracking():
+        app_module.active_containers.replace_all(fleet.records(tracked_fraction))
+
+    def list_containers():
+        assert test_client.get('/api/containers').status_code == 200
+
+    def container_stats():
+        assert test_client.get('/api/containers/stats').status_code == 200
+
+    def find_available_port():
+        app_module.find_available_port(11001, 12000 + fleet.size)
+
+    def handle_existing_containers():
+        app_module.handle_existing_containers()
+        reset_tracking()
+
+    def exec_command():
+        response = test_client.post(f'/api/containers/{exec_id}/exec', json={'command': 'cat output.txt'})
+        assert response.status_code == 200
+
+    return {
+        'list_containers': list_containers,
+        'container_stats': container_stats,
+        'find_available_port': find_available_port,
+        'handle_existing_containers': handle_existing_containers,
+        'exec_command': exec_command
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark core.app hot paths against a fake Docker client")
+    parser.add_argument('--fleet-size', type=int, default=50, help="Containers on the fake host")
+    parser.add_argument('--tracked-fraction', type=float, default=0.5,
+                        help="Fraction of the fleet tracked by the manager; the rest are inspected per request")
+    parser.add_argument('--latency-ms', type=float, default=1.0, help="Simulated time per Docker API call")
+    parser.add_argument('--exec-output-bytes', type=int, default=64 * 1024, help="Size of exec output")
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', action='append', help="Run only the named benchmark (repeatable)")
+    parser.add_argument('--baseline', default='default', help="Baseline name under benchmarks/baselines/")
+    parser.add_argument('--save-baseline', action='store_true', help="Save results as the baseline")
+    parser.add_argument('--compare', action='store_true', help="Compare results with the saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown before flagging, 0.2 = 20%%")
+    args = parser.parse_args(argv)
+
+    fleet = FakeFleet(args.fleet_size, args.latency_ms / 1000, args.exec_output_bytes)
+    app_module, test_client = build_app(fleet, args.tracked_fraction)
+    cases = benchmarks(app_module, test_client, fleet, args.tracked_fraction)
+    if args.only:
+        unknown = set(args.only) - set(cases)
+        if unknown:
+            parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        cases = {name: func for name, func in cases.items() if name in args.only}
+
+    settings = {
+        'fleet_size': args.fleet_size,
+        'tracked_fraction': args.tracked_fraction,
+        'latency_ms': args.latency_ms,
+        'exec_output_bytes': args.exec_output_bytes
+    }
+    print(f"Fleet of {args.fleet_size} containers, {args.latency_ms} ms per Docker call, {args.rounds} rounds")
+    print(f"{'benchmark':<28}{'median ms':>12}{'p95 ms':>12}{'docker calls':>14}")
+
+    results = {}
+    for name, func in cases.items():
+        calls_before = fleet.calls
+        func()
+        calls = fleet.calls - calls_before
+        stats = measure(func, args.rounds, args.warmup)
+        stats['docker_calls'] = calls
+        results[name] = stats
+        print(f"{name:<28}{stats['median_ms']:>12.3f}{stats['p95_ms']:>12.3f}{calls:>14}")
+
+    status = 0
+    if args.compare:
+        baseline = load_baseline(args.baseline)
+        if baseline is None:
+            print(f"No baseline named {args.baseline}; run with --save-baseline first")
+            status = 1
+        else:
+            if baseline.get('settings') != settings:
+                print(f"Warning: baseline was recorded with different settings: {baseline.get('settings')}")
+            regressions = compare(results, baseline, args.tolerance)
+            for name, before, after, ratio in regressions:
+                print(f"REGRESSION {name}: median {before:.3f} ms -> {after:.3f} ms ({ratio}x)")
+            if regressions:
+                status = 1
+            else:
+                print(f"No regressions beyond {args.tolerance:.0%} against baseline {args.baseline}")
+
+    if args.save_baseline:
+        print(f"Saved baseline to {save_baseline(args.baseline, results, settings)}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
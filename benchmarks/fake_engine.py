@@ -0,0 +1,710 @@
+#!/usr/bin/env python3
+"""
+Fake Docker Engine API server for end-to-end load testing
+
+Serves the Engine API endpoints the manager uses from an in-memory model of
+thousands of containers, over TCP or a unix socket:
+
+    python -m benchmarks.fake_engine --port 2375 --containers 2000 --latency-ms 2
+    DOCKER_HOST=tcp://127.0.0.1:2375 python run.py --no-debug
+
+Nothing is executed: exec returns the text of `echo` commands and a fixed-size
+payload for anything else.
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import base64
+import struct
+import tarfile
+import argparse
+import threading
+import socketserver
+import http.server
+import urllib.parse
+from datetime import datetime, timezone
+
+API_VERSION = '1.41'
+
+# Requests may carry a version prefix like /v1.41/containers/json
+VERSION_PREFIX = re.compile(r'^/v\d+\.\d+')
+
+
+def _timestamp(seconds=None):
+    moment = datetime.fromtimestamp(seconds if seconds is not None else time.time(), timezone.utc)
+    return moment.isoformat().replace('+00:00', 'Z')
+
+
+class EngineState:
+    """In-memory containers, execs, networks and volumes"""
+
+    def __init__(self, containers=1000, exec_output_bytes=1024, name_prefix='ai-container-'):
+        self.lock = threading.Lock()
+        self.containers = {}
+        self.names = {}
+        self.execs = {}
+        self.networks = {}
+        self.volumes = {}
+        self.subscribers = []
+        self.exec_output = b'x' * exec_output_bytes
+        self.next_port = 11001
+        self.started_at = time.time()
+        for _ in range(containers):
+            self.create_container(f"{name_prefix}{uuid.uuid4().hex[:12]}", {'Image': 'ai-container-image:latest'}, start=True)
+
+    def _allocate_port_bindings(self, host_config):
+        bindings = dict(host_config.get('PortBindings') or {})
+        if not bindings:
+            bindings = {'22/tcp': [{'HostIp': '', 'HostPort': str(self.next_port)}]}
+            self.next_port += 1
+        return bindings
+
+    def create_container(self, name, config, start=False):
+        container_id = uuid.uuid4().hex + uuid.uuid4().hex
+        name = name or f"fake_{container_id[:8]}"
+        host_config = config.get('HostConfig') or {}
+        now = time.time()
+        container = {
+            'Id': container_id,
+            'Name': f"/{name}",
+            'Created': _timestamp(now),
+            'Image': config.get('Image'),
+            'State': {
+                'Status': 'created',
+                'Running': False,
+                'Paused': False,
+                'ExitCode': 0,
+                'StartedAt': '0001-01-01T00:00:00Z',
+                'FinishedAt': '0001-01-01T00:00:00Z'
+            },
+            'Config': {
+                'Image': config.get('Image'),
+                'Cmd': config.get('Cmd'),
+                'Env': config.get('Env') or [],
+                'Labels': config.get('Labels') or {},
+                'Hostname': container_id[:12]
+            },
+            'HostConfig': dict(host_config, PortBindings=self._allocate_port_bindings(host_config)),
+            'NetworkSettings': {
+                'IPAddress': '',
+                'Networks': {'bridge': {'IPAddress': '', 'Aliases': None, 'NetworkID': 'bridge'}},
+                'Ports': {}
+            },
+            'Mounts': []
+        }
+        with self.lock:
+            if name in self.names:
+                raise ValueError(f'Conflict. The container name "/{name}" is already in use')
+            self.containers[container_id] = container
+            self.names[name] = container_id
+        self.publish('create', container)
+        if start:
+            self.set_status(container_id, 'running')
+        return container
+
+    def find(self, ref):
+        with self.lock:
+            if ref in self.containers:
+                return self.containers[ref]
+            container_id = self.names.get(ref.lstrip('/'))
+            if container_id:
+                return self.containers[container_id]
+            matches = [c for c in self.containers.values() if c['Id'].startswith(ref)]
+        return matches[0] if len(matches) == 1 else None
+
+    def set_status(self, container_id, status):
+        with self.lock:
+            container = self.containers[container_id]
+            state = container['State']
+            state['Status'] = status
+            state['Running'] = status in ('running', 'paused')
+            state['Paused'] = status == 'paused'
+            if status == 'running':
+                state['StartedAt'] = _timestamp()
+                address = f"172.17.{(len(self.containers) // 250) % 250}.{len(self.containers) % 250 + 2}"
+                container['NetworkSettings']['IPAddress'] = address
+                container['NetworkSettings']['Networks']['bridge']['IPAddress'] = address
+            elif status == 'exited':
+                state['FinishedAt'] = _timestamp()
+        action = {'running': 'start', 'exited': 'die', 'paused': 'pause'}.get(status, status)
+        self.publish(action, container)
+
+    def remove(self, container_id):
+        with self.lock:
+            container = self.containers.pop(container_id, None)
+            if container is not None:
+                self.names.pop(container['Name'].lstrip('/'), None)
+        if container is not None:
+            self.publish('destroy', container)
+        return container
+
+    def list(self, all_containers=False, filters=None):
+        filters = filters or {}
+        with self.lock:
+            containers = list(self.containers.values())
+        result = []
+        for container in containers:
+            name = container['Name'].lstrip('/')
+            status = container['State']['Status']
+            if not all_containers and status != 'running':
+                continue
+            if filters.get('name') and not any(re.search(pattern, name) for pattern in filters['name']):
+                continue
+            if filters.get('id') and not any(container['Id'].startswith(value) for value in filters['id']):
+                continue
+            if filters.get('status') and status not in filters['status']:
+                continue
+            if filters.get('label') and not all(self._has_label(container, label) for label in filters['label']):
+                continue
+            result.append(self.summary(container))
+        return result
+
+    @staticmethod
+    def _has_label(container, label):
+        key, _, value = label.partition('=')
+        labels = container['Config']['Labels']
+        return key in labels and (not value or labels[key] == value)
+
+    @staticmethod
+    def summary(container):
+        ports = []
+        for port, bindings in (container['HostConfig'].get('PortBindings') or {}).items():
+            private, _, protocol = port.partition('/')
+            for binding in bindings or []:
+                ports.append({'PrivatePort': int(private), 'PublicPort': int(binding.get('HostPort') or 0),
+                              'Type': protocol or 'tcp', 'IP': '0.0.0.0'})
+        return {
+            'Id': container['Id'],
+            'Names': [container['Name']],
+            'Image': container['Image'],
+            'Command': ' '.join(container['Config'].get('Cmd') or []),
+            'Created': int(datetime.fromisoformat(container['Created'].replace('Z', '+00:00')).timestamp()),
+            'State': container['State']['Status'],
+            'Status': container['State']['Status'],
+            'Ports': ports,
+            'Labels': container['Config']['Labels']
+        }
+
+    def publish(self, action, container):
+        event = {
+            'Type': 'container',
+            'status': action,
+            'id': container['Id'],
+            'Action': action,
+            'Actor': {'ID': container['Id'], 'Attributes': {'name': container['Name'].lstrip('/')}},
+            'time': int(time.time()),
+            'timeNano': time.time_ns()
+        }
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def exec_output_for(self, cmd):
+        """Output of a fake exec: the text of echo commands, a fixed payload otherwise"""
+        if isinstance(cmd, list):
+            cmd = cmd[-1] if cmd else ''
+        match = re.match(r'^\s*echo\s+(.*)$', cmd or '')
+        if match:
+            return (match.group(1).strip('\'"') + '\n').encode('utf-8')
+        return self.exec_output
+
+
+class EngineHandler(http.server.BaseHTTPRequestHandler):
+    """Routes Engine API requests to the shared EngineState"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeDockerEngine/1.0'
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per call
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ('GET', r'/_ping', 'ping'),
+        ('HEAD', r'/_ping', 'ping'),
+        ('GET', r'/version', 'version'),
+        ('GET', r'/info', 'info'),
+        ('GET', r'/events', 'events'),
+        ('GET', r'/system/df', 'system_df'),
+        ('GET', r'/containers/json', 'list_containers'),
+        ('POST', r'/containers/create', 'create_container'),
+        ('GET', r'/containers/(?P<ref>[^/]+)/json', 'inspect_container'),
+        ('POST', r'/containers/(?P<ref>[^/]+)/(?P<action>start|stop|restart|kill|pause|unpause)', 'container_action'),
+        ('POST', r'/containers/(?P<ref>[^/]+)/wait', 'wait_container'),
+        ('GET', r'/containers/(?P<ref>[^/]+)/stats', 'container_stats'),
+        ('DELETE', r'/containers/(?P<ref>[^/]+)', 'remove_container'),
+        ('GET', r'/containers/(?P<ref>[^/]+)/archive', 'get_archive'),
+        ('HEAD', r'/containers/(?P<ref>[^/]+)/archive', 'get_archive'),
+        ('PUT', r'/containers/(?P<ref>[^/]+)/archive', 'put_archive'),
+        ('POST', r'/containers/(?P<ref>[^/]+)/exec', 'create_exec'),
+        ('POST', r'/exec/(?P<exec_id>[^/]+)/start', 'start_exec'),
+        ('GET', r'/exec/(?P<exec_id>[^/]+)/json', 'inspect_exec'),
+        ('GET', r'/networks', 'list_networks'),
+        ('POST', r'/networks/create', 'create_network'),
+        ('POST', r'/networks/prune', 'prune_networks'),
+        ('GET', r'/networks/(?P<ref>[^/]+)', 'inspect_network'),
+        ('DELETE', r'/networks/(?P<ref>[^/]+)', 'remove_network'),
+        ('POST', r'/networks/(?P<ref>[^/]+)/(?P<action>connect|disconnect)', 'network_membership'),
+        ('GET', r'/volumes', 'list_volumes'),
+        ('POST', r'/volumes/create', 'create_volume'),
+        ('GET', r'/volumes/(?P<name>[^/]+)', 'inspect_volume'),
+        ('DELETE', r'/volumes/(?P<name>[^/]+)', 'remove_volume'),
+    ]
+    COMPILED = [(method, re.compile(f'^{pattern}$'), name) for method, pattern, name in ROUTES]
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _dispatch(self, method):
+        parsed = urllib.parse.urlsplit(self.path)
+        path = VERSION_PREFIX.sub('', parsed.path)
+        self.query = {key: values[-1] for key, values in urllib.parse.parse_qs(parsed.query).items()}
+        self.body = self._read_body()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        for route_method, pattern, name in self.COMPILED:
+            match = pattern.match(path)
+            if match and route_method == method:
+                try:
+                    return getattr(self, name)(**match.groupdict())
+                except Exception as e:
+                    return self._json({'message': str(e)}, 500)
+        self._json({'message': f'page not found: {method} {path}'}, 404)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _json_body(self):
+        return json.loads(self.body) if self.body else {}
+
+    def _json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Api-Version', API_VERSION)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def _empty(self, status=204):
+        self.send_response(status)
+        self.send_header('Api-Version', API_VERSION)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _not_found(self, kind, ref):
+        self._json({'message': f'No such {kind}: {ref}'}, 404)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_HEAD(self):
+        self._dispatch('HEAD')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    # System
+
+    def ping(self):
+        data = b'OK'
+        self.send_response(200)
+        self.send_header('Api-Version', API_VERSION)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def version(self):
+        self._json({'Version': '24.0.0-fake', 'ApiVersion': API_VERSION, 'MinAPIVersion': '1.12',
+                    'Os': 'linux', 'Arch': 'amd64'})
+
+    def info(self):
+        with self.state.lock:
+            containers = list(self.state.containers.values())
+        running = sum(1 for c in containers if c['State']['Status'] == 'running')
+        self._json({'Containers': len(containers), 'ContainersRunning': running,
+                    'ContainersStopped': len(containers) - running, 'NCPU': os.cpu_count(), 'Name': 'fake-engine'})
+
+    def system_df(self):
+        with self.state.lock:
+            volumes = [dict(volume, UsageData={'Size': 0, 'RefCount': 0}) for volume in self.state.volumes.values()]
+        self._json({'Volumes': volumes, 'Containers': [], 'Images': [], 'LayersSize': 0})
+
+    def events(self):
+        """Stream container events as JSON lines until `until` passes or the client leaves"""
+        until = float(self.query['until']) if 'until' in self.query else None
+        subscriber = queue.Queue(maxsize=10000)
+        with self.state.lock:
+            self.state.subscribers.append(subscriber)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Api-Version', API_VERSION)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            while until is None or time.time() < until:
+                try:
+                    event = subscriber.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                line = json.dumps(event).encode('utf-8') + b'\n'
+                self.wfile.write(f'{len(line):x}\r\n'.encode('ascii') + line + b'\r\n')
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self.state.lock:
+                self.state.subscribers.remove(subscriber)
+            self.close_connection = True
+
+    # Containers
+
+    def list_containers(self):
+        filters = json.loads(self.query.get('filters') or '{}')
+        # Filters are either {"name": ["x"]} or the older {"name": {"x": true}}
+        filters = {key: list(value) if isinstance(value, (dict, list)) else [value] for key, value in filters.items()}
+        self._json(self.state.list(self.query.get('all') in ('1', 'true', 'True'), filters))
+
+    def create_container(self):
+        try:
+            container = self.state.create_container(self.query.get('name'), self._json_body())
+        except ValueError as e:
+            return self._json({'message': str(e)}, 409)
+        self._json({'Id': container['Id'], 'Warnings': []}, 201)
+
+    def inspect_container(self, ref):
+        container = self.state.find(ref)
+        if container is None:
+            return self._not_found('container', ref)
+        self._json(container)
+
+    def container_action(self, ref, action):
+        container = self.state.find(ref)
+        if container is None:
+            return self._not_found('container', ref)
+        status = {'start': 'running', 'restart': 'running', 'unpause': 'running',
+                  'stop': 'exited', 'kill': 'exited', 'pause': 'paused'}[action]
+        self.state.set_status(container['Id'], status)
+        self._empty()
+
+    def wait_container(self, ref):
+        container = self.state.find(ref)
+        if container is None:
+            return self._not_found('container', ref)
+        self._json({'StatusCode': container['State']['ExitCode'], 'Error': None})
+
+    def container_stats(self, ref):
+        container = self.state.find(ref)
+        if container is None:
+            return self._not_found('container', ref)
+        # Counters that grow with time, so the sampler sees steady rates
+        elapsed = time.time() - self.state.started_at
+        self._json({
+            'read': _timestamp(time.time()),
+            'cpu_stats': {'cpu_usage': {'total_usage': int(elapsed * 2e8)},
+                          'system_cpu_usage': int(time.time() * 4e9), 'online_cpus': 4},
+            'memory_stats': {'usage': 64 * 1024 ** 2, 'limit': 2 * 1024 ** 3, 'stats': {'inactive_file': 8 * 1024 ** 2}},
+            'networks': {'eth0': {'rx_bytes': int(elapsed * 2048), 'tx_bytes': int(elapsed * 1024)}},
+            'blkio_stats': {'io_service_bytes_recursive': [{'op': 'read', 'value': int(elapsed * 4096)},
+                                                          {'op': 'write', 'value': int(elapsed * 8192)}]}
+        })
+
+    def remove_container(self, ref):
+        container = self.state.find(ref)
+        if container is None:
+            return self._not_found('container', ref)
+        if container['State']['Running'] and self.query.get('force') not in ('1', 'true', 'True'):
+            return self._json({'message': 'You cannot remove a running container. Stop the container before '
+                                          'attempting removal or force remove'}, 409)
+        self.state.remove(container['Id'])
+        self._empty()
+
+    def get_archive(self, ref):
+        """Serve a tar of one small file standing in for the requested path"""
+        container = self.state.find(ref)
+        if container is None:
+            return self._not_found('container', ref)
+        path = self.query.get('path', '/')
+        name = os.path.basename(path.rstrip('/')) or 'root'
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as archive:
+            info = tarfile.TarInfo(name)
+            info.size = len(self.state.exec_output)
+            info.mtime = time.time()
+            archive.addfile(info, io.BytesIO(self.state.exec_output))
+        data = buffer.getvalue()
+        stat = {'name': name, 'size': len(self.state.exec_output), 'mode': 0o644,
+                'mtime': _timestamp(), 'linkTarget': ''}
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-tar')
+        self.send_header('Api-Version', API_VERSION)
+        self.send_header('X-Docker-Container-Path-Stat', base64.b64encode(json.dumps(stat).encode()).decode())
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def put_archive(self, ref):
+        if self.state.find(ref) is None:
+            return self._not_found('container', ref)
+        self._empty(200)
+
+    # Exec
+
+    def create_exec(self, ref):
+        container = self.state.find(ref)
+        if container is None:
+            return self._not_found('container', ref)
+        if not container['State']['Running']:
+            return self._json({'message': f'Container {ref} is not running'}, 409)
+        exec_id = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.execs[exec_id] = {'config': self._json_body(), 'container': container['Id'],
+                                         'exit_code': None, 'running': False}
+        self._json({'Id': exec_id}, 201)
+
+    def start_exec(self, exec_id):
+        """
+        Run a fake exec and stream its output
+
+        Like the real engine, the response hijacks the connection: headers first,
+        then raw or multiplexed output, then the connection closes.
+        """
+        record = self.state.execs.get(exec_id)
+        if record is None:
+            return self._not_found('exec instance', exec_id)
+        options = self._json_body()
+        tty = options.get('Tty', record['config'].get('Tty', False))
+        output = self.state.exec_output_for(record['config'].get('Cmd'))
+
+        upgrade = self.headers.get('Upgrade', '').lower() == 'tcp'
+        self.send_response(101 if upgrade else 200)
+        self.send_header('Content-Type', 'application/vnd.docker.raw-stream' if tty
+                         else 'application/vnd.docker.multiplexed-stream')
+        self.send_header('Api-Version', API_VERSION)
+        if upgrade:
+            self.send_header('Connection', 'Upgrade')
+            self.send_header('Upgrade', 'tcp')
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        if options.get('Detach'):
+            record['exit_code'] = 0
+            return
+
+        # Output follows the headers after the command "runs"
+        time.sleep(self.server.exec_latency)
+        if tty:
+            self.wfile.write(output)
+        else:
+            self.wfile.write(struct.pack('>BxxxL', 1, len(output)) + output)
+        self.wfile.flush()
+        record['exit_code'] = 0
+
+    def inspect_exec(self, exec_id):
+        record = self.state.execs.get(exec_id)
+        if record is None:
+            return self._not_found('exec instance', exec_id)
+        self._json({'ID': exec_id, 'Running': False, 'ExitCode': record['exit_code'],
+                    'ContainerID': record['container'], 'ProcessConfig': record['config']})
+
+    # Networks
+
+    def list_networks(self):
+        filters = json.loads(self.query.get('filters') or '{}')
+        names = list(filters.get('name') or [])
+        with self.state.lock:
+            networks = [n for n in self.state.networks.values() if not names or n['Name'] in names]
+        self._json(networks)
+
+    def create_network(self):
+        body = self._json_body()
+        network_id = uuid.uuid4().hex
+        network = {'Id': network_id, 'Name': body.get('Name'), 'Driver': body.get('Driver') or 'bridge',
+                   'Labels': body.get('Labels') or {}, 'Containers': {}, 'Created': _timestamp()}
+        with self.state.lock:
+            self.state.networks[network_id] = network
+        self._json({'Id': network_id, 'Warning': ''}, 201)
+
+    def _find_network(self, ref):
+        with self.state.lock:
+            for network in self.state.networks.values():
+                if ref in (network['Id'], network['Name']):
+                    return network
+        return None
+
+    def inspect_network(self, ref):
+        network = self._find_network(ref)
+        if network is None:
+            return self._not_found('network', ref)
+        self._json(network)
+
+    def remove_network(self, ref):
+        network = self._find_network(ref)
+        if network is None:
+            return self._not_found('network', ref)
+        with self.state.lock:
+            self.state.networks.pop(network['Id'], None)
+        self._empty()
+
+    def prune_networks(self):
+        with self.state.lock:
+            unused = [n for n in self.state.networks.values() if not n['Containers']]
+            for network in unused:
+                del self.state.networks[network['Id']]
+        self._json({'NetworksDeleted': [n['Name'] for n in unused]})
+
+    def network_membership(self, ref, action):
+        network = self._find_network(ref)
+        if network is None:
+            return self._not_found('network', ref)
+        body = self._json_body()
+        container = self.state.find(body.get('Container', ''))
+        if container is None:
+            return self._not_found('container', body.get('Container'))
+        with self.state.lock:
+            networks = container['NetworkSettings']['Networks']
+            if action == 'connect':
+                aliases = (body.get('EndpointConfig') or {}).get('Aliases')
+                network['Containers'][container['Id']] = {'Name': container['Name'].lstrip('/')}
+                networks[network['Name']] = {'NetworkID': network['Id'], 'Aliases': aliases,
+                                             'IPAddress': container['NetworkSettings']['IPAddress']}
+            else:
+                network['Containers'].pop(container['Id'], None)
+                networks.pop(network['Name'], None)
+        self._empty(200)
+
+    # Volumes
+
+    def list_volumes(self):
+        with self.state.lock:
+            volumes = list(self.state.volumes.values())
+        self._json({'Volumes': volumes, 'Warnings': []})
+
+    def create_volume(self):
+        body = self._json_body()
+        name = body.get('Name') or uuid.uuid4().hex
+        volume = {'Name': name, 'Driver': 'local', 'Labels': body.get('Labels') or {},
+                  'Mountpoint': f'/var/lib/docker/volumes/{name}/_data', 'CreatedAt': _timestamp()}
+        with self.state.lock:
+            volume = self.state.volumes.setdefault(name, volume)
+        self._json(volume, 201)
+
+    def inspect_volume(self, name):
+        volume = self.state.volumes.get(name)
+        if volume is None:
+            return self._not_found('volume', name)
+        self._json(volume)
+
+    def remove_volume(self, name):
+        with self.state.lock:
+            volume = self.state.volumes.pop(name, None)
+        if volume is None:
+            return self._not_found('volume', name)
+        self._empty()
+
+
+class _EngineServerMixin:
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def configure(self, state, latency=0.0, exec_latency=0.0, verbose=False):
+        self.state = state
+        self.latency = latency
+        self.exec_latency = exec_latency
+        self.verbose = verbose
+        return self
+
+
+class TCPEngineServer(_EngineServerMixin, http.server.ThreadingHTTPServer):
+    pass
+
+
+class UnixEngineServer(_EngineServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('local', 0)
+
+
+def start_engine(state, host='127.0.0.1', port=0, unix_socket=None, latency=0.0, exec_latency=0.001, verbose=False):
+    """
+    Serve the fake engine from a background thread
+
+    Returns:
+        tuple: (server, DOCKER_HOST URL)
+    """
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = UnixEngineServer(unix_socket, EngineHandler)
+        url = f'unix://{unix_socket}'
+    else:
+        server = TCPEngineServer((host, port), EngineHandler)
+        url = f'tcp://{host}:{server.server_address[1]}'
+    server.configure(state, latency, exec_latency, verbose)
+    threading.Thread(target=server.serve_forever, daemon=True, name='fake-engine').start()
+    return server, url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Docker Engine API server for load testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2375)
+    parser.add_argument('--unix-socket', help="Listen on a unix socket instead of TCP")
+    parser.add_argument('--containers', type=int, default=1000, help="Running containers to start with")
+    parser.add_argument('--latency-ms', type=float, default=1.0, help="Added to every API call")
+    parser.add_argument('--exec-latency-ms', type=float, default=5.0, help="Time an exec takes to produce output")
+    parser.add_argument('--exec-output-bytes', type=int, default=1024, help="Output size of non-echo commands")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args(argv)
+
+    state = EngineState(args.containers, args.exec_output_bytes)
+    server, url = start_engine(state, args.host, args.port, args.unix_socket,
+                               args.latency_ms / 1000, max(args.exec_latency_ms / 1000, 0.001), args.verbose)
+    print(f"Fake Docker engine with {args.containers} containers listening on {url}")
+    print(f"Point the manager at it with: DOCKER_HOST={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
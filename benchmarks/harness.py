@@ -0,0 +1,175 @@
+"""
+Benchmark harness
+Fake Docker fleet with configurable latency, a timing loop and baseline files
+for spotting regressions
+"""
+import os
+import json
+import time
+import uuid
+import platform
+import statistics
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+class FakeFleet:
+    """
+    A MagicMock Docker client serving a fleet of fake AI containers
+
+    Like tests/conftest.py, but list and inspect calls sleep for a configurable
+    time to stand in for Docker Engine round trips.
+
+    Args:
+        size (int): Number of containers on the fake host
+        latency (float): Seconds each Docker API call takes
+        exec_output_bytes (int): Size of the stdout returned by exec_run
+    """
+
+    def __init__(self, size=50, latency=0.001, exec_output_bytes=4096):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+        self.ids = [uuid.uuid4().hex[:12] for _ in range(size)]
+        self.containers = [self._make_container(container_id, index) for index, container_id in enumerate(self.ids)]
+        created = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+        self.inspect = {
+            container.id: {
+                'Created': created,
+                'State': {'Status': 'running', 'FinishedAt': '0001-01-01T00:00:00Z'},
+                'HostConfig': {'PortBindings': {'22/tcp': [{'HostPort': str(11001 + index)}]}},
+                'Config': {'Labels': {}},
+                'NetworkSettings': {'Networks': {}}
+            }
+            for index, container in enumerate(self.containers)
+        }
+
+        self.exec_result = MagicMock()
+        self.exec_result.exit_code = 0
+        self.exec_result.output = (b'x' * exec_output_bytes, b'')
+
+        self.client = MagicMock()
+        self.client.containers.list.side_effect = self._list
+        self.client.containers.get.side_effect = self._get
+        self.client.api.inspect_container.side_effect = self._inspect
+        self.client.networks.list.return_value = []
+
+    def _make_container(self, container_id, index):
+        container = MagicMock()
+        container.id = f"{container_id}{index:052d}"
+        container.name = f"ai-container-{container_id}"
+        container.status = 'running'
+        container.exec_run.side_effect = lambda *args, **kwargs: self._call(self.exec_result)
+        return container
+
+    def _call(self, result):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return result
+
+    def _list(self, *args, **kwargs):
+        return self._call(list(self.containers))
+
+    def _get(self, name):
+        for container in self.containers:
+            if name in (container.name, container.id):
+                return self._call(container)
+        raise KeyError(name)
+
+    def _inspect(self, container_id):
+        return self._call(self.inspect[container_id])
+
+    def records(self, fraction=0.5):
+        """Tracking records for the first `fraction` of the fleet"""
+        count = int(self.size * fraction)
+        return {
+            container_id: {
+                'id': container_id,
+                'name': container.name,
+                'container_obj': container,
+                'status': 'running',
+                'created_at': time.time(),
+                'ssh_port': 11001 + index
+            }
+            for index, (container_id, container) in enumerate(zip(self.ids[:count], self.containers[:count]))
+        }
+
+
+def measure(func, rounds=20, warmup=2):
+    """
+    Time repeated calls of func
+
+    Returns:
+        dict: Round count and min/median/mean/p95/max/stdev in milliseconds
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'rounds': rounds,
+        'min_ms': round(timings[0], 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'mean_ms': round(statistics.fmean(timings), 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        'max_ms': round(timings[-1], 4),
+        'stdev_ms': round(statistics.pstdev(timings), 4)
+    }
+
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name, results, settings):
+    """Write results to benchmarks/baselines/<name>.json"""
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = baseline_path(name)
+    with open(path, 'w') as f:
+        json.dump({
+            'saved_at': time.time(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'settings': settings,
+            'results': results
+        }, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_baseline(name):
+    try:
+        with open(baseline_path(name), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def compare(results, baseline, tolerance=0.2, metric='median_ms'):
+    """
+    Compare results against a baseline
+
+    Args:
+        results (dict): Benchmark name -> stats from measure()
+        baseline (dict): A saved baseline
+        tolerance (float): Allowed slowdown, 0.2 means 20%
+        metric (str): Statistic to compare
+
+    Returns:
+        list: (name, baseline value, current value, ratio) for each regression
+    """
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline['results'].get(name)
+        if not previous or not previous.get(metric):
+            continue
+        ratio = stats[metric] / previous[metric]
+        if ratio > 1 + tolerance:
+            regressions.append((name, previous[metric], stats[metric], round(ratio, 3)))
+    return regressions
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Load generator for the container manager and the API proxy
+
+Drives a running manager (or core/api_proxy.py in front of it) with a weighted
+mix of requests from concurrent clients and reports throughput and latency:
+
+    python -m benchmarks.load_generator --url http://localhost:5000 --mix list=1,stats=1,exec=8
+
+With --spawn it starts the whole stack itself: a fake Docker engine in this
+process, the manager pointed at it and, with --proxy, the API proxy in front.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+from collections import defaultdict
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_engine import EngineState, start_engine
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_MIX = 'list=1,stats=1,exec=8'
+
+
+def parse_mix(text):
+    """Parse 'list=1,exec=8' into {'list': 1.0, 'exec': 8.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name.strip()}; choose from {', '.join(OPERATIONS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def op_list(session, base_url, container_ids):
+    return session.get(f"{base_url}/api/containers", timeout=60)
+
+
+def op_stats(session, base_url, container_ids):
+    return session.get(f"{base_url}/api/containers/stats", timeout=60)
+
+
+def op_exec(session, base_url, container_ids):
+    container_id = random.choice(container_ids)
+    return session.post(f"{base_url}/api/containers/{container_id}/exec",
+                        json={'command': f'echo load-{random.randrange(1000000)}'}, timeout=60)
+
+
+def op_create(session, base_url, container_ids):
+    response = session.post(f"{base_url}/api/containers", json={}, timeout=120)
+    if response.ok:
+        session.delete(f"{base_url}/api/containers/{response.json()['container_id']}", timeout=60)
+    return response
+
+
+OPERATIONS = {
+    'list': op_list,
+    'stats': op_stats,
+    'exec': op_exec,
+    'create': op_create
+}
+
+
+class Recorder:
+    """Thread-safe latency and error collection per operation"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, operation, seconds, ok):
+        with self.lock:
+            self.latencies[operation].append(seconds)
+            if not ok:
+                self.errors[operation] += 1
+
+    def report(self, elapsed):
+        rows = {}
+        everything = []
+        for operation, latencies in sorted(self.latencies.items()):
+            everything.extend(latencies)
+            rows[operation] = summarize(latencies, self.errors[operation], elapsed)
+        rows['total'] = summarize(everything, sum(self.errors.values()), elapsed)
+        return rows
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(latencies, errors, elapsed):
+    if not latencies:
+        return {'requests': 0, 'errors': errors, 'rps': 0}
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'rps': round(len(ordered) / elapsed, 1),
+        'p50_ms': round(statistics.median(ordered) * 1000, 2),
+        'p90_ms': round(percentile(ordered, 0.90) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2)
+    }
+
+
+def wait_until_ready(url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/metrics", timeout=5).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not become ready within {timeout} seconds")
+
+
+def spawn_stack(args):
+    """
+    Start a fake engine, the manager and optionally the proxy
+
+    Returns:
+        tuple: (URL to load, list of child processes)
+    """
+    state = EngineState(args.containers, args.exec_output_bytes)
+    _, docker_host = start_engine(state, latency=args.engine_latency_ms / 1000,
+                                  exec_latency=max(args.exec_latency_ms / 1000, 0.001))
+    print(f"Fake engine with {args.containers} containers on {docker_host}")
+
+    env = dict(os.environ, DOCKER_HOST=docker_host,
+               CONTAINER_STATE_DB=os.path.join(tempfile.mkdtemp(prefix='ai-load-'), 'state.db'),
+               LOG_LEVEL='WARNING')
+    processes = []
+    if args.production:
+        command = [sys.executable, 'run.py', '--production', '--port', str(args.manager_port),
+                   '--workers', str(args.workers), '--threads', str(args.threads)]
+    else:
+        command = [sys.executable, 'run.py', '--no-debug', '--port', str(args.manager_port)]
+    processes.append(subprocess.Popen(command, cwd=PROJECT_DIR, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    manager_url = f"http://127.0.0.1:{args.manager_port}"
+    wait_until_ready(manager_url)
+    print(f"Manager ready on {manager_url}")
+
+    if not args.proxy:
+        return manager_url, processes
+
+    processes.append(subprocess.Popen(
+        [sys.executable, os.path.join('core', 'api_proxy.py'), '--port', str(args.proxy_port), '--target', manager_url],
+        cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    ))
+    proxy_url = f"http://127.0.0.1:{args.proxy_port}"
+    wait_until_ready(proxy_url)
+    print(f"Proxy ready on {proxy_url}")
+    return proxy_url, processes
+
+
+def run_load(base_url, mix, concurrency, duration, container_ids):
+    recorder = Recorder()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    stop_at = time.time() + duration
+
+    def worker():
+        session = requests.Session()
+        while time.time() < stop_at:
+            operation = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = OPERATIONS[operation](session, base_url, container_ids).ok
+            except requests.RequestException:
+                ok = False
+            recorder.record(operation, time.perf_counter() - start, ok)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.time() - started)
+
+
+def print_report(rows):
+    print(f"{'operation':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in rows.items():
+        if not row['requests']:
+            print(f"{name:<10}{0:>10}{row['errors']:>8}")
+            continue
+        print(f"{name:<10}{row['requests']:>10}{row['errors']:>8}{row['rps']:>10}{row['p50_ms']:>10}"
+              f"{row['p90_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the container manager and API proxy")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Manager or proxy to load")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Weighted operations, default {DEFAULT_MIX}")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent clients")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run")
+    spawn = parser.add_argument_group('spawned stack')
+    spawn.add_argument('--spawn', action='store_true', help="Start a fake engine and the manager first")
+    spawn.add_argument('--proxy', action='store_true', help="Also start core/api_proxy.py and load it")
+    spawn.add_argument('--production', action='store_true', help="Run the manager under gunicorn")
+    spawn.add_argument('--workers', type=int, default=2)
+    spawn.add_argument('--threads', type=int, default=8)
+    spawn.add_argument('--containers', type=int, default=1000, help="Containers in the fake engine")
+    spawn.add_argument('--engine-latency-ms', type=float, default=1.0)
+    spawn.add_argument('--exec-latency-ms', type=float, default=5.0)
+    spawn.add_argument('--exec-output-bytes', type=int, default=1024)
+    spawn.add_argument('--manager-port', type=int, default=5100)
+    spawn.add_argument('--proxy-port', type=int, default=5101)
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    processes = []
+    try:
+        base_url = args.url
+        if args.spawn:
+            base_url, processes = spawn_stack(args)
+
+        listing = requests.get(f"{base_url}/api/containers", timeout=60).json()
+        container_ids = [c['id'] for c in listing if not c.get('untracked')]
+        if 'exec' in mix and not container_ids:
+            print("No tracked containers to exec in")
+            return 1
+
+        print(f"Loading {base_url} with {args.concurrency} clients for {args.duration:g}s, mix {args.mix}")
+        print_report(run_load(base_url, mix, args.concurrency, args.duration, container_ids))
+        return 0
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
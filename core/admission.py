@@ -0,0 +1,227 @@
+"""
+Admission control for container creation
+Caps the fleet size and holds creates that arrive while it is full in a bounded,
+prioritized queue, so bursts get backpressure instead of exhausting the host
+"""
+import os
+import math
+import time
+import uuid
+import heapq
+import itertools
+import statistics
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class AdmissionRejected(Exception):
+    """A create was not admitted; retry after `retry_after` seconds"""
+
+    def __init__(self, message, reason, retry_after):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admits creates while tracked containers plus creates in progress stay under
+    a cap and, optionally, their resource reservation fits
+
+    Creates that cannot start immediately wait in a queue ordered by priority
+    (higher first), then arrival. A create that does not want to wait, finds
+    the queue full or reaches its deadline is rejected with AdmissionRejected.
+
+    Waiters re-check capacity every `poll_interval` seconds and whenever
+    notify() is called, e.g. from a registry listener, so slots freed by other
+    worker processes are noticed too.
+
+    With a ContainerStateStore, creates in progress hold a lease in the store
+    instead of a count in this process. The cap is checked against the stored
+    records and every worker's leases in the same transaction that takes the
+    lease, so it holds across workers. Each worker still queues its own
+    waiters.
+
+    Args:
+        max_containers (int): Fleet cap; 0 means unlimited
+        max_queue (int): Creates allowed to wait at once
+        count (callable): Returns the number of containers counting toward the
+            cap; with a store it is passed the stored records to count
+        poll_interval (float): Seconds between capacity checks while waiting
+        default_retry_after (int): Retry-After when there is no wait history yet
+        store (ContainerStateStore): Shared store for creates in progress, or None
+    """
+
+    def __init__(self, max_containers, max_queue, count, poll_interval=0.25, default_retry_after=5, store=None):
+        self.max_containers = max_containers
+        self.max_queue = max_queue
+        self.count = count
+        self.store = store
+        self.poll_interval = poll_interval
+        self.default_retry_after = default_retry_after
+        self.in_flight = 0
+        self.waiters = []
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waits = deque(maxlen=200)
+        self.shortfall = None
+        self.condition = threading.Condition()
+        self._sequence = itertools.count()
+
+    def _take_slot(self):
+        """
+        Take a slot under the cap. The caller holds the lock.
+
+        Returns:
+            tuple: (taken, ID of the slot's lease in the store or None)
+        """
+        if not self.max_containers:
+            return True, None
+        if self.store is None:
+            return self.count() + self.in_flight < self.max_containers, None
+
+        def decide(records, slots):
+            if self.count(records) + len(slots) >= self.max_containers:
+                return None
+            return {'pid': os.getpid()}
+
+        lease_id = f"admission-{uuid.uuid4().hex}"
+        if self.store.acquire_lease(lease_id, 'admission', decide) is None:
+            return False, None
+        return True, lease_id
+
+    def _release_slot(self, lease_id):
+        if lease_id is not None:
+            self.store.release_lease(lease_id)
+
+    def _try_acquire(self, reserve):
+        """
+        Take a slot if the cap and the reservation allow. The caller holds the lock.
+
+        Returns:
+            tuple: (acquired, slot lease ID or None, reservation or None)
+        """
+        taken, lease_id = self._take_slot()
+        if not taken:
+            self.shortfall = 'full'
+            return False, None, None
+        reservation = None
+        if reserve is not None:
+            reservation = reserve()
+            if reservation is None:
+                self._release_slot(lease_id)
+                self.shortfall = 'resources'
+                return False, None, None
+        self.in_flight += 1
+        return True, lease_id, reservation
+
+    def notify(self):
+        """Wake waiters to re-check capacity; never blocks, so it is safe inside registry listeners"""
+        if self.condition.acquire(blocking=False):
+            try:
+                self.condition.notify_all()
+            finally:
+                self.condition.release()
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, from recent queue waits"""
+        queued = [wait for wait in self.waits if wait > 0]
+        if not queued:
+            return self.default_retry_after
+        return min(60, max(1, math.ceil(statistics.median(queued))))
+
+    def _reject(self, message, reason):
+        self.rejected += 1
+        return AdmissionRejected(message, reason, self.retry_after())
+
+    def _reject_shortfall(self):
+        if self.shortfall == 'resources':
+            return self._reject("Not enough free CPU or memory on the host", 'resources')
+        return self._reject(f"Fleet is at its limit of {self.max_containers} containers", 'full')
+
+    @contextmanager
+    def admit(self, priority=0, wait=0, reserve=None):
+        """
+        Hold a create slot for the duration of the with block
+
+        Args:
+            priority (int): Higher priorities leave the queue first
+            wait (float): Seconds to wait in the queue; 0 rejects at once if full
+            reserve (callable): Called under the admission lock once the cap
+                allows; returns a reservation, or None if it does not fit yet
+
+        Yields:
+            tuple: (seconds spent waiting, reservation or None)
+
+        Raises:
+            AdmissionRejected: If the create could not be admitted in time
+        """
+        started = time.monotonic()
+        with self.condition:
+            waited = 0.0
+            acquired, lease_id, reservation = (False, None, None) if self.waiters else self._try_acquire(reserve)
+            if not acquired:
+                if wait <= 0:
+                    raise self._reject_shortfall()
+                if len(self.waiters) >= self.max_queue:
+                    raise self._reject(f"Create queue is full ({self.max_queue} waiting)", 'queue_full')
+                lease_id, reservation = self._wait_for_slot([-priority, next(self._sequence)], started + wait, reserve)
+                waited = time.monotonic() - started
+            self.admitted += 1
+            self.waits.append(waited)
+
+        try:
+            yield waited, reservation
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self._release_slot(lease_id)
+                self.condition.notify_all()
+
+    def _wait_for_slot(self, waiter, deadline, reserve):
+        """
+        Queue until this waiter is first in line and gets a slot. The caller holds the lock.
+
+        Returns:
+            tuple: (slot lease ID or None, reservation or None)
+        """
+        heapq.heappush(self.waiters, waiter)
+        try:
+            while True:
+                if self.waiters[0] is waiter:
+                    acquired, lease_id, reservation = self._try_acquire(reserve)
+                    if acquired:
+                        heapq.heappop(self.waiters)
+                        return lease_id, reservation
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timed_out += 1
+                    raise self._reject("Timed out waiting for a free container slot", 'timeout')
+                self.condition.wait(min(remaining, self.poll_interval))
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+                heapq.heapify(self.waiters)
+            # The head of the queue may have changed
+            self.condition.notify_all()
+
+    def stats(self):
+        in_flight = len(self.store.leases('admission')) if self.store is not None else None
+        with self.condition:
+            waits = sorted(self.waits)
+            return {
+                'max_containers': self.max_containers,
+                'in_flight': self.in_flight if in_flight is None else in_flight,
+                'queue_depth': len(self.waiters),
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'recent_wait_seconds': {
+                    'p50': round(statistics.median(waits), 3) if waits else None,
+                    'p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else None,
+                    'max': round(waits[-1], 3) if waits else None
+                }
+            }
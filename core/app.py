@@ -1,20 +1,97 @@
 import os
+import re
 import time
 import uuid
 import json
-import docker
 import logging
 import threading
+import fcntl
 import sys
 import subprocess
+import random
+import hmac
+import base64
+import hashlib
+import pstats
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, g, request, jsonify, stream_with_context
+import requests
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from core.http_gateway import PreviewGateway
+from core.transfer import transfer_path, ARCHIVE_CHUNK_SIZE
+from core.snapshots import SnapshotStore
+from core.caches import SharedCacheManager
+from core.datasets import DatasetRegistry, DATASET_MOUNT_ROOT
+from core.templates import TemplateRegistry, TemplateBuildError, normalize_template
+from core.state_store import ContainerStateStore
+from core.registry import ContainerRegistry
+from core.docker_client import LazyDockerClient
+from core import metrics
+from core.tracing import Tracer
+from core.log_config import configure_logging
+from core.profiling import Profiler
+from core.events import EventLog, format_sse, parse_event_id
+from core.encoding import FastJSONProvider, compress_response
+from core.usage import UsageSampler, RESOLUTIONS
+from core.admission import AdmissionController, AdmissionRejected
+from core.resources import ResourceLedger, DEFAULT_PROFILES
+from core.idle import IdlePauser, open_connections, SSH_PORT
 
-# Configure logging for SSH key manager
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Logging goes through a queue so requests never wait on log I/O (see create_app)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # 'text' or 'json'
+# Exec commands are logged truncated, and only for a sample of requests
+LOG_COMMAND_MAX_CHARS = int(os.environ.get('LOG_COMMAND_MAX_CHARS', '200'))
+LOG_COMMAND_SAMPLE_RATE = float(os.environ.get('LOG_COMMAND_SAMPLE_RATE', '1.0'))
+
+def command_for_log(command):
+    """
+    Get the command text to log for an exec request
+    
+    Returns:
+        str or None: The command, truncated to LOG_COMMAND_MAX_CHARS, or None
+            if this request was not sampled
+    """
+    if LOG_COMMAND_SAMPLE_RATE < 1 and random.random() >= LOG_COMMAND_SAMPLE_RATE:
+        return None
+    if len(command) > LOG_COMMAND_MAX_CHARS:
+        return f"{command[:LOG_COMMAND_MAX_CHARS]}... ({len(command)} chars)"
+    return command
+
+# Per-request span trees, viewable at /api/debug/traces
+TRACE_BUFFER_SIZE = int(os.environ.get('TRACE_BUFFER_SIZE', '200'))
+TRACE_EXPORT_PATH = os.environ.get('TRACE_EXPORT_PATH')
+TRACE_N_PLUS_ONE_THRESHOLD = int(os.environ.get('TRACE_N_PLUS_ONE_THRESHOLD', '10'))
+tracer = Tracer(TRACE_BUFFER_SIZE, TRACE_EXPORT_PATH, TRACE_N_PLUS_ONE_THRESHOLD)
+
+# On-demand profiling of live requests, behind the admin token
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# gzip/zstd compression of API responses at least this large, when the client accepts it
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+profiler = Profiler()
+
+@contextmanager
+def observe_docker_call(operation):
+    """Time a Docker Engine API call for /metrics and record it in the current trace"""
+    with metrics.docker_call(operation), tracer.span(f"docker.{operation}", kind='docker', operation=operation):
+        yield
+
+# Shared Docker client, connected on first use rather than at import.
+# Every Docker Engine API call it makes is timed and traced.
+client = LazyDockerClient(
+    on_connect=lambda docker_client: metrics.instrument_api_client(docker_client.api, call_context=observe_docker_call)
+)
+
+# API routes, registered on the application built by create_app()
+api = Blueprint('api', __name__)
+
 # Define SSH key manager functions directly in app.py
+@tracer.traced()
 def setup_ssh_for_container(container_name):
     """
     Set up SSH keys for a container by copying them from the host
@@ -26,9 +103,9 @@ def setup_ssh_for_container(container_name):
     Returns:
         bool: True if successful, False otherwise
     """
+    import docker
+    
     try:
-        client = docker.from_env()
-        
         # Get the container
         try:
             container = client.containers.get(container_name)
@@ -152,19 +229,314 @@ def setup_ssh_for_container(container_name):
         logger.error(f"Error setting up SSH for container {container_name}: {str(e)}")
         return False
 
-app = Flask(__name__)
-client = docker.from_env()
+# Track active containers. With CONTAINER_STATE_DB set, tracking records live in
+# SQLite so every worker process of a production server sees the same containers.
+CONTAINER_STATE_DB = os.environ.get('CONTAINER_STATE_DB')
+active_containers = ContainerRegistry(
+    ContainerStateStore(CONTAINER_STATE_DB) if CONTAINER_STATE_DB else None,
+    resolve_container=lambda name: client.containers.get(name)
+)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Recent container changes for /api/containers/watch, per process
+WATCH_BUFFER_SIZE = int(os.environ.get('WATCH_BUFFER_SIZE', '1000'))
+WATCH_HEARTBEAT_SECONDS = 15
+WATCH_POLL_SECONDS = 1
+WATCH_MAX_SECONDS = int(os.environ.get('WATCH_MAX_SECONDS', '60'))
+# Each open stream holds a server thread; keep some free for other requests
+WATCH_MAX_STREAMS = int(os.environ.get('WATCH_MAX_STREAMS', '2'))
+WATCH_RETRY_AFTER_SECONDS = 5
+container_events = EventLog(WATCH_BUFFER_SIZE)
+watch_streams_open = 0
+watch_streams_lock = threading.Lock()
+active_containers.add_listener(container_events.record)
+
+# Hibernated containers keep their record, SSH port and workspace volume but no
+# Docker container; they do not count toward the fleet cap or reserve resources
+DORMANT_STATUSES = ('hibernated', 'waking')
+HIBERNATE_EXPIRY_HOURS = float(os.environ.get('HIBERNATE_EXPIRY_HOURS', '24'))
 
-# Track active containers
-active_containers = {}
+def live_containers(records=None):
+    """Tracking records of containers that have a Docker container, from the registry unless records are given"""
+    if records is None:
+        records = active_containers.values()
+    return [info for info in records if info.get('status') not in DORMANT_STATUSES]
+
+# Fleet cap and queue for creates that arrive while it is reached
+MAX_CONTAINERS = int(os.environ.get('MAX_CONTAINERS', '999'))  # One per SSH port in 11001-11999; 0 for no cap
+CREATE_QUEUE_SIZE = int(os.environ.get('CREATE_QUEUE_SIZE', '32'))
+CREATE_MAX_WAIT = float(os.environ.get('CREATE_MAX_WAIT', '120'))
+admission = AdmissionController(MAX_CONTAINERS, CREATE_QUEUE_SIZE, count=lambda records=None: len(live_containers(records)),
+                                store=active_containers.store)
+active_containers.add_listener(lambda *change: admission.notify())
+
+# CPU/memory profiles reserved against host capacity; RESOURCE_PROFILES adds or overrides profiles as JSON
+DEFAULT_RESOURCE_PROFILE = os.environ.get('DEFAULT_RESOURCE_PROFILE', '')  # Empty: no limits unless requested
+CPU_OVERCOMMIT = float(os.environ.get('CPU_OVERCOMMIT', '1.0'))
+MEMORY_OVERCOMMIT = float(os.environ.get('MEMORY_OVERCOMMIT', '1.0'))
+PIN_CPUS = os.environ.get('PIN_CPUS', 'true').lower() in ('1', 'true', 'yes')
+resource_ledger = ResourceLedger(
+    live_containers,
+    profiles=dict(DEFAULT_PROFILES, **json.loads(os.environ.get('RESOURCE_PROFILES') or '{}')),
+    cpu_overcommit=CPU_OVERCOMMIT, memory_overcommit=MEMORY_OVERCOMMIT, pin_cpus=PIN_CPUS,
+    store=active_containers.store
+)
+
+# Statuses during which another stop/restart/remove must not start
+BUSY_STATUSES = ('removing', 'restarting', 'hibernating', 'waking', 'forking')
+
+# Image new containers run, built from the Dockerfile
+CONTAINER_IMAGE = 'ai-container-image:latest'
+
+# SSH ports picked by launches that are not tracked yet, when there is no shared store
+launch_ports = set()
+launch_ports_lock = threading.Lock()
+
+# Container IPs on the Docker network, cached per process for the preview gateway
+container_ips = {}
 
 # Container expiration time in hours
 CONTAINER_EXPIRY_HOURS = 2
 
+# Pooled keep-alive connections for the HTTP preview gateway
+preview_gateway = PreviewGateway()
+PREVIEW_METHODS = ['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS']
+
+# Managed user-defined bridge networks for direct container-to-container traffic
+MANAGED_NETWORK_PREFIX = 'ai-net-'
+MANAGED_NETWORK_LABEL = 'ai-container-manager.network'
+NETWORK_NAME_PATTERN = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9_.-]{0,62}$')
+network_lock = threading.Lock()
+
+# Compressed, deduplicated workspace snapshots
+WORKSPACE_PATH = '/workspace'
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '/var/lib/ai-container-manager/snapshots')
+snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+
+# Forks start from a committed image of the parent, reused until the parent changes
+FORK_MAX_COUNT = int(os.environ.get('FORK_MAX_COUNT', '10'))
+FORK_IMAGE_REPOSITORY = 'ai-container-fork'
+FORK_IMAGE_LABEL = 'ai-container-manager.fork-of'
+
+# Shared pip/npm/Hugging Face cache volumes, mounted by default into new containers
+ENABLE_SHARED_CACHES = os.environ.get('ENABLE_SHARED_CACHES', 'true').lower() in ('1', 'true', 'yes')
+SHARED_CACHE_MAX_GB = float(os.environ.get('SHARED_CACHE_MAX_GB', '20'))
+CACHE_EVICTION_INTERVAL = 3600  # seconds
+cache_manager = SharedCacheManager(client, max_bytes=int(SHARED_CACHE_MAX_GB * 1024 ** 3))
+
+# Read-only datasets stored once on the host. When the manager runs in a container,
+# DATASET_DIR must be bind-mounted at the same path so Docker can resolve it on the host.
+DATASET_DIR = os.environ.get('DATASET_DIR', '/var/lib/ai-container-manager/datasets')
+# Comma-separated host directories that datasets may be registered from; empty allows uploads only
+DATASET_HOST_ROOTS = [root for root in os.environ.get('DATASET_HOST_ROOTS', '').split(',') if root]
+dataset_registry = DatasetRegistry(DATASET_DIR, DATASET_HOST_ROOTS)
+
+# Named container templates; their setup commands are committed into content-hashed image layers
+TEMPLATE_DIR = os.environ.get('TEMPLATE_DIR', '/var/lib/ai-container-manager/templates')
+template_registry = TemplateRegistry(TEMPLATE_DIR)
+
+# Background sampling of Docker stats for running tracked containers; 0 disables it
+USAGE_SAMPLE_INTERVAL = float(os.environ.get('USAGE_SAMPLE_INTERVAL', '10'))
+
+def fetch_container_stats(container_id):
+    # Docker knows the container by its own ID or name, not the manager's ID
+    info = active_containers.get(container_id)
+    if info is None:
+        raise KeyError(f"Container {container_id} is no longer tracked")
+    # one_shot skips the daemon's second reading; rates come from our own previous sample
+    return client.api.stats(info.get('docker_id') or info['name'], stream=False, one_shot=True)
+
+def running_container_ids():
+    return [info['id'] for info in active_containers.by_status('running')]
+
+usage_sampler = UsageSampler(fetch_container_stats, USAGE_SAMPLE_INTERVAL)
+
+# Pause running containers after this many seconds without exec, file or preview activity; 0 never pauses
+IDLE_PAUSE_SECONDS = float(os.environ.get('IDLE_PAUSE_SECONDS', '0'))
+
+def container_in_use(info):
+    """True while an exec is still running or an SSH session is open in the container"""
+    container = info['container_obj']
+    container.reload()
+    for exec_id in container.attrs.get('ExecIDs') or []:
+        if client.api.exec_inspect(exec_id).get('Running'):
+            return True
+    exec_result = container.exec_run(['cat', '/proc/net/tcp', '/proc/net/tcp6'])
+    return open_connections((exec_result.output or b'').decode('utf-8', errors='replace'), SSH_PORT) > 0
+
+idle_pauser = IdlePauser(active_containers, IDLE_PAUSE_SECONDS, busy=container_in_use)
+
+def fleet_usage_totals():
+    return {(resource,): value for resource, value in usage_sampler.fleet()['totals'].items()}
+
+def tracked_status_counts():
+    return {(status,): count for status, count in active_containers.status_counts().items()}
+
+def ports_in_use():
+    return len({info.get('ssh_port') for info in active_containers.values() if info.get('ssh_port')})
+
+def expires_at(info):
+    """When a tracked container expires; hibernated ones are kept HIBERNATE_EXPIRY_HOURS from hibernation"""
+    if info.get('status') == 'hibernated':
+        return (info.get('hibernated_at') or 0) + HIBERNATE_EXPIRY_HOURS * 3600
+    return (info.get('created_at') or 0) + CONTAINER_EXPIRY_HOURS * 3600
+
+def expiry_lag():
+    """Seconds the most overdue tracked container has outlived its expiry time"""
+    now = time.time()
+    overdue = [now - expires_at(info) for info in active_containers.values()
+               if info.get('status') not in BUSY_STATUSES]
+    return max([0] + overdue)
+
+# Prometheus metrics served at /metrics, per process
+request_duration = metrics.registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint', ('endpoint', 'method', 'status'))
+exec_output_bytes = metrics.registry.histogram(
+    'exec_output_bytes', 'Size of command output returned by exec', buckets=metrics.SIZE_BUCKETS)
+metrics.registry.gauge(
+    'tracked_containers', 'Containers tracked by the manager by status', ('status',), function=tracked_status_counts)
+metrics.registry.gauge('ssh_ports_in_use', 'SSH ports assigned to tracked containers', function=ports_in_use)
+metrics.registry.gauge(
+    'container_expiry_lag_seconds', 'How long the most overdue container has outlived its expiry', function=expiry_lag)
+resume_latency = metrics.registry.histogram(
+    'container_resume_seconds', 'Time to unpause an idle container before using it')
+wake_latency = metrics.registry.histogram(
+    'container_wake_seconds', 'Time to recreate a hibernated container', buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120))
+create_queue_wait = metrics.registry.histogram(
+    'create_queue_wait_seconds', 'Time creates waited for a free container slot')
+create_rejections = metrics.registry.counter(
+    'create_rejections_total', 'Creates rejected by admission control', ('reason',))
+metrics.registry.gauge(
+    'create_queue_depth', 'Creates waiting for a free container slot', function=lambda: len(admission.waiters))
+metrics.registry.gauge(
+    'reserved_resources', 'CPU cores and memory bytes reserved by resource profiles', ('resource',),
+    function=lambda: {(resource,): value for resource, value in resource_ledger.usage()['reserved'].items()})
+metrics.registry.gauge(
+    'fleet_resource_usage', 'Summed latest resource usage of sampled containers', ('resource',),
+    function=fleet_usage_totals)
+
+def remove_tracked_container(container_id, reason=None):
+    """
+    Stop and remove a tracked container, then stop tracking it
+    
+    The container is moved to the 'removing' status first, so concurrent
+    deletes, cleanups and the expiry checker never act on it twice.
+    
+    Args:
+        container_id (str): ID of the tracked container
+        reason (str): Why it is removed, e.g. 'expired', reported to watchers
+        
+    Returns:
+        bool: True if removed, False if not tracked or already being removed
+        
+    Raises:
+        Exception: If Docker fails to stop or remove it; the previous status is restored
+    """
+    previous = active_containers.transition(container_id, 'removing', exclude_statuses=BUSY_STATUSES,
+                                            removal_reason=reason)
+    if previous is None:
+        return False
+    
+    try:
+        with active_containers.lock_for(container_id):
+            # Hibernated containers have no Docker container left to remove
+            if previous.get('status') != 'hibernated':
+                container = previous['container_obj']
+                container.stop()
+                container.remove()
+    except Exception:
+        active_containers.transition(container_id, previous.get('status'), from_statuses=['removing'],
+                                     removal_reason=None)
+        raise
+    
+    active_containers.remove(container_id)
+    container_ips.pop(container_id, None)
+    if previous.get('fork_image'):
+        remove_fork_image(previous['fork_image'])
+    return True
+
+def mark_changed(container_id):
+    """Note that a container may have been written to, so its cached fork image is stale"""
+    info = active_containers.get(container_id)
+    if info is not None and info.get('fork_image') and not info.get('changed_since_fork'):
+        active_containers.update(container_id, changed_since_fork=True)
+
+def launch_spec(info):
+    """The spec to recreate a container from, rebuilt from its record if it predates specs"""
+    if info.get('spec'):
+        return info['spec']
+    default_aliases = (info.get('name'), (info.get('id') or '')[:8])
+    return {
+        'image': CONTAINER_IMAGE,
+        'environment': {},
+        'network': info.get('network'),
+        'alias': next((alias for alias in info.get('network_aliases') or [] if alias not in default_aliases), None),
+        'caches': info.get('caches') or [],
+        'datasets': info.get('datasets') or []
+    }
+
+def rehydrate_container(container_id, priority=0, wait=0):
+    """
+    Recreate a hibernated container from its tracking record
+    
+    The new container gets the same ID, name, SSH port, workspace volume,
+    network, caches, datasets and resource profile. It goes through admission
+    control like a create.
+    
+    Args:
+        container_id (str): ID of the hibernated container
+        priority (int): Admission priority
+        wait (float): Seconds to wait for a free slot
+        
+    Returns:
+        dict or None: The new record, or None if the container was not hibernated
+        
+    Raises:
+        AdmissionRejected: If the fleet or host has no room for it
+        Exception: If Docker fails to recreate it; it stays hibernated
+    """
+    with active_containers.lock_for(container_id):
+        previous = active_containers.transition(container_id, 'waking', from_statuses=['hibernated'])
+        if previous is None:
+            # Another worker may be waking it; give it the time a create could take
+            deadline = time.monotonic() + CREATE_MAX_WAIT
+            while (active_containers.get(container_id) or {}).get('status') == 'waking' and time.monotonic() < deadline:
+                time.sleep(0.1)
+            return None
+        
+        started = time.perf_counter()
+        try:
+            container_info = admit_and_launch(launch_spec(previous), previous.get('resources'), priority, wait,
+                                              container_id=container_id, ssh_port=previous.get('ssh_port'))
+        except Exception:
+            active_containers.transition(container_id, 'hibernated', from_statuses=['waking'])
+            raise
+    
+    elapsed = time.perf_counter() - started
+    wake_latency.observe(elapsed)
+    logger.info(f"Woke hibernated container {container_info['name']} in {elapsed:.2f}s")
+    return container_info
+
+def wake_for_use(container_id):
+    """
+    Get a tracked container ready to use: recreate it if hibernated, unpause it if paused
+    
+    Returns:
+        tuple or None: An error response if it could not be woken
+    """
+    try:
+        if (active_containers.get(container_id) or {}).get('status') in DORMANT_STATUSES:
+            rehydrate_container(container_id, wait=CREATE_MAX_WAIT)
+        else:
+            elapsed = idle_pauser.resume(container_id)
+            if elapsed is not None:
+                resume_latency.observe(elapsed)
+    except AdmissionRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        logger.error(f"Failed to wake container {container_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    return None
+
 # Check for expired containers every X minutes
 def check_expired_containers():
     while True:
@@ -172,22 +544,16 @@ def check_expired_containers():
             current_time = time.time()
             expired = []
             
+            # Iterates a snapshot, so concurrent creates and deletes are safe
             for container_id, info in active_containers.items():
-                creation_time = info.get('created_at', 0)
-                expiry_time = creation_time + (CONTAINER_EXPIRY_HOURS * 3600)
-                
-                if current_time > expiry_time:
+                if current_time > expires_at(info):
                     expired.append(container_id)
             
             # Remove expired containers
             for container_id in expired:
                 try:
                     logger.info(f"Auto-removing expired container {container_id}")
-                    container_info = active_containers[container_id]
-                    container = container_info['container_obj']
-                    container.stop()
-                    container.remove()
-                    del active_containers[container_id]
+                    remove_tracked_container(container_id, reason='expired')
                 except Exception as e:
                     logger.error(f"Failed to remove expired container {container_id}: {str(e)}")
                     
@@ -197,15 +563,13 @@ def check_expired_containers():
         # Check every 10 minutes
         time.sleep(600)
 
-# Start expiry checker thread
-expiry_thread = threading.Thread(target=check_expired_containers, daemon=True)
-expiry_thread.start()
-
 # Check for orphaned containers on startup and kill them
 def handle_existing_containers():
     try:
-        # Reset active containers tracking at startup
-        active_containers.clear()
+        # Tracking is rebuilt here and swapped in atomically once the scan is done,
+        # so readers never see a half-empty registry
+        reconcile_started = time.time()
+        tracked = {}
         
         # Debug logs
         logger.info("Starting container tracking process...")
@@ -216,7 +580,7 @@ def handle_existing_containers():
         
         # Log all container names found
         for c in all_containers:
-            logger.info(f"Container found: {c.name} (status: {c.status})")
+            logger.debug(f"Container found: {c.name} (status: {c.status})")
             
         tracked_count = 0
         cleaned_count = 0
@@ -229,12 +593,20 @@ def handle_existing_containers():
         # First pass: identify orphaned containers
         orphaned_containers = []
         
+        # Containers we already track keep their ID (names only carry its first 8 characters)
+        known_ids = {}
+        for known_id, info in active_containers.items():
+            if info.get('name'):
+                known_ids[info['name']] = known_id
+            if info.get('docker_id'):
+                known_ids[info['docker_id']] = known_id
+        
         for container in all_containers:
             # Skip the manager container
             if container.name == "ai-container-manager":
                 continue
                 
-            container_id = container.name.split('-')[-1]
+            container_id = known_ids.get(container.id) or known_ids.get(container.name) or container.name.split('-')[-1]
             
             try:
                 # Get container info for age determination
@@ -330,23 +702,46 @@ def handle_existing_containers():
                                 ssh_port = host_bindings[0].get('HostPort')
                                 break
                     
-                    # Add to our tracking dict
-                    active_containers[container_id] = {
+                    # Recover membership of a managed network, if any
+                    network_name = None
+                    network_aliases = []
+                    attached_networks = (container_info.get('NetworkSettings') or {}).get('Networks') or {}
+                    for attached_name, endpoint in attached_networks.items():
+                        if attached_name.startswith(MANAGED_NETWORK_PREFIX):
+                            network_name = attached_name[len(MANAGED_NETWORK_PREFIX):]
+                            network_aliases = (endpoint or {}).get('Aliases') or []
+                            break
+                    
+                    # Add to our tracking dict, keeping what we already knew about it
+                    tracked[container_id] = {
+                        **(active_containers.get(container_id) or {}),
                         'id': container_id,
                         'name': container.name,
                         'container_obj': container,
+                        'docker_id': container.id,
                         'status': container.status,
                         'created_at': creation_timestamp,
-                        'ssh_port': ssh_port
+                        'ssh_port': ssh_port,
+                        'network': network_name,
+                        'network_aliases': network_aliases
                     }
                     tracked_count += 1
-                    logger.info(f"Tracking container {container.name} with ID {container_id}")
+                    logger.debug(f"Tracking container {container.name} with ID {container_id}")
             except Exception as e:
                 logger.error(f"Failed to process container {container.name}: {str(e)}")
                 # Mark as orphaned if we can't process it
                 orphaned_containers.append(container)
                 orphaned_count += 1
         
+        # Hibernated containers have no Docker container to find, keep their records
+        for container_id, info in active_containers.items():
+            if info.get('status') in DORMANT_STATUSES and container_id not in tracked:
+                tracked[container_id] = info
+        
+        # Publish the new tracking state, keeping containers created while we scanned
+        active_containers.replace_all(tracked, keep_newer_than=reconcile_started)
+        logger.info(f"Tracking {len(tracked)} existing containers")
+        
         # Second pass: clean up orphaned containers
         for container in orphaned_containers:
             try:
@@ -363,17 +758,336 @@ def handle_existing_containers():
     except Exception as e:
         logger.error(f"Error during container cleanup and tracking: {str(e)}")
 
-# Run container tracking on startup
-handle_existing_containers()
+# Background services run in exactly one process per host
+background_services_started = False
+background_services_lock = threading.Lock()
+leader_lock_file = None
+
+def acquire_leader_lock():
+    """
+    Try to become the process that runs background services
+
+    With a shared state store, several workers import the app. An exclusive
+    lock next to the database elects one of them; the lock is released by the
+    kernel if that worker dies, so a replacement worker can take over.
+
+    Returns:
+        bool: True if this process should run background services
+    """
+    global leader_lock_file
+    if not CONTAINER_STATE_DB:
+        return True
+    
+    lock_file = open(f"{CONTAINER_STATE_DB}.lock", 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    leader_lock_file = lock_file
+    return True
+
+def start_background_services():
+    """Reconcile existing containers and start the expiry and cache eviction threads"""
+    global background_services_started
+    with background_services_lock:
+        if background_services_started:
+            return False
+        if not acquire_leader_lock():
+            logger.info(f"Background services are running in another worker (pid {os.getpid()} is a follower)")
+            return False
+        background_services_started = True
+    
+    logger.info(f"Starting background services in pid {os.getpid()}")
+    
+    # Run container tracking on startup
+    handle_existing_containers()
+    
+    # Start expiry checker thread
+    expiry_thread = threading.Thread(target=check_expired_containers, daemon=True)
+    expiry_thread.start()
+    
+    # Start shared cache eviction thread
+    cache_eviction_thread = threading.Thread(
+        target=cache_manager.run_eviction_loop, args=(CACHE_EVICTION_INTERVAL,), daemon=True
+    )
+    cache_eviction_thread.start()
+    
+    # Start resource usage sampler thread
+    if USAGE_SAMPLE_INTERVAL > 0:
+        usage_thread = threading.Thread(target=usage_sampler.run, args=(running_container_ids,), daemon=True)
+        usage_thread.start()
+    
+    # Start idle container pausing thread
+    idle_thread = threading.Thread(target=idle_pauser.run, daemon=True)
+    idle_thread.start()
+    return True
+
+# Settings create_app() understands, defaulting to the environment
+DEFAULT_CONFIG = {
+    'CONTAINER_STATE_DB': CONTAINER_STATE_DB,
+    'CONTAINER_EXPIRY_HOURS': CONTAINER_EXPIRY_HOURS,
+    'SNAPSHOT_DIR': SNAPSHOT_DIR,
+    'DATASET_DIR': DATASET_DIR,
+    'DATASET_HOST_ROOTS': DATASET_HOST_ROOTS,
+    'TEMPLATE_DIR': TEMPLATE_DIR,
+    'ENABLE_SHARED_CACHES': ENABLE_SHARED_CACHES,
+    'SHARED_CACHE_MAX_GB': SHARED_CACHE_MAX_GB,
+    'TRACE_EXPORT_PATH': TRACE_EXPORT_PATH,
+    'TRACE_N_PLUS_ONE_THRESHOLD': TRACE_N_PLUS_ONE_THRESHOLD,
+    'LOG_LEVEL': LOG_LEVEL,
+    'LOG_FORMAT': LOG_FORMAT,
+    'LOG_COMMAND_MAX_CHARS': LOG_COMMAND_MAX_CHARS,
+    'LOG_COMMAND_SAMPLE_RATE': LOG_COMMAND_SAMPLE_RATE,
+    'ADMIN_TOKEN': ADMIN_TOKEN,
+    'COMPRESS_RESPONSES': COMPRESS_RESPONSES,
+    'COMPRESS_MIN_BYTES': COMPRESS_MIN_BYTES,
+    'USAGE_SAMPLE_INTERVAL': USAGE_SAMPLE_INTERVAL,
+    'MAX_CONTAINERS': MAX_CONTAINERS,
+    'CREATE_QUEUE_SIZE': CREATE_QUEUE_SIZE,
+    'CREATE_MAX_WAIT': CREATE_MAX_WAIT,
+    'DEFAULT_RESOURCE_PROFILE': DEFAULT_RESOURCE_PROFILE,
+    'CPU_OVERCOMMIT': CPU_OVERCOMMIT,
+    'MEMORY_OVERCOMMIT': MEMORY_OVERCOMMIT,
+    'PIN_CPUS': PIN_CPUS,
+    'IDLE_PAUSE_SECONDS': IDLE_PAUSE_SECONDS,
+    'HIBERNATE_EXPIRY_HOURS': HIBERNATE_EXPIRY_HOURS,
+    'FORK_MAX_COUNT': FORK_MAX_COUNT,
+    'WATCH_MAX_SECONDS': WATCH_MAX_SECONDS,
+    'WATCH_MAX_STREAMS': WATCH_MAX_STREAMS,
+    'DOCKER_CLIENT': None,     # Use this client instead of docker.from_env()
+    'START_SERVICES': True     # Run the startup reconcile and background threads
+}
+
+def configure(config):
+    """Apply application settings to the module-level services"""
+    global CONTAINER_STATE_DB, CONTAINER_EXPIRY_HOURS, SNAPSHOT_DIR, DATASET_DIR, TEMPLATE_DIR, template_registry
+    global ENABLE_SHARED_CACHES, SHARED_CACHE_MAX_GB, snapshot_store, dataset_registry, DATASET_HOST_ROOTS
+    global LOG_COMMAND_MAX_CHARS, LOG_COMMAND_SAMPLE_RATE, ADMIN_TOKEN, COMPRESS_RESPONSES, COMPRESS_MIN_BYTES
+    global USAGE_SAMPLE_INTERVAL, MAX_CONTAINERS, CREATE_QUEUE_SIZE, CREATE_MAX_WAIT
+    global DEFAULT_RESOURCE_PROFILE, CPU_OVERCOMMIT, MEMORY_OVERCOMMIT, PIN_CPUS, IDLE_PAUSE_SECONDS
+    global HIBERNATE_EXPIRY_HOURS, FORK_MAX_COUNT, WATCH_MAX_SECONDS, WATCH_MAX_STREAMS
+    
+    if config.get('DOCKER_CLIENT') is not None:
+        client.configure(config['DOCKER_CLIENT'])
+    
+    if config['CONTAINER_STATE_DB'] != CONTAINER_STATE_DB:
+        CONTAINER_STATE_DB = config['CONTAINER_STATE_DB']
+        active_containers.use_store(ContainerStateStore(CONTAINER_STATE_DB) if CONTAINER_STATE_DB else None)
+        admission.store = resource_ledger.store = active_containers.store
+    # Workers that do not sample read the sampling worker's usage from next to the state database
+    usage_sampler.export_path = f"{CONTAINER_STATE_DB}.usage" if CONTAINER_STATE_DB else None
+    if config['SNAPSHOT_DIR'] != SNAPSHOT_DIR:
+        SNAPSHOT_DIR = config['SNAPSHOT_DIR']
+        snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+    if config['DATASET_DIR'] != DATASET_DIR:
+        DATASET_DIR = config['DATASET_DIR']
+        dataset_registry = DatasetRegistry(DATASET_DIR)
+    DATASET_HOST_ROOTS = dataset_registry.host_roots = list(config['DATASET_HOST_ROOTS'])
+    if config['TEMPLATE_DIR'] != TEMPLATE_DIR:
+        TEMPLATE_DIR = config['TEMPLATE_DIR']
+        template_registry = TemplateRegistry(TEMPLATE_DIR)
+    
+    CONTAINER_EXPIRY_HOURS = config['CONTAINER_EXPIRY_HOURS']
+    ENABLE_SHARED_CACHES = config['ENABLE_SHARED_CACHES']
+    SHARED_CACHE_MAX_GB = config['SHARED_CACHE_MAX_GB']
+    cache_manager.max_bytes = int(SHARED_CACHE_MAX_GB * 1024 ** 3)
+    tracer.export_path = config['TRACE_EXPORT_PATH']
+    tracer.n_plus_one_threshold = config['TRACE_N_PLUS_ONE_THRESHOLD']
+    LOG_COMMAND_MAX_CHARS = config['LOG_COMMAND_MAX_CHARS']
+    LOG_COMMAND_SAMPLE_RATE = config['LOG_COMMAND_SAMPLE_RATE']
+    ADMIN_TOKEN = config['ADMIN_TOKEN']
+    COMPRESS_RESPONSES = config['COMPRESS_RESPONSES']
+    COMPRESS_MIN_BYTES = config['COMPRESS_MIN_BYTES']
+    USAGE_SAMPLE_INTERVAL = config['USAGE_SAMPLE_INTERVAL']
+    usage_sampler.interval = USAGE_SAMPLE_INTERVAL
+    MAX_CONTAINERS = admission.max_containers = config['MAX_CONTAINERS']
+    CREATE_QUEUE_SIZE = admission.max_queue = config['CREATE_QUEUE_SIZE']
+    CREATE_MAX_WAIT = config['CREATE_MAX_WAIT']
+    DEFAULT_RESOURCE_PROFILE = config['DEFAULT_RESOURCE_PROFILE']
+    CPU_OVERCOMMIT = resource_ledger.cpu_overcommit = config['CPU_OVERCOMMIT']
+    MEMORY_OVERCOMMIT = resource_ledger.memory_overcommit = config['MEMORY_OVERCOMMIT']
+    PIN_CPUS = resource_ledger.pin_cpus = config['PIN_CPUS']
+    IDLE_PAUSE_SECONDS = idle_pauser.idle_seconds = config['IDLE_PAUSE_SECONDS']
+    HIBERNATE_EXPIRY_HOURS = config['HIBERNATE_EXPIRY_HOURS']
+    FORK_MAX_COUNT = config['FORK_MAX_COUNT']
+    WATCH_MAX_SECONDS = config['WATCH_MAX_SECONDS']
+    WATCH_MAX_STREAMS = config['WATCH_MAX_STREAMS']
+
+def create_app(config=None):
+    """
+    Build the Flask application
+    
+    Importing this module is cheap: it does not import the Docker SDK, connect
+    to Docker, reconcile containers or start threads. The Docker client
+    connects on first use, and background services start here only when
+    START_SERVICES is set (and no other worker already runs them).
+    
+    Args:
+        config (dict): Overrides for DEFAULT_CONFIG and Flask settings
+        
+    Returns:
+        Flask: The application
+    """
+    flask_app = Flask(__name__)
+    flask_app.json = FastJSONProvider(flask_app)
+    flask_app.config.update(DEFAULT_CONFIG)
+    flask_app.config.update(config or {})
+    
+    configure_logging(flask_app.config['LOG_LEVEL'], json_format=flask_app.config['LOG_FORMAT'] == 'json')
+    configure(flask_app.config)
+    flask_app.register_blueprint(api)
+    
+    if flask_app.config['START_SERVICES']:
+        start_background_services()
+    return flask_app
+
+_default_app = None
+
+def __getattr__(name):
+    """Build `app` on first access, for callers that import it directly"""
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app({'START_SERVICES': False})
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+LISTING_FIELDS = ('id', 'name', 'status', 'created_at', 'ssh_port', 'untracked')
+STATS_FIELDS = ('id', 'name', 'status', 'age_hours', 'expires_in_hours', 'tracked')
+
+def untracked_containers():
+    """
+    Running AI containers that are not tracked, from a single list call
+    
+    Uses the list summaries instead of containers.list(), which inspects
+    every container on the host, tracked or not.
+    
+    Returns:
+        list: dicts with id, name, status and docker_id
+    """
+    untracked = []
+    for summary in client.api.containers(filters={"name": "ai-container-"}):
+        name = (summary.get('Names') or ['/'])[0].lstrip('/')
+        container_id = name.split('-')[-1]
+        if container_id in active_containers:
+            continue
+        untracked.append({'id': container_id, 'name': name, 'status': summary.get('State'), 'docker_id': summary.get('Id')})
+    return untracked
+
+def listing_etag(kind, untracked, *extra):
+    """ETag for a listing: the registry revision plus the state of untracked containers"""
+    fingerprint = json.dumps([kind, active_containers.revision, [(c['id'], c['status']) for c in untracked], extra])
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:20]
+
+def parse_listing_args(allowed_fields):
+    """
+    Read the status, fields, limit and cursor query arguments
+    
+    Returns:
+        tuple: (options dict, None) or (None, error response)
+    """
+    statuses = [value for value in request.args.get('status', '').split(',') if value]
+    fields = [value for value in request.args.get('fields', '').split(',') if value]
+    unknown = [field for field in fields if field not in allowed_fields]
+    if unknown:
+        return None, (jsonify({'error': f"Unknown fields: {', '.join(unknown)}", 'fields': list(allowed_fields)}), 400)
+    
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return None, (jsonify({'error': 'limit must be a positive integer'}), 400)
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor = base64.b64decode(cursor.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+        except (ValueError, UnicodeError):
+            return None, (jsonify({'error': 'Invalid cursor'}), 400)
+    return {'statuses': statuses, 'fields': fields, 'limit': limit, 'cursor': cursor}, None
+
+def tracked_records(statuses):
+    """Tracked records, narrowed through the status index when statuses are given"""
+    if not statuses:
+        return list(active_containers.items())
+    return [(info['id'], info) for status in statuses for info in active_containers.by_status(status)]
+
+def page_listing(items, options):
+    """
+    Apply cursor pagination and field projection
+    
+    Pages are ordered by container ID; the cursor is the last ID of the previous page.
+    
+    Returns:
+        tuple: (items, next cursor or None)
+    """
+    next_cursor = None
+    if options['limit'] is not None or options['cursor']:
+        items = sorted(items, key=lambda item: item['id'])
+        if options['cursor']:
+            items = [item for item in items if item['id'] > options['cursor']]
+        if options['limit'] is not None and len(items) > options['limit']:
+            items = items[:options['limit']]
+            next_cursor = base64.urlsafe_b64encode(items[-1]['id'].encode('utf-8')).decode('ascii')
+    if options['fields']:
+        items = [{field: item.get(field) for field in options['fields']} for item in items]
+    return items, next_cursor
+
+def not_modified(etag):
+    """A 304 response if the client already has this version"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return None
 
-@app.route('/api/containers', methods=['GET'])
-@app.route('/api/containers/list', methods=['GET'])  # Added alternative endpoint
+def listing_response(payload, etag, next_cursor):
+    response = jsonify(payload)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def ssh_port_from_inspect(container_info):
+    """Host port bound to the container's SSH port, if any"""
+    port_bindings = container_info['HostConfig']['PortBindings'] or {}
+    for container_port, host_bindings in port_bindings.items():
+        if container_port.startswith('22/'):
+            if host_bindings and len(host_bindings) > 0:
+                return host_bindings[0].get('HostPort')
+    return None
+
+@api.route('/api/containers', methods=['GET'])
+@api.route('/api/containers/list', methods=['GET'])  # Added alternative endpoint
 def list_containers():
     """List all active AI containers"""
+    options, error = parse_listing_args(LISTING_FIELDS)
+    if error:
+        return error
+    
+    # Also check for running containers that might not be in active_containers
+    try:
+        untracked = untracked_containers()
+    except Exception as e:
+        logger.error(f"Error listing untracked containers: {str(e)}")
+        untracked = []
+    
+    # Unchanged since the client's last poll: skip building the list
+    etag = listing_etag('list', untracked)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
     containers = []
     
-    # Get containers from active_containers dictionary
-    for container_id, info in active_containers.items():
+    # Get containers from active_containers registry
+    for container_id, info in tracked_records(options['statuses']):
         containers.append({
             'id': container_id,
             'name': info.get('name'),
@@ -382,76 +1096,333 @@ def list_containers():
             'ssh_port': info.get('ssh_port')
         })
     
-    # Also check for running containers that might not be in active_containers
-    try:
-        all_containers = client.containers.list(filters={"name": "ai-container-"})
-        for container in all_containers:
-            container_id = container.name.split('-')[-1]
-            # Skip if already in our list
-            if container_id in active_containers:
-                continue
-                
+    for container in untracked:
+        if options['statuses'] and container['status'] not in options['statuses']:
+            continue
+        try:
             # Get port information
-            container_info = client.api.inspect_container(container.id)
-            port_bindings = container_info['HostConfig']['PortBindings'] or {}
-            ssh_port = None
-            
-            # Extract host port for SSH
-            for container_port, host_bindings in port_bindings.items():
-                if container_port.startswith('22/'):
-                    if host_bindings and len(host_bindings) > 0:
-                        ssh_port = host_bindings[0].get('HostPort')
-                        break
+            container_info = client.api.inspect_container(container['docker_id'])
+        except Exception as e:
+            logger.error(f"Error inspecting untracked container {container['name']}: {str(e)}")
+            continue
+        
+        # Add to our list
+        containers.append({
+            'id': container['id'],
+            'name': container['name'],
+            'status': container['status'],
+            'created_at': container_info.get('Created'),
+            'ssh_port': ssh_port_from_inspect(container_info),
+            'untracked': True
+        })
+    
+    containers, next_cursor = page_listing(containers, options)
+    return listing_response(containers, etag, next_cursor)
+
+@api.route('/api/containers/watch', methods=['GET'])
+def watch_containers():
+    """Stream container changes as server-sent events"""
+    global watch_streams_open
+    resume = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    
+    with watch_streams_lock:
+        if watch_streams_open >= WATCH_MAX_STREAMS:
+            response = jsonify({'error': f'Too many watch streams open on this worker (limit {WATCH_MAX_STREAMS})',
+                                'retry_after': WATCH_RETRY_AFTER_SECONDS})
+            response.headers['Retry-After'] = str(WATCH_RETRY_AFTER_SECONDS)
+            return response, 503
+        watch_streams_open += 1
+    released = []
+    
+    def release():
+        global watch_streams_open
+        with watch_streams_lock:
+            if not released:
+                released.append(True)
+                watch_streams_open -= 1
+    
+    def snapshot(reset):
+        active_containers.refresh()  # pick up other workers' changes first
+        revision, containers = container_events.snapshot()
+        message = format_sse('snapshot', {'revision': revision, 'reset': reset, 'containers': containers}, str(revision))
+        return message, (revision, float('inf'))
+    
+    def stream():
+        key = resume
+        events = None
+        if key is not None:
+            active_containers.refresh()
+            events = container_events.since(key)
+        if events is None:
+            message, key = snapshot(reset=resume is not None)
+            yield message
+            events = []
+        
+        deadline = time.time() + WATCH_MAX_SECONDS
+        last_sent = time.time()
+        while True:
+            for event in events:
+                yield event.sse()
+                key = event.key
+            now = time.time()
+            if events:
+                last_sent = now
+            if now >= deadline:
+                return
+            if now - last_sent >= WATCH_HEARTBEAT_SECONDS:
+                yield ': keepalive\n\n'
+                last_sent = now
             
-            # Add to our list
-            containers.append({
-                'id': container_id,
-                'name': container.name,
-                'status': container.status,
-                'created_at': container_info.get('Created'),
-                'ssh_port': ssh_port,
-                'untracked': True
-            })
-    except Exception as e:
-        logger.error(f"Error listing untracked containers: {str(e)}")
+            active_containers.refresh()
+            events = container_events.wait(key, min(WATCH_POLL_SECONDS, deadline - now))
+            if events is None:
+                # Fell behind the event log: start over from a fresh snapshot
+                message, key = snapshot(reset=True)
+                yield message
+                last_sent = time.time()
+                events = []
     
-    return jsonify(containers)
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The server closes the response when the stream ends or the client goes away
+    response.call_on_close(release)
+    return response
 
-@app.route('/api/containers', methods=['POST'])
-@app.route('/api/containers/create', methods=['POST'])  # Added alternative endpoint
+@api.route('/api/containers', methods=['POST'])
+@api.route('/api/containers/create', methods=['POST'])  # Added alternative endpoint
 def create_container():
     """Create a new AI container"""
+    data = request.get_json(silent=True) or {}
+    network_name = data.get('network')
+    alias = data.get('alias')
+    
+    if network_name is not None and not (isinstance(network_name, str) and NETWORK_NAME_PATTERN.match(network_name)):
+        return jsonify({'error': 'Invalid network name'}), 400
+    if alias is not None and not (network_name and isinstance(alias, str) and NETWORK_NAME_PATTERN.match(alias)):
+        return jsonify({'error': 'alias requires a network and must be a valid hostname'}), 400
+    
+    try:
+        cache_names = cache_manager.resolve(data.get('caches', ENABLE_SHARED_CACHES))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    dataset_names = data.get('datasets') or []
+    if not isinstance(dataset_names, list) or not all(isinstance(name, str) for name in dataset_names):
+        return jsonify({'error': 'datasets must be a list of dataset names'}), 400
+    try:
+        dataset_volumes = dataset_registry.mounts(dataset_names)
+    except KeyError as e:
+        return jsonify({'error': f'Dataset {e.args[0]} not found'}), 404
+    
+    admission_args, error = parse_admission_args(data)
+    if error:
+        return error
+    priority, wait = admission_args
+    
+    template = None
+    if data.get('template') is not None:
+        template = template_registry.get(data['template']) if isinstance(data['template'], str) else None
+        if template is None:
+            return jsonify({'error': f"Template {data['template']} not found"}), 404
+    
+    # The request's profile or resources win over the template's
+    profile, resources = data.get('profile'), data.get('resources')
+    if template and profile is None and resources is None:
+        profile, resources = template.get('profile'), template.get('resources')
     try:
-        # Generate a unique ID for this container
-        container_id = str(uuid.uuid4())
-        container_name = f"ai-container-{container_id[:8]}"
+        demand = resource_ledger.resolve(profile, resources, DEFAULT_RESOURCE_PROFILE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    spec = {
+        'image': CONTAINER_IMAGE,
+        'environment': {},
+        'network': network_name,
+        'alias': alias,
+        'caches': cache_names,
+        'datasets': dataset_names
+    }
+    if template:
+        # Build missing setup layers before taking an admission slot
+        image, _, error = build_template(template, cache_names)
+        if error:
+            return error
+        spec.update(image=image, environment=template['environment'], volumes=template['volumes'],
+                    template=template['name'])
+    try:
+        container_info = admit_and_launch(spec, demand, priority, wait)
+        return jsonify(container_response(container_info)), 201
+    except AdmissionRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        logger.error(f"Failed to create container: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def build_template(template, cache_names=()):
+    """
+    Get the image for a template, running its setup commands if their layers are not built yet
+    
+    The builder mounts the shared caches so setup installs reuse earlier downloads.
+    
+    Returns:
+        tuple: (image, setup commands run, None) or (None, None, error response)
+    """
+    cache_volumes, cache_environment = cache_manager.mounts(list(cache_names))
+    try:
+        started = time.perf_counter()
+        image, steps = template_registry.build(client, template, volumes=cache_volumes, environment=cache_environment)
+        if steps:
+            logger.info(f"Built template {template['name']} ({steps} setup commands) in {time.perf_counter() - started:.1f}s")
+        return image, steps, None
+    except TemplateBuildError as e:
+        logger.error(f"Failed to build template {template['name']}: {str(e)}")
+        return None, None, (jsonify({'error': str(e), 'command': e.command, 'exit_code': e.exit_code,
+                                     'output': e.output}), 500)
+    except Exception as e:
+        logger.error(f"Failed to build template {template['name']}: {str(e)}")
+        return None, None, (jsonify({'error': str(e)}), 500)
+
+def parse_admission_args(data):
+    """
+    Read the priority and wait of a create or wake request body
+    
+    Returns:
+        tuple: ((priority, wait), None) or (None, error response)
+    """
+    priority = data.get('priority', 0)
+    wait = data.get('wait', 0)
+    if isinstance(priority, bool) or not isinstance(priority, int):
+        return None, (jsonify({'error': 'priority must be an integer'}), 400)
+    if isinstance(wait, bool) or not isinstance(wait, (int, float)) or wait < 0:
+        return None, (jsonify({'error': 'wait must be a non-negative number of seconds'}), 400)
+    return (priority, min(wait, CREATE_MAX_WAIT)), None
+
+def rejection_response(e):
+    """429 response for a create or wake that admission control turned away"""
+    create_rejections.inc(reason=e.reason)
+    logger.warning(f"Rejected container start: {str(e)}")
+    response = jsonify({'error': str(e), 'reason': e.reason, 'retry_after': e.retry_after,
+                        'queue_depth': len(admission.waiters)})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+def admit_and_launch(spec, demand, priority=0, wait=0, container_id=None, ssh_port=None):
+    """
+    Launch a container once admission control gives it a slot and reserves its resources
+    
+    Args:
+        spec (dict): Launch spec, see launch_container()
+        demand (dict): Resources from resource_ledger.resolve(), or None for no limits
+        priority (int): Admission priority
+        wait (float): Seconds to wait for a free slot
+        
+    Returns:
+        dict: The tracking record
+        
+    Raises:
+        AdmissionRejected: If no slot or resources became free in time
+        Exception: If Docker fails to create or start it
+    """
+    reserve = (lambda: resource_ledger.reserve(demand)) if demand else None
+    with admission.admit(priority, wait, reserve=reserve) as (waited, reservation):
+        create_queue_wait.observe(waited)
+        try:
+            return launch_container(spec, reservation, container_id=container_id, ssh_port=ssh_port)
+        finally:
+            if reservation is not None:
+                resource_ledger.release(reservation)
+
+def launch_container(spec, reservation, container_id=None, ssh_port=None):
+    """
+    Create, start and track a container from its spec once admission control lets it through
+    
+    The spec is kept in the tracking record, so a hibernated container can be
+    recreated from it with the same ID, name, SSH port and workspace volume.
+    
+    Args:
+        spec (dict): image, environment, volumes, network, alias, caches, datasets and template
+        reservation (Reservation): CPU, memory and cpuset reserved for it, or None for no limits
+        container_id (str): ID to recreate, or None for a new container
+        ssh_port (int): SSH port to reuse, or None to pick a free one
+    
+    Returns:
+        dict: The tracking record
+    
+    Raises:
+        Exception: If Docker fails to create or start it
+    """
+    # Generate a unique ID for this container
+    container_id = container_id or str(uuid.uuid4())
+    container_name = f"ai-container-{container_id[:8]}"
+    network_name = spec.get('network')
+    alias = spec.get('alias')
+    cache_names = spec.get('caches') or []
+    dataset_names = spec.get('datasets') or []
+    
+    # Find an available port for SSH, held until the container is tracked so parallel launches get different ports
+    ssh_port, port_lease = hold_launch_port(ssh_port)
+    
+    try:
+        volumes = {
+            f'{container_name}-workspace': {'bind': '/workspace', 'mode': 'rw'},
+            '/home/jonflatt/.ssh': {'bind': '/root/.ssh', 'mode': 'ro'}  # Mount SSH directory read-only
+        }
+        environment = {
+            **(spec.get('environment') or {}),
+            'CONTAINER_ID': container_id
+        }
+        
+        # Shared caches so repeat installs and model downloads stay local
+        cache_volumes, cache_environment = cache_manager.mounts(cache_names)
+        volumes.update(cache_volumes)
+        environment.update(cache_environment)
+        
+        # Registered datasets, shared read-only between containers
+        volumes.update(dataset_registry.mounts(dataset_names))
         
-        # Find an available port for SSH
-        ssh_port = find_available_port(11001, 12000)
+        # Extra volumes from the container's template
+        volumes.update(spec.get('volumes') or {})
         
         # Create and start the container
         container = client.containers.run(
-            'ai-container-image:latest',  # The image should be built from the Dockerfile
+            spec.get('image') or CONTAINER_IMAGE,
             name=container_name,
             detach=True,
             ports={'22/tcp': ssh_port},
-            volumes={
-                f'{container_name}-workspace': {'bind': '/workspace', 'mode': 'rw'},
-                '/home/jonflatt/.ssh': {'bind': '/root/.ssh', 'mode': 'ro'}  # Mount SSH directory read-only
-            },
-            environment={
-                'CONTAINER_ID': container_id
-            }
+            volumes=volumes,
+            environment=environment,
+            **(reservation.run_options() if reservation else {})
         )
         
+        # Attach to the managed network so peers can reach it by name
+        network_aliases = []
+        if network_name:
+            network_aliases = [container_name, container_id[:8]]
+            if alias and alias not in network_aliases:
+                network_aliases.append(alias)
+            try:
+                network = ensure_managed_network(network_name)
+                network.connect(container, aliases=network_aliases)
+            except Exception:
+                container.remove(force=True)
+                raise
+        
         # Store container info
         container_info = {
             'id': container_id,
             'name': container_name,
             'container_obj': container,
+            'docker_id': container.id,
             'status': 'running',
             'created_at': time.time(),
-            'ssh_port': ssh_port
+            'ssh_port': ssh_port,
+            'network': network_name,
+            'network_aliases': network_aliases,
+            'caches': cache_names,
+            'datasets': dataset_names,
+            'resources': reservation.record() if reservation else None,
+            'template': spec.get('template'),
+            'spec': spec
         }
         active_containers[container_id] = container_info
         
@@ -466,37 +1437,93 @@ def create_container():
         except Exception as e:
             logger.error(f"Error during SSH key setup for {container_name}: {str(e)}")
         
-        # Return container details
-        return jsonify({
-            'id': container_id,
-            'name': container_name,
-            'status': 'running',
-            'ssh_port': ssh_port,
-            'ssh_command': f'ssh root@localhost -p {ssh_port}'
-        }), 201
-        
-    except Exception as e:
-        logger.error(f"Failed to create container: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        return container_info
+    finally:
+        release_launch_port(ssh_port, port_lease)
 
-@app.route('/api/containers/<container_id>', methods=['DELETE'])
-@app.route('/api/containers/delete/<container_id>', methods=['DELETE'])  # Added alternative endpoint
-def delete_container(container_id):
-    """Stop and remove a container"""
-    if container_id not in active_containers:
-        return jsonify({'error': 'Container not found'}), 404
+def hold_launch_port(ssh_port=None):
+    """
+    Hold an SSH port for a launch until its container is tracked
     
-    try:
-        # Get container info
-        container_info = active_containers[container_id]
-        container = container_info['container_obj']
+    With a shared store the port is held as a lease every worker sees and
+    picked in the same transaction, otherwise in this process's launch_ports.
+    
+    Args:
+        ssh_port (int): Port to reuse, or None to pick a free one
         
-        # Stop and remove the container
-        container.stop()
-        container.remove()
+    Returns:
+        tuple: (port, lease ID in the shared store or None)
         
-        # Remove from active containers
-        del active_containers[container_id]
+    Raises:
+        Exception: If no port is free
+    """
+    store = active_containers.store
+    if store is None:
+        with launch_ports_lock:
+            ssh_port = ssh_port or find_available_port(11001, 12000)
+            launch_ports.add(ssh_port)
+        return ssh_port, None
+    
+    # Inspecting Docker is slow, so do it before taking the store's write lock
+    docker_ports = set() if ssh_port else docker_host_ports()
+    
+    def decide(records, leases):
+        if ssh_port:
+            return {'port': ssh_port}
+        used_ports = docker_ports | tracked_ports(records) | {lease['port'] for lease in leases}
+        for port in range(11001, 12000):
+            if port not in used_ports:
+                return {'port': port}
+        return None
+    
+    lease_id = f"port-{uuid.uuid4().hex}"
+    lease = store.acquire_lease(lease_id, 'port', decide)
+    if lease is None:
+        raise Exception("No available ports found")
+    return lease['port'], lease_id
+
+def release_launch_port(ssh_port, lease_id):
+    """Let other launches pick a port held by hold_launch_port()"""
+    if lease_id is not None:
+        active_containers.store.release_lease(lease_id)
+        return
+    with launch_ports_lock:
+        launch_ports.discard(ssh_port)
+
+def container_response(container_info):
+    """Details of a container returned by create and wake"""
+    ssh_port = container_info['ssh_port']
+    response = {
+        'id': container_info['id'],
+        'name': container_info['name'],
+        'status': container_info['status'],
+        'ssh_port': ssh_port,
+        'ssh_command': f'ssh root@localhost -p {ssh_port}'
+    }
+    if container_info.get('resources'):
+        response['resources'] = container_info['resources']
+    if container_info.get('template'):
+        response['template'] = container_info['template']
+    if container_info.get('network'):
+        response['network'] = container_info['network']
+        response['network_aliases'] = container_info.get('network_aliases') or []
+    if container_info.get('caches'):
+        response['caches'] = container_info['caches']
+    if container_info.get('datasets'):
+        response['datasets'] = {name: f"{DATASET_MOUNT_ROOT}/{name}" for name in container_info['datasets']}
+    return response
+
+@api.route('/api/containers/<container_id>', methods=['DELETE'])
+@api.route('/api/containers/delete/<container_id>', methods=['DELETE'])  # Added alternative endpoint
+def delete_container(container_id):
+    """Stop and remove a container"""
+    if container_id not in active_containers:
+        return jsonify({'error': 'Container not found'}), 404
+    
+    try:
+        # Stop, remove and untrack the container
+        if not remove_tracked_container(container_id):
+            return jsonify({'error': f'Container {container_id} is busy or already being removed'}), 409
         
         return jsonify({'message': f'Container {container_id} deleted successfully'}), 200
     
@@ -504,8 +1531,8 @@ def delete_container(container_id):
         logger.error(f"Failed to delete container {container_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/containers/<container_id>/restart', methods=['POST'])
-@app.route('/api/containers/restart/<container_id>', methods=['POST'])  # Added alternative endpoint
+@api.route('/api/containers/<container_id>/restart', methods=['POST'])
+@api.route('/api/containers/restart/<container_id>', methods=['POST'])  # Added alternative endpoint
 def restart_container(container_id):
     """Restart a specific container"""
     if container_id not in active_containers:
@@ -536,9 +1563,13 @@ def restart_container(container_id):
             logger.error(f"Failed to restart untracked container {container_id}: {str(e)}")
             return jsonify({'error': str(e)}), 500
     
+    # Claim the container so a concurrent delete or restart cannot interleave
+    container_info = active_containers.transition(container_id, 'restarting',
+                                                  exclude_statuses=BUSY_STATUSES + ('hibernated',))
+    if container_info is None:
+        return jsonify({'error': f'Container {container_id} is busy, hibernated or no longer tracked'}), 409
+    
     try:
-        # Get container info
-        container_info = active_containers[container_id]
         container = container_info['container_obj']
         container_name = container_info['name']
         
@@ -547,14 +1578,16 @@ def restart_container(container_id):
         
         # Restart the container
         logger.info(f"Restarting container {container_name} (current status: {old_status})")
-        container.restart(timeout=10)
-        
-        # Refresh container status
-        container.reload()
-        new_status = container.status
+        with active_containers.lock_for(container_id):
+            container.restart(timeout=10)
+            
+            # Refresh container status
+            container.reload()
+            new_status = container.status
         
-        # Update tracked status
-        container_info['status'] = new_status
+        # Update tracked status, the container may have a new IP after restart
+        active_containers.transition(container_id, new_status, from_statuses=['restarting'])
+        container_ips.pop(container_id, None)
         
         return jsonify({
             'message': f'Container {container_id} restarted successfully',
@@ -564,11 +1597,262 @@ def restart_container(container_id):
         }), 200
     
     except Exception as e:
+        active_containers.transition(container_id, container_info.get('status'), from_statuses=['restarting'])
         logger.error(f"Failed to restart container {container_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/containers/<container_id>/exec', methods=['POST'])
-@app.route('/api/containers/exec/<container_id>', methods=['POST'])  # Added alternative endpoint
+@api.route('/api/containers/<container_id>/hibernate', methods=['POST'])
+def hibernate_container(container_id):
+    """Remove a container's process but keep its record, SSH port and workspace volume"""
+    if container_id not in active_containers:
+        return jsonify({'error': 'Container not found'}), 404
+    
+    previous = active_containers.transition(container_id, 'hibernating',
+                                            exclude_statuses=BUSY_STATUSES + ('hibernated',))
+    if previous is None:
+        return jsonify({'error': f'Container {container_id} is busy or already hibernated'}), 409
+    
+    try:
+        with active_containers.lock_for(container_id):
+            container = previous['container_obj']
+            container.stop()
+            # Named volumes such as the workspace outlive the container
+            container.remove()
+    except Exception as e:
+        active_containers.transition(container_id, previous.get('status'), from_statuses=['hibernating'])
+        logger.error(f"Failed to hibernate container {container_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    active_containers.transition(container_id, 'hibernated', from_statuses=['hibernating'],
+                                 container_obj=None, docker_id=None,
+                                 spec=launch_spec(previous), hibernated_at=time.time(), paused_at=None)
+    container_ips.pop(container_id, None)
+    logger.info(f"Hibernated container {previous['name']}")
+    
+    return jsonify({
+        'message': f'Container {container_id} hibernated',
+        'id': container_id,
+        'status': 'hibernated',
+        'expires_in_hours': HIBERNATE_EXPIRY_HOURS
+    }), 200
+
+@api.route('/api/containers/<container_id>/wake', methods=['POST'])
+def wake_container(container_id):
+    """Recreate a hibernated container"""
+    if container_id not in active_containers:
+        return jsonify({'error': 'Container not found'}), 404
+    
+    admission_args, error = parse_admission_args(request.get_json(silent=True) or {})
+    if error:
+        return error
+    priority, wait = admission_args
+    
+    status = active_containers[container_id].get('status')
+    if status not in DORMANT_STATUSES:
+        return jsonify({'error': f'Container {container_id} is not hibernated', 'status': status}), 409
+    
+    try:
+        container_info = rehydrate_container(container_id, priority, wait)
+    except AdmissionRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        logger.error(f"Failed to wake container {container_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    if container_info is None:
+        # Woken by another request
+        container_info = active_containers.get(container_id)
+        if container_info is None or container_info.get('status') in DORMANT_STATUSES:
+            return jsonify({'error': f'Container {container_id} is being woken by another request'}), 409
+    return jsonify(container_response(container_info)), 200
+
+def fork_image(info, reuse=False):
+    """
+    Image of a container's filesystem for its forks
+    
+    Commits the container unless reuse is set, in which case the last commit
+    is reused until an exec, transfer, restore or preview request may have
+    written to the container.
+    
+    Returns:
+        tuple: (image ID, True if the cached image was reused)
+    """
+    cached = info.get('fork_image')
+    if cached and reuse and not info.get('changed_since_fork'):
+        try:
+            client.images.get(cached)
+            return cached, True
+        except Exception:
+            logger.info(f"Cached fork image {cached} of {info['name']} is gone, committing again")
+    
+    # Cleared before committing, so writes from now on mark the new image stale
+    active_containers.update(info['id'], changed_since_fork=False)
+    image = info['container_obj'].commit(
+        repository=FORK_IMAGE_REPOSITORY,
+        tag=info['id'][:8],
+        changes=[f"LABEL {FORK_IMAGE_LABEL}={info['id']}"],
+        pause=False
+    )
+    active_containers.update(info['id'], fork_image=image.id)
+    if cached and cached != image.id:
+        remove_fork_image(cached)
+    return image.id, False
+
+def remove_fork_image(image_id):
+    """Remove a fork image unless hibernated children still need it to wake"""
+    if any((info.get('spec') or {}).get('image') == image_id for info in active_containers.values()):
+        return
+    try:
+        client.images.remove(image_id)
+    except Exception as e:
+        # Running children still use it; cleanup prunes it once they are gone
+        logger.debug(f"Keeping fork image {image_id}: {str(e)}")
+
+def clone_workspaces(source_name, child_names):
+    """Copy a container's workspace volume into a new volume for each child, in one helper container"""
+    volumes = {f'{source_name}-workspace': {'bind': '/source', 'mode': 'ro'}}
+    for index, child_name in enumerate(child_names):
+        volumes[f'{child_name}-workspace'] = {'bind': f'/clones/{index}', 'mode': 'rw'}
+    client.containers.run(
+        CONTAINER_IMAGE,
+        ['set -e; for clone in /clones/*; do cp -a /source/. "$clone"/; done'],
+        entrypoint=['sh', '-c'],
+        volumes=volumes,
+        network_mode='none',
+        remove=True
+    )
+
+def remove_workspaces(container_names):
+    for container_name in container_names:
+        try:
+            client.volumes.get(f'{container_name}-workspace').remove(force=True)
+        except Exception as e:
+            logger.warning(f"Failed to remove workspace volume of {container_name}: {str(e)}")
+
+# Times a fork resumes and tries to claim a container the idle pauser keeps pausing
+FORK_CLAIM_ATTEMPTS = 3
+
+def prepare_fork(container_id, child_names, reuse=False):
+    """
+    Commit a container, or reuse its cached commit, and copy its workspace for each child
+    
+    The container is paused meanwhile, so the image and the workspace copies
+    are taken at the same moment. It is moved to the 'forking' status first,
+    which the idle pauser, hibernation, restart and delete in every worker
+    leave alone, and back to 'running' afterwards. A cached commit is not
+    reused while an SSH session or exec is running, since the API cannot see
+    what they change.
+    
+    Returns:
+        tuple: (image ID, True if the cached image was reused)
+        
+    Raises:
+        Exception: If the container is not running or Docker fails
+    """
+    for _ in range(FORK_CLAIM_ATTEMPTS):
+        # Idle pausing may have paused it since the request woke it
+        idle_pauser.resume(container_id)
+        if active_containers.transition(container_id, 'forking', from_statuses=['running']) is not None:
+            break
+    else:
+        raise Exception(f"Container {container_id} is not running or is busy")
+    
+    try:
+        info = active_containers[container_id]
+        reuse = reuse and not container_in_use(info)
+        container = info['container_obj']
+        container.pause()
+        try:
+            image_id, cached = fork_image(info, reuse)
+            clone_workspaces(info['name'], child_names)
+        finally:
+            container.unpause()
+    finally:
+        active_containers.transition(container_id, 'running', from_statuses=['forking'])
+    return image_id, cached
+
+@api.route('/api/containers/<container_id>/fork', methods=['POST'])
+def fork_container(container_id):
+    """Start copies of a container from a commit of its filesystem and copies of its workspace"""
+    if container_id not in active_containers:
+        return jsonify({'error': 'Container not found'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        count = int(request.args.get('count', data.get('count', 1)))
+        if not 1 <= count <= FORK_MAX_COUNT:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'error': f'count must be an integer from 1 to {FORK_MAX_COUNT}'}), 400
+    reuse = str(request.args.get('cache', data.get('cache', False))).lower() in ('1', 'true', 'yes')
+    admission_args, error = parse_admission_args(data)
+    if error:
+        return error
+    priority, wait = admission_args
+    
+    error = wake_for_use(container_id)
+    if error:
+        return error
+    source = active_containers.get(container_id)
+    if source is None or source.get('status') != 'running':
+        return jsonify({'error': f'Container {container_id} is not running'}), 409
+    
+    started = time.perf_counter()
+    child_ids = [str(uuid.uuid4()) for _ in range(count)]
+    child_names = [f"ai-container-{child_id[:8]}" for child_id in child_ids]
+    try:
+        image_id, cached = prepare_fork(container_id, child_names, reuse)
+    except Exception as e:
+        remove_workspaces(child_names)
+        logger.error(f"Failed to fork container {container_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    # Children keep the parent's network, caches, datasets and resource profile, but not its alias
+    spec = dict(launch_spec(source), image=image_id, alias=None)
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(admit_and_launch, spec, source.get('resources'), priority, wait, container_id=child_id)
+                   for child_id in child_ids]
+    
+    children = []
+    errors = []
+    rejections = []
+    for child_name, future in zip(child_names, futures):
+        try:
+            child_info = future.result()
+            active_containers.update(child_info['id'], forked_from=container_id)
+            children.append(container_response(child_info))
+            continue
+        except AdmissionRejected as e:
+            rejections.append(e)
+            errors.append({'error': str(e), 'reason': e.reason})
+        except Exception as e:
+            logger.error(f"Failed to start fork {child_name} of {container_id}: {str(e)}")
+            errors.append({'error': str(e)})
+        remove_workspaces([child_name])
+    
+    if not children:
+        if rejections:
+            for e in rejections[1:]:
+                create_rejections.inc(reason=e.reason)
+            return rejection_response(rejections[0])
+        return jsonify({'error': errors[0]['error'], 'errors': errors}), 500
+    for e in rejections:
+        create_rejections.inc(reason=e.reason)
+    
+    elapsed = time.perf_counter() - started
+    logger.info(f"Forked {container_id} into {len(children)}/{count} containers in {elapsed:.2f}s "
+                f"({'cached' if cached else 'new'} image {image_id})")
+    return jsonify({
+        'source': container_id,
+        'image': image_id,
+        'image_cached': cached,
+        'children': children,
+        'errors': errors,
+        'seconds': round(elapsed, 3)
+    }), 201
+
+@api.route('/api/containers/<container_id>/exec', methods=['POST'])
+@api.route('/api/containers/exec/<container_id>', methods=['POST'])  # Added alternative endpoint
 def exec_command(container_id):
     """Execute a command in a container"""
     if container_id not in active_containers:
@@ -584,14 +1868,21 @@ def exec_command(container_id):
         return jsonify({'error': 'Command is required'}), 400
     
     try:
+        # Recreate it if hibernated, unpause it if paused for idleness
+        error = wake_for_use(container_id)
+        if error:
+            return error
+        mark_changed(container_id)
+        
         # Get container
         container_info = active_containers[container_id]
         container = container_info['container_obj']
         
         # SIMPLER APPROACH: Always use a shell to execute commands
         # This ensures shell builtins like 'cd' always work properly
-        logger.info(f"Executing command: {command}")
-        logger.info(f"Using shell for all commands")
+        logged_command = command_for_log(command)
+        if logged_command is not None:
+            logger.info(f"Executing command in {container_id}: {logged_command}")
         
         # Always use bash explicitly with the command as an argument
         exec_result = container.exec_run(
@@ -621,7 +1912,8 @@ def exec_command(container_id):
                 output = exec_result.output.decode('utf-8', errors='replace')
         
         # Log the result for debugging
-        logger.info(f"Command execution result: exit_code={exit_code}, output_length={len(output)}")
+        logger.debug(f"Command execution result: exit_code={exit_code}, output_length={len(output)}")
+        exec_output_bytes.observe(len(output))
         
         return jsonify({
             'exit_code': exit_code,
@@ -632,14 +1924,528 @@ def exec_command(container_id):
         logger.error(f"Failed to execute command in container {container_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@api.route('/api/transfer', methods=['POST'])
+def transfer_files():
+    """Stream a file or directory from one container into another"""
+    data = request.get_json(silent=True) or {}
+    source = data.get('source') or {}
+    destination = data.get('destination') or {}
+    
+    for side, spec in (('source', source), ('destination', destination)):
+        if not isinstance(spec, dict) or not spec.get('container') or not spec.get('path'):
+            return jsonify({'error': f'{side}.container and {side}.path are required'}), 400
+        if spec['container'] not in active_containers:
+            return jsonify({'error': f"{side.capitalize()} container {spec['container']} not found"}), 404
+    
+    try:
+        for side in (source, destination):
+            error = wake_for_use(side['container'])
+            if error:
+                return error
+        mark_changed(destination['container'])
+        source_obj = active_containers[source['container']]['container_obj']
+        destination_obj = active_containers[destination['container']]['container_obj']
+        
+        # put_archive needs an existing directory to extract into
+        exec_result = destination_obj.exec_run(["mkdir", "-p", destination['path']])
+        if exec_result.exit_code != 0:
+            return jsonify({'error': f"Failed to create destination directory {destination['path']}"}), 500
+        
+        logger.info(f"Transferring {source['container']}:{source['path']} to {destination['container']}:{destination['path']}")
+        result = transfer_path(source_obj, source['path'], destination_obj, destination['path'])
+        logger.info(f"Transferred {result['bytes']} bytes in {result['seconds']}s ({result['throughput_mb_per_sec']} MB/s)")
+        
+        return jsonify(result), 200
+    
+    except Exception as e:
+        logger.error(f"Failed to transfer files: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/containers/<container_id>/snapshots', methods=['POST'])
+def create_snapshot(container_id):
+    """Snapshot a container's workspace into the local snapshot store"""
+    if container_id not in active_containers:
+        return jsonify({'error': 'Container not found'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        error = wake_for_use(container_id)
+        if error:
+            return error
+        container_info = active_containers[container_id]
+        container = container_info['container_obj']
+        
+        logger.info(f"Creating snapshot of {WORKSPACE_PATH} in container {container_info['name']}")
+        stream, _ = container.get_archive(WORKSPACE_PATH, chunk_size=ARCHIVE_CHUNK_SIZE)
+        manifest = snapshot_store.create(
+            stream,
+            WORKSPACE_PATH,
+            container_id=container_id,
+            container_name=container_info['name'],
+            label=data.get('label')
+        )
+        logger.info(f"Snapshot {manifest['id']} created: {manifest['raw_bytes']} bytes, "
+                    f"{manifest['new_chunks']}/{len(manifest['chunks'])} new chunks")
+        
+        return jsonify(snapshot_store.summary(manifest)), 201
+    
+    except Exception as e:
+        logger.error(f"Failed to snapshot container {container_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/snapshots', methods=['GET'])
+@api.route('/api/containers/<container_id>/snapshots', methods=['GET'])
+def list_snapshots(container_id=None):
+    """List stored snapshots, optionally only those taken from one container"""
+    try:
+        manifests = snapshot_store.list(container_id=container_id)
+        return jsonify([snapshot_store.summary(manifest) for manifest in manifests]), 200
+    except Exception as e:
+        logger.error(f"Failed to list snapshots: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/containers/<container_id>/restore', methods=['POST'])
+def restore_snapshot(container_id):
+    """Restore a snapshot into a container's workspace"""
+    if container_id not in active_containers:
+        return jsonify({'error': 'Container not found'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    snapshot_id = data.get('snapshot_id')
+    if not snapshot_id:
+        return jsonify({'error': 'snapshot_id is required'}), 400
+    
+    manifest = snapshot_store.get(snapshot_id)
+    if manifest is None:
+        return jsonify({'error': 'Snapshot not found'}), 404
+    
+    try:
+        error = wake_for_use(container_id)
+        if error:
+            return error
+        mark_changed(container_id)
+        container = active_containers[container_id]['container_obj']
+        source_path = manifest.get('source_path', WORKSPACE_PATH)
+        start_time = time.perf_counter()
+        
+        # Check every chunk before touching the workspace, so a damaged snapshot leaves it as it was
+        try:
+            snapshot_store.verify(manifest)
+        except ValueError as e:
+            logger.error(f"Refusing to restore snapshot {snapshot_id}: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+        
+        # Replace the current contents unless asked to merge
+        if data.get('clean', True):
+            exec_result = container.exec_run(["find", source_path, "-mindepth", "1", "-delete"])
+            if exec_result.exit_code != 0:
+                logger.warning(f"Failed to clear {source_path} before restore: {exec_result.output}")
+        
+        # The archive contains the workspace directory itself, so extract into its parent
+        if not container.put_archive(os.path.dirname(source_path.rstrip('/')) or '/', snapshot_store.iter_archive(manifest)):
+            return jsonify({'error': 'Failed to extract snapshot'}), 500
+        
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"Restored snapshot {snapshot_id} into container {container_id} in {elapsed:.2f}s")
+        return jsonify({
+            'message': f'Snapshot {snapshot_id} restored into container {container_id}',
+            'bytes': manifest['raw_bytes'],
+            'seconds': round(elapsed, 4)
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Failed to restore snapshot {snapshot_id} into {container_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/snapshots/<snapshot_id>', methods=['DELETE'])
+def delete_snapshot(snapshot_id):
+    """Delete a snapshot and garbage-collect chunks nothing else references"""
+    try:
+        removed = snapshot_store.delete(snapshot_id)
+        if removed is None:
+            return jsonify({'error': 'Snapshot not found'}), 404
+        return jsonify({'message': f'Snapshot {snapshot_id} deleted', 'chunks_removed': removed}), 200
+    except Exception as e:
+        logger.error(f"Failed to delete snapshot {snapshot_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/caches', methods=['GET'])
+def cache_usage():
+    """Report the size and usage of the shared cache volumes"""
+    try:
+        return jsonify({
+            'enabled_by_default': ENABLE_SHARED_CACHES,
+            'caches': cache_manager.usage()
+        }), 200
+    except Exception as e:
+        logger.error(f"Failed to get cache usage: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/caches/evict', methods=['POST'])
+def evict_caches():
+    """Evict least recently used files from shared caches"""
+    data = request.get_json(silent=True) or {}
+    name = data.get('cache')
+    target_bytes = data.get('target_bytes')
+    
+    if name is not None and name not in cache_manager.caches:
+        return jsonify({'error': f'Unknown cache {name}'}), 404
+    if target_bytes is not None and (not isinstance(target_bytes, int) or target_bytes < 0):
+        return jsonify({'error': 'target_bytes must be a non-negative integer'}), 400
+    
+    try:
+        if name:
+            results = [cache_manager.evict(name, target_bytes)]
+        else:
+            results = cache_manager.evict_over_budget()
+        return jsonify({'evicted': results}), 200
+    except Exception as e:
+        logger.error(f"Failed to evict caches: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/datasets', methods=['POST'])
+def register_dataset():
+    """Register a dataset from uploaded files or a path on the host"""
+    try:
+        if request.files:
+            # Multipart upload: name and extract are form fields, files are streamed to disk
+            name = request.form.get('name')
+            extract = request.form.get('extract', 'false').lower() in ('1', 'true', 'yes')
+            record = dataset_registry.register_upload(name, request.files.getlist('files') or list(request.files.values()), extract=extract)
+        else:
+            data = request.get_json(silent=True) or {}
+            if not data.get('host_path'):
+                return jsonify({'error': 'Upload files or provide host_path'}), 400
+            record = dataset_registry.register_host_path(data.get('name'), data['host_path'], copy=bool(data.get('copy')))
+        
+        logger.info(f"Registered dataset {record['name']} ({record['size_bytes']} bytes, {record['files']} files)")
+        return jsonify(record), 201
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except FileExistsError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"Failed to register dataset: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/datasets', methods=['GET'])
+def list_datasets():
+    """List registered datasets"""
+    try:
+        return jsonify(dataset_registry.list()), 200
+    except Exception as e:
+        logger.error(f"Failed to list datasets: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/datasets/<name>', methods=['GET'])
+def get_dataset(name):
+    """Get a single dataset and the containers mounting it"""
+    record = dataset_registry.get(name)
+    if record is None:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
+    record['used_by'] = [container_id for container_id, info in active_containers.items()
+                         if name in (info.get('datasets') or [])]
+    return jsonify(record), 200
+
+@api.route('/api/datasets/<name>', methods=['DELETE'])
+def delete_dataset(name):
+    """Unregister a dataset that no tracked container is using"""
+    if dataset_registry.get(name) is None:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
+    used_by = [container_id for container_id, info in active_containers.items()
+               if name in (info.get('datasets') or [])]
+    if used_by:
+        return jsonify({'error': f'Dataset {name} is mounted by {len(used_by)} containers', 'used_by': used_by}), 409
+    
+    try:
+        dataset_registry.delete(name)
+        return jsonify({'message': f'Dataset {name} deleted successfully'}), 200
+    except Exception as e:
+        logger.error(f"Failed to delete dataset {name}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def parse_template(data, name=None):
+    """
+    Validate a template from a create or update request body
+    
+    Returns:
+        tuple: (template, None) or (None, error response)
+    """
+    if name is not None:
+        data = dict(data, name=name)
+    try:
+        template = normalize_template(data, CONTAINER_IMAGE)
+        if template['profile'] is not None or template['resources'] is not None:
+            resource_ledger.resolve(template['profile'], template['resources'], '')
+        return template, None
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+
+def template_details(template):
+    """A template with the containers created from it"""
+    return dict(template, used_by=[container_id for container_id, info in active_containers.items()
+                                   if info.get('template') == template['name']])
+
+@api.route('/api/templates', methods=['POST'])
+def create_template():
+    """Register a container template"""
+    template, error = parse_template(request.get_json(silent=True))
+    if error:
+        return error
+    
+    try:
+        record = template_registry.save(template)
+        logger.info(f"Registered template {record['name']} with {len(record['setup'])} setup commands")
+        return jsonify(record), 201
+    except FileExistsError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"Failed to register template: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/templates/<name>', methods=['PUT'])
+def update_template(name):
+    """Create or replace a container template; its image is rebuilt on next use"""
+    template, error = parse_template(request.get_json(silent=True) or {}, name)
+    if error:
+        return error
+    
+    try:
+        existed = template_registry.get(name) is not None
+        record = template_registry.save(template, replace=True)
+        return jsonify(record), 200 if existed else 201
+    except Exception as e:
+        logger.error(f"Failed to update template {name}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/templates', methods=['GET'])
+def list_templates():
+    """List container templates"""
+    try:
+        return jsonify([template_details(template) for template in template_registry.list()]), 200
+    except Exception as e:
+        logger.error(f"Failed to list templates: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/templates/<name>', methods=['GET'])
+def get_template(name):
+    """Get a single template and the containers created from it"""
+    template = template_registry.get(name)
+    if template is None:
+        return jsonify({'error': 'Template not found'}), 404
+    return jsonify(template_details(template)), 200
+
+@api.route('/api/templates/<name>/build', methods=['POST'])
+def build_template_image(name):
+    """Build a template's image ahead of its first use"""
+    template = template_registry.get(name)
+    if template is None:
+        return jsonify({'error': 'Template not found'}), 404
+    
+    image, steps, error = build_template(template, cache_manager.resolve(ENABLE_SHARED_CACHES))
+    if error:
+        return error
+    return jsonify({'template': name, 'image': image, 'setup_commands_run': steps, 'cached': steps == 0}), 200
+
+@api.route('/api/templates/<name>', methods=['DELETE'])
+def delete_template(name):
+    """Delete a container template; containers created from it keep running"""
+    if template_registry.delete(name) is None:
+        return jsonify({'error': 'Template not found'}), 404
+    return jsonify({'message': f'Template {name} deleted successfully'}), 200
+
+def get_container_ip(container_info):
+    """
+    Get the IP address of a tracked container on the Docker network
+
+    The address is cached per process and cleared when the container restarts.
+
+    Args:
+        container_info (dict): Tracking info from active_containers
+
+    Returns:
+        str or None: The container IP, or None if it has no network address
+    """
+    ip_address = container_ips.get(container_info['id'])
+    if ip_address:
+        return ip_address
+
+    container = container_info['container_obj']
+    network_settings = client.api.inspect_container(container.id).get('NetworkSettings') or {}
+
+    # Prefer addresses on attached networks, fall back to the default bridge address
+    for network in (network_settings.get('Networks') or {}).values():
+        if network and network.get('IPAddress'):
+            ip_address = network['IPAddress']
+            break
+    else:
+        ip_address = network_settings.get('IPAddress') or None
+
+    if ip_address:
+        container_ips[container_info['id']] = ip_address
+    return ip_address
+
+@api.route('/api/containers/<container_id>/http/<int:port>/', defaults={'path': ''}, methods=PREVIEW_METHODS)
+@api.route('/api/containers/<container_id>/http/<int:port>/<path:path>', methods=PREVIEW_METHODS)
+def preview_http(container_id, port, path):
+    """Reverse-proxy a request to an HTTP server running inside a container"""
+    if container_id not in active_containers:
+        return jsonify({'error': 'Container not found'}), 404
+
+    if not 0 < port < 65536:
+        return jsonify({'error': 'Invalid port'}), 400
+
+    try:
+        error = wake_for_use(container_id)
+        if error:
+            return error
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            mark_changed(container_id)
+        container_info = active_containers[container_id]
+        ip_address = get_container_ip(container_info)
+        if not ip_address:
+            return jsonify({'error': 'Container has no network address, is it running?'}), 409
+    except Exception as e:
+        logger.error(f"Failed to resolve address for container {container_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    prefix = f"/api/containers/{container_id}/http/{port}"
+    headers = list(request.headers.items())
+    headers.extend([
+        ('X-Forwarded-For', request.remote_addr or ''),
+        ('X-Forwarded-Host', request.host),
+        ('X-Forwarded-Proto', request.scheme),
+        ('X-Forwarded-Prefix', prefix)
+    ])
+
+    try:
+        upstream = preview_gateway.forward(
+            request.method,
+            ip_address,
+            port,
+            path,
+            request.query_string.decode('latin-1'),
+            headers,
+            request.stream,
+            request.content_length
+        )
+    except requests.exceptions.Timeout as e:
+        logger.warning(f"Preview request to {container_id}:{port} timed out: {str(e)}")
+        return jsonify({'error': f'Upstream timed out: {str(e)}'}), 504
+    except requests.exceptions.RequestException as e:
+        # The cached address may be stale, resolve it again on the next request
+        container_ips.pop(container_id, None)
+        logger.warning(f"Preview request to {container_id}:{port} failed: {str(e)}")
+        return jsonify({'error': f'Upstream unavailable: {str(e)}'}), 502
+
+    response_headers = []
+    for name, value in preview_gateway.filter_headers(upstream.raw.headers.items()):
+        # Keep redirects inside the gateway prefix
+        if name.lower() == 'location' and value.startswith('/'):
+            value = prefix + value
+        response_headers.append((name, value))
+
+    return Response(
+        stream_with_context(preview_gateway.iter_body(upstream)),
+        status=upstream.status_code,
+        headers=response_headers,
+        direct_passthrough=True
+    )
+
+def ensure_managed_network(network_name):
+    """
+    Get or create the managed bridge network with the given short name
+
+    Args:
+        network_name (str): Network name without the managed prefix
+
+    Returns:
+        docker.models.networks.Network: The managed network
+    """
+    full_name = f"{MANAGED_NETWORK_PREFIX}{network_name}"
+    with network_lock:
+        # The name filter matches substrings, so compare exact names
+        for network in client.networks.list(names=[full_name]):
+            if network.name == full_name:
+                return network
+        
+        logger.info(f"Creating managed network {full_name}")
+        return client.networks.create(
+            full_name,
+            driver='bridge',
+            check_duplicate=True,
+            labels={MANAGED_NETWORK_LABEL: network_name}
+        )
+
+@api.route('/api/containers/<container_id>/peers', methods=['GET'])
+def list_peers(container_id):
+    """List the containers sharing a managed network with this container"""
+    if container_id not in active_containers:
+        return jsonify({'error': 'Container not found'}), 404
+    
+    network_name = active_containers[container_id].get('network')
+    if not network_name:
+        return jsonify({'network': None, 'peers': []}), 200
+    
+    try:
+        # One inspect of the network gives the IP of every attached container
+        network = client.networks.get(f"{MANAGED_NETWORK_PREFIX}{network_name}")
+        endpoints = network.attrs.get('Containers') or {}
+        
+        peers = []
+        for peer_id, info in active_containers.items():
+            # Hibernated peers have no Docker container to reach
+            if peer_id == container_id or info.get('network') != network_name or info.get('status') in DORMANT_STATUSES:
+                continue
+            
+            docker_id = info.get('docker_id') or getattr(info['container_obj'], 'id', None)
+            endpoint = endpoints.get(docker_id) or {}
+            peers.append({
+                'id': peer_id,
+                'name': info.get('name'),
+                'status': info.get('status'),
+                'aliases': info.get('network_aliases') or [],
+                'ip_address': (endpoint.get('IPv4Address') or '').split('/')[0] or None
+            })
+        
+        return jsonify({'network': network_name, 'peers': peers}), 200
+    
+    except Exception as e:
+        logger.error(f"Failed to list peers for container {container_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@tracer.traced()
 def find_available_port(start_port, end_port):
     """Find an available port in the given range"""
-    # Check if port is already in use by any container
-    used_ports = set()
-    for _, info in active_containers.items():
-        used_ports.add(info.get('ssh_port'))
+    # Check if port is already in use by any container, or held by a launch in progress
+    used_ports = set(launch_ports) | tracked_ports(active_containers.values()) | docker_host_ports()
+    
+    # Find first available port
+    for port in range(start_port, end_port):
+        if port not in used_ports:
+            return port
     
-    # Also check for ports in use by Docker
+    raise Exception("No available ports found")
+
+def tracked_ports(records):
+    """SSH ports of tracking records; reconciled records hold them as strings"""
+    ports = set()
+    for info in records:
+        try:
+            ports.add(int(info.get('ssh_port')))
+        except (ValueError, TypeError):
+            pass
+    return ports
+
+def docker_host_ports():
+    """Host ports bound by any running Docker container"""
+    used_ports = set()
     try:
         # Get all containers (not just our managed ones)
         all_containers = client.containers.list()
@@ -660,15 +2466,9 @@ def find_available_port(start_port, end_port):
                                 pass
     except Exception as e:
         logger.warning(f"Error checking container ports: {str(e)}")
-    
-    # Find first available port
-    for port in range(start_port, end_port):
-        if port not in used_ports:
-            return port
-    
-    raise Exception("No available ports found")
+    return used_ports
 
-@app.route('/api/containers/refresh', methods=['GET', 'POST'])
+@api.route('/api/containers/refresh', methods=['GET', 'POST'])
 def refresh_containers():
     """Reset container tracking and rediscover all containers"""
     try:
@@ -720,8 +2520,8 @@ def refresh_containers():
         logger.error(f"Failed to refresh container tracking: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/containers/cleanup', methods=['POST'])
-@app.route('/api/cleanup', methods=['POST'])  # Added simpler alternative endpoint
+@api.route('/api/containers/cleanup', methods=['POST'])
+@api.route('/api/cleanup', methods=['POST'])  # Added simpler alternative endpoint
 def cleanup_containers():
     """Stop and remove all containers"""
     try:
@@ -729,20 +2529,11 @@ def cleanup_containers():
         failed_count = 0
         
         # First, clean up containers tracked in active_containers
-        container_ids = list(active_containers.keys())
-        for container_id in container_ids:
+        for container_id in list(active_containers.keys()):
             try:
-                # Get container info
-                container_info = active_containers[container_id]
-                container = container_info['container_obj']
-                
-                # Stop and remove the container
-                container.stop()
-                container.remove()
-                
-                # Remove from active containers
-                del active_containers[container_id]
-                cleanup_count += 1
+                # Stop, remove and untrack the container, skipping ones already being removed
+                if remove_tracked_container(container_id):
+                    cleanup_count += 1
                 
             except Exception as e:
                 logger.error(f"Failed to clean up container {container_id}: {str(e)}")
@@ -770,6 +2561,18 @@ def cleanup_containers():
         except Exception as e:
             logger.error(f"Error listing untracked containers: {str(e)}")
         
+        # Remove managed networks that no longer have any containers attached
+        try:
+            client.networks.prune(filters={'label': MANAGED_NETWORK_LABEL})
+        except Exception as e:
+            logger.warning(f"Failed to prune managed networks: {str(e)}")
+        
+        # Remove fork images, now that no container runs from them
+        try:
+            client.images.prune(filters={'label': FORK_IMAGE_LABEL, 'dangling': False})
+        except Exception as e:
+            logger.warning(f"Failed to prune fork images: {str(e)}")
+        
         return jsonify({
             'message': f'Cleanup completed. {cleanup_count} containers removed, {failed_count} failed.',
             'success_count': cleanup_count,
@@ -780,74 +2583,277 @@ def cleanup_containers():
         logger.error(f"Failed to perform cleanup: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/containers/stats', methods=['GET'])
-@app.route('/api/stats', methods=['GET'])  # Added simpler alternative endpoint
+# Stats ages are rounded to 0.01 hours, so their ETag also changes every 36 seconds
+STATS_ETAG_SECONDS = 36
+
+@api.route('/api/containers/stats', methods=['GET'])
+@api.route('/api/stats', methods=['GET'])  # Added simpler alternative endpoint
 def container_stats():
     """Get statistics about container usage"""
+    options, error = parse_listing_args(STATS_FIELDS)
+    if error:
+        return error
+    
     try:
+        # Also check for running containers that might not be in active_containers
+        try:
+            untracked = untracked_containers()
+        except Exception as e:
+            logger.error(f"Error listing untracked containers in stats: {str(e)}")
+            untracked = []
+        
+        admission_stats = admission.stats()
+        idle_stats = idle_pauser.stats()
+        etag = listing_etag('stats', untracked, CONTAINER_EXPIRY_HOURS, HIBERNATE_EXPIRY_HOURS, int(time.time() // STATS_ETAG_SECONDS),
+                            admission_stats['in_flight'], admission_stats['queue_depth'], admission_stats['rejected'],
+                            idle_stats)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         # Get all containers with our naming pattern
         all_containers = []
         
-        # Get containers from active_containers dictionary
-        for container_id, info in active_containers.items():
+        # Get containers from active_containers registry
+        for container_id, info in tracked_records(options['statuses']):
             creation_time = info.get('created_at', 0)
             age_hours = (time.time() - creation_time) / 3600
             all_containers.append({
                 'id': container_id,
                 'name': info.get('name'),
+                'status': info.get('status'),
                 'age_hours': round(age_hours, 2),
-                'expires_in_hours': round(CONTAINER_EXPIRY_HOURS - age_hours, 2),
+                'expires_in_hours': round((expires_at(info) - time.time()) / 3600, 2),
                 'tracked': True
             })
         
-        # Also check for running containers that might not be in active_containers
-        try:
-            docker_containers = client.containers.list(filters={"name": "ai-container-"})
-            for container in docker_containers:
-                container_id = container.name.split('-')[-1]
-                # Skip if already in our list
-                if container_id in active_containers:
-                    continue
-                
+        for container in untracked:
+            if options['statuses'] and container['status'] not in options['statuses']:
+                continue
+            try:
                 # Get creation time from Docker API
-                container_info = client.api.inspect_container(container.id)
+                container_info = client.api.inspect_container(container['docker_id'])
                 creation_time_str = container_info.get('Created', '')
                 
-                # Parse Docker timestamp
-                try:
-                    # Docker timestamps are in ISO 8601 format
-                    dt = datetime.fromisoformat(creation_time_str.replace('Z', '+00:00'))
-                    creation_timestamp = dt.timestamp()
-                    age_hours = (time.time() - creation_timestamp) / 3600
-                    
-                    all_containers.append({
-                        'id': container_id,
-                        'name': container.name,
-                        'age_hours': round(age_hours, 2),
-                        'expires_in_hours': round(CONTAINER_EXPIRY_HOURS - age_hours, 2),
-                        'tracked': False
-                    })
-                except Exception as e:
-                    logger.error(f"Error parsing container creation time: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error listing untracked containers in stats: {str(e)}")
+                # Docker timestamps are in ISO 8601 format
+                dt = datetime.fromisoformat(creation_time_str.replace('Z', '+00:00'))
+                creation_timestamp = dt.timestamp()
+                age_hours = (time.time() - creation_timestamp) / 3600
+                
+                all_containers.append({
+                    'id': container['id'],
+                    'name': container['name'],
+                    'status': container['status'],
+                    'age_hours': round(age_hours, 2),
+                    'expires_in_hours': round(CONTAINER_EXPIRY_HOURS - age_hours, 2),
+                    'tracked': False
+                })
+            except Exception as e:
+                logger.error(f"Error parsing container creation time: {str(e)}")
         
         # Sort by age (oldest first)
         all_containers.sort(key=lambda x: x['age_hours'], reverse=True)
+        active_count = len(all_containers)
+        containers, next_cursor = page_listing(all_containers, options)
         
-        return jsonify({
-            'active_count': len(all_containers),
+        return listing_response({
+            'active_count': active_count,
             'expiry_hours': CONTAINER_EXPIRY_HOURS,
-            'containers': all_containers
-        }), 200
+            'admission': admission_stats,
+            'idle': idle_stats,
+            'containers': containers
+        }, etag, next_cursor)
     
     except Exception as e:
         logger.error(f"Failed to get container stats: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@api.route('/api/containers/metrics', methods=['GET'])
+def fleet_metrics():
+    """Latest resource usage of every sampled container, with fleet totals"""
+    usage = usage_sampler.fleet()
+    usage['sampled_count'] = len(usage['containers'])
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit > 0:
+        # Heaviest CPU users first
+        top = sorted(usage['containers'].items(), key=lambda item: item[1]['cpu_percent'] or 0, reverse=True)
+        usage['containers'] = dict(top[:limit])
+    return jsonify(usage)
+
+@api.route('/api/resources', methods=['GET'])
+def resource_usage():
+    """Host capacity, reserved CPU and memory, and the resource profiles"""
+    usage = resource_ledger.usage()
+    usage['default_profile'] = DEFAULT_RESOURCE_PROFILE or None
+    return jsonify(usage)
+
+@api.route('/api/containers/<container_id>/metrics', methods=['GET'])
+def container_metrics(container_id):
+    """Resource usage history of one container"""
+    resolution = request.args.get('resolution', '1m')
+    if resolution not in [name for name, _, _ in RESOLUTIONS]:
+        return jsonify({'error': f"resolution must be one of {', '.join(name for name, _, _ in RESOLUTIONS)}"}), 400
+    since = request.args.get('since', type=float)
+    
+    usage = usage_sampler.container(container_id, resolution, since)
+    if usage is None:
+        if container_id not in active_containers:
+            return jsonify({'error': 'Container not found'}), 404
+        usage = {'latest': None, 'latest_at': None, 'timestamps': [], 'series': {}}
+    usage.update({'id': container_id, 'resolution': resolution, 'interval': usage_sampler.interval})
+    return jsonify(usage)
+
+@api.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    endpoint = (request.endpoint or 'unmatched').rsplit('.', 1)[-1]
+    tracer.start_trace(f"{request.method} {request.path}", method=request.method, path=request.path,
+                       endpoint=endpoint)
+    g.profile = profiler.request_started(endpoint)
+
+@api.after_app_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = (request.endpoint or 'unmatched').rsplit('.', 1)[-1]
+        request_duration.observe(
+            time.perf_counter() - start, endpoint=endpoint, method=request.method, status=response.status_code
+        )
+    g.response_status = response.status_code
+    return response
+
+@api.after_app_request
+def compress_api_response(response):
+    # Registered after record_request_metrics so it runs first and is timed
+    if not COMPRESS_RESPONSES or request.endpoint == 'api.preview_http':
+        return response
+    return compress_response(response, COMPRESS_MIN_BYTES)
+
+@api.teardown_app_request
+def finish_request_trace(error):
+    profiler.request_finished(g.pop('profile', None))
+    tracer.finish_trace(status=g.pop('response_status', 500))
+
+def admin_error():
+    """
+    Check the admin token on the current request
+    
+    Returns:
+        tuple or None: An error response, or None if the caller is an admin
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled; set ADMIN_TOKEN to enable them'}), 403
+    header = request.headers.get('Authorization', '')
+    token = header[len('Bearer '):] if header.startswith('Bearer ') else request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({'error': 'Admin token required'}), 401
+    return None
+
+@api.route('/api/debug/profile', methods=['POST'])
+def start_profile():
+    """Start profiling live requests"""
+    error = admin_error()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    try:
+        session = profiler.start(
+            mode=data.get('mode', 'cprofile'),
+            endpoint=data.get('endpoint'),
+            max_requests=int(data['requests']) if data.get('requests') is not None else None,
+            duration=float(data['duration']) if data.get('duration') is not None else None,
+            interval=float(data.get('interval', 0.005))
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    logger.info(f"Started {session.mode} profiling session {session.id}")
+    return jsonify(session.summary()), 201
+
+@api.route('/api/debug/profile', methods=['GET'])
+def profile_status():
+    """Show the running profiling session and recent results"""
+    error = admin_error()
+    if error:
+        return error
+    current = profiler.current()
+    return jsonify({
+        'current': current.summary() if current else None,
+        'results': [session.summary() for session in reversed(profiler.results)]
+    }), 200
+
+@api.route('/api/debug/profile/stop', methods=['POST'])
+def stop_profile():
+    """Stop the running profiling session"""
+    error = admin_error()
+    if error:
+        return error
+    session = profiler.stop()
+    if session is None:
+        return jsonify({'error': 'No profiling session is running'}), 404
+    return jsonify(session.summary()), 200
+
+@api.route('/api/debug/profile/<session_id>', methods=['GET'])
+def get_profile(session_id):
+    """Get profiling results as pstats text or collapsed stacks"""
+    error = admin_error()
+    if error:
+        return error
+    session = profiler.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Profiling session not found'}), 404
+    if not session.finished:
+        return jsonify({'error': 'Profiling session is still running', 'session': session.summary()}), 409
+    
+    output_format = request.args.get('format', 'collapsed' if session.mode == 'sampling' else 'pstats')
+    if output_format == 'pstats':
+        if session.mode != 'cprofile':
+            return jsonify({'error': 'pstats output needs a cprofile session'}), 400
+        try:
+            limit = int(request.args.get('limit', 50))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            return jsonify({'error': f"Unknown sort key {sort}"}), 400
+        return Response(session.pstats_text(sort, limit), mimetype='text/plain')
+    if output_format == 'collapsed':
+        if session.mode != 'sampling':
+            return jsonify({'error': 'Collapsed stacks need a sampling session'}), 400
+        return Response(session.collapsed(), mimetype='text/plain')
+    return jsonify({'error': 'format must be pstats or collapsed'}), 400
+
+@api.route('/api/debug/traces', methods=['GET'])
+def list_traces():
+    """List recent request traces, newest first"""
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    n_plus_one_only = request.args.get('n_plus_one', '').lower() in ('1', 'true', 'yes')
+    return jsonify({
+        'n_plus_one_threshold': tracer.n_plus_one_threshold,
+        'traces': tracer.recent(limit, n_plus_one_only)
+    }), 200
+
+@api.route('/api/debug/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """Get one request trace with its span tree"""
+    trace = tracer.get(trace_id)
+    if trace is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    return jsonify(trace), 200
+
+@api.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose metrics in the Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     # When run directly, ensure shell builtins like 'cd' always work properly
     print("Starting AI Container Manager in standalone mode")
     print("Using direct Docker commands for container exec endpoint")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # The reloader runs this module in a parent and a child process, only the child serves
+    create_app({'START_SERVICES': os.environ.get('WERKZEUG_RUN_MAIN') == 'true'}).run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
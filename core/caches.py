@@ -0,0 +1,211 @@
+"""
+Shared package and model cache volumes
+Mounts pip, npm and Hugging Face caches from named volumes shared by every AI
+container, tracks their size and evicts least-recently-used files
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CACHE_VOLUME_LABEL = 'ai-container-manager.cache'
+
+# Cache name -> volume, mount path and environment pointing tools at it
+DEFAULT_CACHES = {
+    'pip': {
+        'volume': 'ai-cache-pip',
+        'path': '/root/.cache/pip',
+        'environment': {'PIP_CACHE_DIR': '/root/.cache/pip'}
+    },
+    'npm': {
+        'volume': 'ai-cache-npm',
+        'path': '/root/.npm',
+        'environment': {'npm_config_cache': '/root/.npm'}
+    },
+    'huggingface': {
+        'volume': 'ai-cache-huggingface',
+        'path': '/root/.cache/huggingface',
+        'environment': {'HF_HOME': '/root/.cache/huggingface'}
+    }
+}
+
+# Runs inside a helper container with the cache volume mounted at /cache.
+# Deletes the least recently used files until the cache fits in the target size.
+EVICTION_SCRIPT = """
+import os, sys
+target = int(sys.argv[1])
+files = []
+total = 0
+for directory, _, names in os.walk('/cache'):
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+        total += st.st_size
+        files.append((max(st.st_atime, st.st_mtime), st.st_size, path))
+files.sort()
+freed = removed = 0
+for _, size, path in files:
+    if total - freed <= target:
+        break
+    try:
+        os.remove(path)
+    except OSError:
+        continue
+    freed += size
+    removed += 1
+print(total, freed, removed)
+"""
+
+
+class SharedCacheManager:
+    """Builds cache mounts for new containers and keeps cache volumes within budget"""
+
+    def __init__(self, client, caches=None, max_bytes=20 * 1024 ** 3, target_ratio=0.8,
+                 helper_image='ai-container-image:latest'):
+        self.client = client
+        self.caches = caches if caches is not None else DEFAULT_CACHES
+        self.max_bytes = max_bytes
+        self.target_ratio = target_ratio
+        self.helper_image = helper_image
+        self.last_used = {}
+        self.last_eviction = {}
+        self.created_volumes = set()
+        self.lock = threading.Lock()
+
+    def resolve(self, requested):
+        """
+        Turn the `caches` field of a create request into a list of cache names
+
+        Args:
+            requested: True for all caches, False/[] for none, or a list of names
+
+        Returns:
+            list: Cache names to mount
+
+        Raises:
+            ValueError: If the value is malformed or an unknown cache is requested
+        """
+        if requested is True:
+            return list(self.caches)
+        if requested is False or requested is None:
+            return []
+        if isinstance(requested, str):
+            requested = [requested]
+        if not isinstance(requested, list) or not all(isinstance(name, str) for name in requested):
+            raise ValueError("caches must be true, false or a list of cache names")
+        unknown = [name for name in requested if name not in self.caches]
+        if unknown:
+            raise ValueError(f"Unknown caches: {', '.join(map(str, unknown))}")
+        return list(dict.fromkeys(requested))
+
+    def _ensure_volume(self, volume_name, cache_name):
+        """Create the labelled cache volume once per process"""
+        if volume_name in self.created_volumes:
+            return
+        try:
+            self.client.volumes.get(volume_name)
+        except Exception:
+            self.client.volumes.create(name=volume_name, labels={CACHE_VOLUME_LABEL: cache_name})
+        self.created_volumes.add(volume_name)
+
+    def mounts(self, names):
+        """
+        Get the volumes and environment for a container using the given caches
+
+        Returns:
+            tuple: (volumes dict for containers.run, environment dict)
+        """
+        volumes = {}
+        environment = {}
+        now = time.time()
+        with self.lock:
+            for name in names:
+                spec = self.caches[name]
+                self._ensure_volume(spec['volume'], name)
+                volumes[spec['volume']] = {'bind': spec['path'], 'mode': 'rw'}
+                environment.update(spec.get('environment') or {})
+                self.last_used[name] = now
+        return volumes, environment
+
+    def usage(self):
+        """
+        Report the size of every cache volume
+
+        Uses a single `docker system df` call, which measures all volumes at once.
+        """
+        volume_sizes = {}
+        for volume in self.client.df().get('Volumes') or []:
+            usage = volume.get('UsageData') or {}
+            volume_sizes[volume.get('Name')] = (usage.get('Size'), usage.get('RefCount'))
+
+        report = {}
+        for name, spec in self.caches.items():
+            size, ref_count = volume_sizes.get(spec['volume'], (None, None))
+            report[name] = {
+                'volume': spec['volume'],
+                'path': spec['path'],
+                'size_bytes': size if size is not None and size >= 0 else None,
+                'max_bytes': self.max_bytes,
+                'containers_using': ref_count,
+                'last_used': self.last_used.get(name),
+                'last_eviction': self.last_eviction.get(name)
+            }
+        return report
+
+    def evict(self, name, target_bytes=None):
+        """
+        Delete least recently used files from a cache until it fits the target size
+
+        Args:
+            name (str): Cache name
+            target_bytes (int): Size to shrink to, defaults to target_ratio * max_bytes
+
+        Returns:
+            dict: Size before eviction, bytes freed and files removed
+        """
+        spec = self.caches[name]
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * self.target_ratio)
+
+        output = self.client.containers.run(
+            self.helper_image,
+            ['python3', '-c', EVICTION_SCRIPT, str(target_bytes)],
+            remove=True,
+            volumes={spec['volume']: {'bind': '/cache', 'mode': 'rw'}}
+        )
+        total, freed, removed = (int(value) for value in output.decode('utf-8').split()[-3:])
+        result = {
+            'cache': name,
+            'size_before_bytes': total,
+            'freed_bytes': freed,
+            'files_removed': removed,
+            'target_bytes': target_bytes,
+            'evicted_at': time.time()
+        }
+        self.last_eviction[name] = result
+        logger.info(f"Evicted {removed} files ({freed} bytes) from cache {name}")
+        return result
+
+    def evict_over_budget(self):
+        """Evict from every cache that is larger than max_bytes"""
+        results = []
+        for name, info in self.usage().items():
+            if info['size_bytes'] is not None and info['size_bytes'] > self.max_bytes:
+                try:
+                    results.append(self.evict(name))
+                except Exception as e:
+                    logger.error(f"Failed to evict cache {name}: {str(e)}")
+        return results
+
+    def run_eviction_loop(self, interval):
+        """Background loop that keeps caches within budget"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.evict_over_budget()
+            except Exception as e:
+                logger.error(f"Error in cache eviction job: {str(e)}")
@@ -0,0 +1,258 @@
+"""
+Dataset registry
+Stores datasets once on the host and mounts them read-only into containers,
+so parallel workers share a single copy
+"""
+import os
+import re
+import json
+import time
+import uuid
+import stat
+import shutil
+import tarfile
+import zipfile
+import threading
+
+DATASET_NAME_PATTERN = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9_.-]{0,62}$')
+
+# Where datasets appear inside containers
+DATASET_MOUNT_ROOT = '/datasets'
+
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz', '.zip')
+
+
+def _directory_size(path):
+    """Total size and file count of a file or directory tree"""
+    if os.path.isfile(path):
+        return os.path.getsize(path), 1
+    total = 0
+    count = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+                count += 1
+            except OSError:
+                pass
+    return total, count
+
+
+def resolve_host_path(host_path, host_roots):
+    """
+    Resolve a host path and check that it lies under one of the allowed roots
+
+    Args:
+        host_path (str): Absolute path on the host
+        host_roots (list): Directories host paths may be taken from
+
+    Returns:
+        str: The path with symlinks resolved
+
+    Raises:
+        ValueError: If the path is relative or outside every root
+    """
+    if not isinstance(host_path, str) or not os.path.isabs(host_path):
+        raise ValueError("host_path must be an absolute path")
+    if not host_roots:
+        raise ValueError("Host paths are disabled; set DATASET_HOST_ROOTS to allow them")
+    resolved = os.path.realpath(host_path)
+    for root in host_roots:
+        root = os.path.realpath(root)
+        if resolved == root or resolved.startswith(root.rstrip(os.sep) + os.sep):
+            return resolved
+    raise ValueError(f"host_path must be inside one of: {', '.join(host_roots)}")
+
+
+def _extract_archive(archive_path, destination):
+    """Extract a tar or zip archive of regular files and directories that stay inside the destination"""
+    destination = os.path.realpath(destination)
+    if archive_path.endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                target = os.path.realpath(os.path.join(destination, member.filename))
+                mode = member.external_attr >> 16
+                if not target.startswith(destination + os.sep) or (mode and not (stat.S_ISREG(mode) or stat.S_ISDIR(mode))):
+                    raise ValueError(f"Archive member {member.filename} is not allowed in a dataset")
+            archive.extractall(destination)
+    else:
+        with tarfile.open(archive_path) as archive:
+            for member in archive.getmembers():
+                target = os.path.realpath(os.path.join(destination, member.name))
+                # Links, devices and fifos could reach or stand in for files outside the dataset
+                if not target.startswith(destination + os.sep) or not (member.isfile() or member.isdir()):
+                    raise ValueError(f"Archive member {member.name} is not allowed in a dataset")
+            archive.extractall(destination)
+
+
+class DatasetRegistry:
+    """
+    Registry of host-side datasets, persisted as a JSON index in the store directory
+
+    Host paths can only be registered from under `host_roots`; with no roots
+    only uploads are accepted.
+    """
+
+    def __init__(self, root, host_roots=()):
+        self.root = root
+        self.host_roots = list(host_roots)
+        self.index_path = os.path.join(root, 'index.json')
+        self.lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, index):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def validate_name(name):
+        if not isinstance(name, str) or not DATASET_NAME_PATTERN.match(name):
+            raise ValueError("Dataset name must be 1-63 letters, digits, '_', '.' or '-'")
+
+    def list(self):
+        return sorted(self._load().values(), key=lambda d: d['name'])
+
+    def get(self, name):
+        return self._load().get(name)
+
+    def _register(self, record):
+        with self.lock:
+            index = self._load()
+            if record['name'] in index:
+                raise FileExistsError(f"Dataset {record['name']} already exists")
+            index[record['name']] = record
+            self._save(index)
+        return record
+
+    def _new_record(self, name, path, source, managed):
+        size, files = _directory_size(path)
+        return {
+            'name': name,
+            'host_path': path,
+            'mount_path': f"{DATASET_MOUNT_ROOT}/{name}",
+            'source': source,
+            'managed': managed,
+            'size_bytes': size,
+            'files': files,
+            'created_at': time.time()
+        }
+
+    def register_upload(self, name, uploads, extract=False):
+        """
+        Store uploaded files as a new dataset
+
+        Args:
+            name (str): Dataset name
+            uploads (list): werkzeug FileStorage objects, saved by streaming to disk
+            extract (bool): Unpack uploaded tar/zip archives into the dataset
+
+        Returns:
+            dict: The dataset record
+        """
+        self.validate_name(name)
+        if not uploads:
+            raise ValueError("At least one file is required")
+        if self.get(name):
+            raise FileExistsError(f"Dataset {name} already exists")
+
+        staging = os.path.join(self.root, 'staging', f"{name}-{uuid.uuid4().hex[:8]}")
+        final_path = os.path.join(self.root, 'data', name)
+        os.makedirs(staging)
+        try:
+            for upload in uploads:
+                filename = os.path.basename(upload.filename or '')
+                if not filename or filename in ('.', '..'):
+                    raise ValueError("Uploaded files must have a file name")
+                file_path = os.path.join(staging, filename)
+                upload.save(file_path)
+                if extract and filename.endswith(ARCHIVE_SUFFIXES):
+                    _extract_archive(file_path, staging)
+                    os.remove(file_path)
+
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.rename(staging, final_path)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        try:
+            return self._register(self._new_record(name, final_path, 'upload', True))
+        except Exception:
+            shutil.rmtree(final_path, ignore_errors=True)
+            raise
+
+    def register_host_path(self, name, host_path, copy=False):
+        """
+        Register a file or directory that already exists on the host
+
+        Args:
+            name (str): Dataset name
+            host_path (str): Absolute path on the host, under one of the host roots
+            copy (bool): Copy into the dataset store instead of mounting in place
+
+        Returns:
+            dict: The dataset record
+
+        Raises:
+            ValueError: If the path is outside the host roots
+            FileNotFoundError: If the path does not exist
+        """
+        self.validate_name(name)
+        host_path = resolve_host_path(host_path, self.host_roots)
+        if not os.path.exists(host_path):
+            raise FileNotFoundError(f"Path {host_path} does not exist")
+        if self.get(name):
+            raise FileExistsError(f"Dataset {name} already exists")
+
+        if not copy:
+            return self._register(self._new_record(name, host_path, 'host_path', False))
+
+        final_path = os.path.join(self.root, 'data', name)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        if os.path.isdir(host_path):
+            shutil.copytree(host_path, final_path, symlinks=True)
+        else:
+            os.makedirs(final_path)
+            shutil.copy2(host_path, final_path)
+        try:
+            return self._register(self._new_record(name, final_path, 'host_path', True))
+        except Exception:
+            shutil.rmtree(final_path, ignore_errors=True)
+            raise
+
+    def delete(self, name):
+        """Remove a dataset from the registry, deleting its files if the store owns them"""
+        with self.lock:
+            index = self._load()
+            record = index.pop(name, None)
+            if record is None:
+                return None
+            self._save(index)
+        if record.get('managed'):
+            shutil.rmtree(record['host_path'], ignore_errors=True)
+        return record
+
+    def mounts(self, names):
+        """
+        Build read-only volume bindings for the given datasets
+
+        Raises:
+            KeyError: If a dataset is not registered
+        """
+        index = self._load()
+        volumes = {}
+        for name in names:
+            record = index.get(name)
+            if record is None:
+                raise KeyError(name)
+            volumes[record['host_path']] = {'bind': record['mount_path'], 'mode': 'ro'}
+        return volumes
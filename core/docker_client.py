@@ -0,0 +1,57 @@
+"""
+Lazily connected Docker client
+Defers importing the Docker SDK and connecting to the daemon until the first call
+"""
+import threading
+
+
+class LazyDockerClient:
+    """
+    Proxy for docker.DockerClient that connects on first attribute access
+
+    Code can hold and pass the proxy around at import time; nothing talks to
+    the Docker daemon until something like `client.containers.list()` runs.
+
+    Args:
+        on_connect (callable): Called with each client the proxy builds itself,
+            e.g. to instrument it; not called for clients passed to configure()
+    """
+
+    def __init__(self, on_connect=None):
+        self._client = None
+        self._factory = None
+        self._on_connect = on_connect
+        self._lock = threading.Lock()
+
+    def configure(self, client=None, factory=None):
+        """
+        Use a specific client, or a factory that builds one on first use
+
+        Args:
+            client: Ready-made client (e.g. a mock in tests)
+            factory (callable): Called without arguments to build the client
+        """
+        with self._lock:
+            self._client = client
+            self._factory = factory
+
+    @property
+    def connected(self):
+        return self._client is not None
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if self._factory is not None:
+                        docker_client = self._factory()
+                    else:
+                        import docker
+                        docker_client = docker.from_env()
+                    if self._on_connect is not None:
+                        self._on_connect(docker_client)
+                    self._client = docker_client
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self._get_client(), name)
@@ -0,0 +1,146 @@
+"""
+Response encoding
+JSON provider backed by orjson when installed, MessagePack content negotiation
+and gzip/zstd response compression negotiated through Accept-Encoding
+"""
+import gzip
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # the standard json module is used when orjson is not installed
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # responses are always JSON when msgpack is not installed
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # only gzip is offered when zstandard is not installed
+    zstandard = None
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/msgpack', 'text/plain')
+
+# Fast settings: most of the size reduction on JSON for a fraction of the CPU
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+def wants_msgpack():
+    """True if the current request prefers MessagePack over JSON"""
+    if msgpack is None or not has_request_context():
+        return False
+    accept = request.accept_mimetypes
+    named = {value for value, _ in accept}
+    quality = max(accept[mimetype] for mimetype in MSGPACK_MIMETYPES)
+    return bool(named & set(MSGPACK_MIMETYPES)) and quality > 0 and quality >= accept['application/json']
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes with orjson when it is installed
+
+    Output matches the default provider (sorted keys, dates as HTTP dates)
+    except that non-ASCII characters are sent as UTF-8 instead of \\u escapes.
+    Values orjson cannot encode, such as integers over 64 bits, fall back to
+    the standard json module. jsonify() responses are sent as MessagePack to
+    clients that ask for it in Accept.
+    """
+
+    def _orjson_options(self, indent=False):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode('utf-8')
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if wants_msgpack():
+            response = self._app.response_class(
+                msgpack.packb(obj, default=self.default), mimetype='application/msgpack')
+            response.vary.add('Accept')
+            return response
+
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = None
+        if orjson is not None:
+            try:
+                body = orjson.dumps(obj, default=self.default,
+                                    option=self._orjson_options(indent) | orjson.OPT_APPEND_NEWLINE)
+            except TypeError:
+                pass
+        if body is None:
+            body = f"{super().dumps(obj, **({'indent': 2} if indent else {'separators': (',', ':')}))}\n"
+        response = self._app.response_class(body, mimetype=self.mimetype)
+        if msgpack is not None:
+            response.vary.add('Accept')
+        return response
+
+
+def choose_encoding(accept_encodings):
+    """
+    Pick the response Content-Encoding from Accept-Encoding
+
+    Returns:
+        str or None: 'zstd', 'gzip' or None for identity
+    """
+    offered = (['zstd'] if zstandard is not None else []) + ['gzip']
+    best = None
+    for encoding in offered:
+        quality = accept_encodings[encoding]
+        if quality > 0 and (best is None or quality > accept_encodings[best]):
+            best = encoding
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, min_size=1024):
+    """
+    Compress a buffered response for the current request if the client accepts it
+
+    Streamed, already encoded, small and non-API responses are left alone.
+
+    Returns:
+        Response: The same response, compressed in place when worthwhile
+    """
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.content_length is not None and response.content_length < min_size:
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
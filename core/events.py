@@ -0,0 +1,166 @@
+"""
+Container change events
+Bounded in-memory log of create, status change, expire and delete events
+derived from registry revisions, served to watchers as server-sent events
+"""
+import json
+import time
+import threading
+from collections import deque
+from types import MappingProxyType
+
+
+class Event:
+    """One change to one container"""
+    __slots__ = ('revision', 'index', 'type', 'data')
+
+    def __init__(self, revision, index, event_type, data):
+        self.revision = revision
+        self.index = index
+        self.type = event_type
+        self.data = data
+
+    @property
+    def key(self):
+        return (self.revision, self.index)
+
+    @property
+    def id(self):
+        return f"{self.revision}-{self.index}"
+
+    def sse(self):
+        return format_sse(self.type, self.data, self.id)
+
+
+def format_sse(event_type, data, event_id=None):
+    """Encode one server-sent event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_event_id(value):
+    """
+    Parse a Last-Event-ID value
+
+    Event IDs are '<revision>-<index>'; snapshots use '<revision>', which
+    sorts after every event of that revision.
+
+    Returns:
+        tuple or None: (revision, index) resume key, or None if malformed
+    """
+    if not value:
+        return None
+    revision, _, index = value.strip().partition('-')
+    try:
+        return (int(revision), int(index) if index else float('inf'))
+    except ValueError:
+        return None
+
+
+def container_summary(container_id, info):
+    return {'id': container_id, 'name': info.get('name'), 'status': info.get('status')}
+
+
+class EventLog:
+    """
+    Recent container events, fed by ContainerRegistry.add_listener()
+
+    Events are keyed by (registry revision, index within the revision). The
+    log also keeps the records of the latest revision, so a snapshot and the
+    events after it are always consistent.
+
+    A watcher can resume after a key when the log saw that exact revision and
+    has not dropped any event since. Otherwise it has to start over from a
+    snapshot: events were evicted, the process restarted, or (with several
+    workers) this worker picked up several other workers' writes in one sync.
+
+    Args:
+        size (int): Events and revisions to keep
+    """
+
+    def __init__(self, size=1000):
+        self.events = deque(maxlen=size)
+        self.revisions = deque([0], maxlen=size)
+        self.records = MappingProxyType({})
+        self.revision = 0
+        self.floor = (0, 0)
+        self.condition = threading.Condition()
+
+    def record(self, old_records, new_records, changed_ids, revision):
+        """Registry listener: turn one published revision into events"""
+        now = time.time()
+        events = []
+        for container_id in sorted(changed_ids):
+            before = old_records.get(container_id)
+            after = new_records.get(container_id)
+            if before is None and after is None:
+                continue
+            if before is None:
+                event_type = 'created'
+            elif after is None:
+                event_type = 'expired' if before.get('removal_reason') == 'expired' else 'deleted'
+            elif before.get('status') != after.get('status'):
+                event_type = 'status'
+            else:
+                continue
+            data = container_summary(container_id, after if after is not None else before)
+            data['previous_status'] = before.get('status') if before is not None else None
+            if after is not None and after.get('removal_reason'):
+                data['reason'] = after['removal_reason']
+            data['revision'] = revision
+            data['time'] = now
+            events.append(Event(revision, len(events), event_type, data))
+
+        with self.condition:
+            if revision <= self.revision:
+                # The registry switched to another store; nothing before this can be resumed
+                self.events.clear()
+                self.revisions.clear()
+                self.floor = (revision, 0)
+            for event in events:
+                if len(self.events) == self.events.maxlen:
+                    self.floor = self.events[0].key
+                self.events.append(event)
+            self.revisions.append(revision)
+            self.records = new_records
+            self.revision = revision
+            self.condition.notify_all()
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: (revision, list of container summaries) at the latest revision
+        """
+        with self.condition:
+            revision, records = self.revision, self.records
+        return revision, [container_summary(container_id, info) for container_id, info in sorted(records.items())]
+
+    def since(self, key):
+        """
+        Events after a resume key
+
+        Returns:
+            list or None: Events in order, or None if the key cannot be resumed
+        """
+        with self.condition:
+            return self._since(key)
+
+    def _since(self, key):
+        if key < self.floor or key[0] > self.revision or key[0] not in self.revisions:
+            return None
+        if not self.events or self.events[-1].key <= key:
+            return []
+        return [event for event in self.events if event.key > key]
+
+    def wait(self, key, timeout):
+        """Like since(), but block up to timeout seconds for a new event"""
+        with self.condition:
+            events = self._since(key)
+            if events == []:
+                self.condition.wait(timeout)
+                events = self._since(key)
+            return events
@@ -0,0 +1,27 @@
+"""
+Gunicorn configuration for the production launch mode
+
+Every worker imports the app separately (no preload), shares container state
+through the SQLite store and elects one worker to run background services.
+"""
+import os
+import multiprocessing
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Threaded workers: Docker calls are I/O bound, so threads keep each worker busy
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('THREADS', 8))
+
+# Long commands run synchronously inside /exec, so allow slow requests
+timeout = int(os.environ.get('TIMEOUT', 600))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+# Workers must share container state; set this before they import the app
+os.environ.setdefault('CONTAINER_STATE_DB', '/tmp/ai-container-manager-state.db')
@@ -0,0 +1,127 @@
+"""
+HTTP preview gateway
+Reverse-proxies HTTP requests to web servers running inside AI containers
+over the Docker network, so they can be reached without publishing host ports
+"""
+import requests
+from requests.adapters import HTTPAdapter
+
+# Headers that only apply to a single connection (plus Host) and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    'connection',
+    'keep-alive',
+    'proxy-authenticate',
+    'proxy-authorization',
+    'te',
+    'trailers',
+    'transfer-encoding',
+    'upgrade',
+    'host',
+}
+
+# Credentials meant for the manager (and anything else on its host) that code in a container must not see
+CREDENTIAL_HEADERS = {
+    'authorization',
+    'cookie',
+    'x-admin-token',
+}
+
+# Size of the chunks used when streaming bodies in either direction
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _RequestBodyStream:
+    """File-like wrapper that lets requests send a body of known length without buffering it"""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+class PreviewGateway:
+    """
+    Forwards requests to container-local HTTP servers using a pooled
+    keep-alive session. Upstream bodies are streamed, never buffered.
+    """
+
+    def __init__(self, pool_connections=16, pool_maxsize=64, connect_timeout=5, read_timeout=300):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # Never pick up HTTP(S)_PROXY from the environment for container traffic
+        self.session.trust_env = False
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+
+    @staticmethod
+    def filter_headers(headers):
+        """Drop hop-by-hop headers from an iterable of (name, value) pairs"""
+        headers = list(headers)
+        # Connection can name further headers that only apply to this hop
+        dropped = set(HOP_BY_HOP_HEADERS)
+        for name, value in headers:
+            if name.lower() == 'connection':
+                dropped.update(token.strip().lower() for token in value.split(','))
+        return [(name, value) for name, value in headers if name.lower() not in dropped]
+
+    @classmethod
+    def filter_request_headers(cls, headers):
+        """Drop hop-by-hop headers and client credentials from request headers bound for a container"""
+        return [(name, value) for name, value in cls.filter_headers(headers)
+                if name.lower() not in CREDENTIAL_HEADERS]
+
+    def forward(self, method, ip_address, port, path, query_string, headers, body_stream, content_length):
+        """
+        Send a request to a container and return the streaming upstream response
+
+        Args:
+            method (str): HTTP method
+            ip_address (str): Container IP on the Docker network
+            port (int): Port the service listens on inside the container
+            path (str): Path below the gateway prefix (without leading slash)
+            query_string (str): Raw query string, may be empty
+            headers (list): Incoming request headers as (name, value) pairs
+            body_stream: File-like object with the request body
+            content_length (int or None): Length of the request body if known
+
+        Returns:
+            requests.Response: Upstream response opened with stream=True
+        """
+        url = f"http://{ip_address}:{port}/{path}"
+        if query_string:
+            url += f"?{query_string}"
+
+        upstream_headers = dict(self.filter_request_headers(headers))
+        upstream_headers.pop('Content-Length', None)
+
+        if content_length:
+            data = _RequestBodyStream(body_stream, content_length)
+        elif method in ('GET', 'HEAD', 'OPTIONS', 'DELETE'):
+            data = None
+        else:
+            # Unknown length, forward using chunked transfer encoding
+            data = iter(lambda: body_stream.read(STREAM_CHUNK_SIZE), b'')
+
+        return self.session.request(
+            method,
+            url,
+            headers=upstream_headers,
+            data=data,
+            stream=True,
+            allow_redirects=False,
+            timeout=self.timeout
+        )
+
+    @staticmethod
+    def iter_body(upstream):
+        """Yield the raw (still encoded) upstream body and release the connection afterwards"""
+        try:
+            for chunk in upstream.raw.stream(STREAM_CHUNK_SIZE, decode_content=False):
+                yield chunk
+        finally:
+            upstream.close()
@@ -0,0 +1,184 @@
+"""
+Idle container pausing
+Pauses running containers that have seen no exec, file or preview activity for
+a while, and unpauses them again when they are next used
+"""
+import time
+import logging
+import statistics
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+SSH_PORT = 22
+TCP_ESTABLISHED = '01'
+
+
+def open_connections(tcp_tables, port):
+    """
+    Count established connections to a local port
+
+    Args:
+        tcp_tables (str): Contents of /proc/net/tcp and /proc/net/tcp6
+        port (int): Local port
+
+    Returns:
+        int: Number of established connections
+    """
+    count = 0
+    for line in tcp_tables.splitlines():
+        fields = line.split()
+        # Header lines have no address in the local_address column
+        if len(fields) < 4 or ':' not in fields[1]:
+            continue
+        try:
+            local_port = int(fields[1].rsplit(':', 1)[1], 16)
+        except ValueError:
+            continue
+        if local_port == port and fields[3] == TCP_ESTABLISHED:
+            count += 1
+    return count
+
+
+class IdlePauser:
+    """
+    Pauses tracked containers after `idle_seconds` without activity
+
+    Activity is the time of the last exec, file operation or preview request,
+    kept in the tracking record as 'last_active_at' so every worker sees it.
+    Writes are throttled to one per `activity_resolution` seconds per
+    container. Before pausing, `busy(info)` is asked whether anything the
+    API does not see, such as a long exec or an SSH session, is still using
+    the container; a busy container counts as active.
+
+    Args:
+        registry (ContainerRegistry): Tracked containers
+        idle_seconds (float): Idle time before pausing; 0 disables pausing
+        busy (callable): Returns True if a container is in use, or None
+        check_interval (float): Seconds between idle checks
+    """
+
+    def __init__(self, registry, idle_seconds, busy=None, check_interval=30):
+        self.registry = registry
+        self.idle_seconds = idle_seconds
+        self.busy = busy
+        self.check_interval = check_interval
+        self.pauses = 0
+        self.resumes = 0
+        self.resume_latencies = deque(maxlen=200)
+
+    @property
+    def activity_resolution(self):
+        return min(10, self.idle_seconds / 4)
+
+    def idle_for(self, info, now):
+        """Seconds since the container was last used"""
+        return now - (info.get('last_active_at') or info.get('created_at') or now)
+
+    def touch(self, container_id, now=None):
+        """Record activity so the container is not paused"""
+        if self.idle_seconds <= 0:
+            return
+        now = now or time.time()
+        info = self.registry.get(container_id)
+        if info is not None and self.idle_for(info, now) >= self.activity_resolution:
+            self.registry.update(container_id, last_active_at=now)
+
+    def resume(self, container_id):
+        """
+        Unpause a paused container before it is used, and record activity
+
+        Returns:
+            float or None: Seconds spent unpausing, None if it was not paused
+
+        Raises:
+            Exception: If Docker fails to unpause it
+        """
+        info = self.registry.get(container_id)
+        if info is None or info.get('status') != 'paused':
+            self.touch(container_id)
+            return None
+
+        started = time.perf_counter()
+        with self.registry.lock_for(container_id):
+            info = self.registry.get(container_id)
+            if info is None or info.get('status') != 'paused':
+                # Resumed by a concurrent request while we waited for the lock
+                return None
+            container = info['container_obj']
+            try:
+                container.unpause()
+            except Exception:
+                # Another worker may have unpaused it first
+                container.reload()
+                if container.status != 'running':
+                    raise
+            self.registry.transition(container_id, 'running', from_statuses=['paused'],
+                                     last_active_at=time.time(), paused_at=None)
+        elapsed = time.perf_counter() - started
+        self.resumes += 1
+        self.resume_latencies.append(elapsed)
+        logger.info(f"Unpaused idle container {info.get('name')} in {elapsed * 1000:.1f}ms")
+        return elapsed
+
+    def pause_if_idle(self, container_id, now=None):
+        """
+        Pause a running container that has been idle long enough
+
+        Returns:
+            bool: True if it was paused
+        """
+        now = now or time.time()
+        with self.registry.lock_for(container_id):
+            info = self.registry.get(container_id)
+            if info is None or info.get('status') != 'running' or self.idle_for(info, now) < self.idle_seconds:
+                return False
+            if self.busy is not None and self.busy(info):
+                self.registry.update(container_id, last_active_at=now)
+                return False
+
+            container = info['container_obj']
+            container.pause()
+            if self.registry.transition(container_id, 'paused', from_statuses=['running'], paused_at=now) is None:
+                # Changed by another worker while we paused it
+                container.unpause()
+                return False
+        self.pauses += 1
+        logger.info(f"Paused container {info.get('name')} after {self.idle_for(info, now):.0f}s idle")
+        return True
+
+    def check(self, now=None):
+        """Pause every running container that is idle; returns the number paused"""
+        now = now or time.time()
+        paused = 0
+        for info in self.registry.by_status('running'):
+            if self.idle_for(info, now) < self.idle_seconds:
+                continue
+            try:
+                paused += self.pause_if_idle(info['id'], now)
+            except Exception as e:
+                logger.error(f"Failed to pause idle container {info.get('name')}: {str(e)}")
+        return paused
+
+    def run(self):
+        """Check for idle containers forever; run in a daemon thread"""
+        while True:
+            if self.idle_seconds > 0:
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error(f"Error in idle checker: {str(e)}")
+            time.sleep(self.check_interval)
+
+    def stats(self):
+        latencies = sorted(self.resume_latencies)
+        return {
+            'idle_seconds': self.idle_seconds,
+            'paused': len(self.registry.by_status('paused')),
+            'pauses': self.pauses,
+            'resumes': self.resumes,
+            'recent_resume_seconds': {
+                'p50': round(statistics.median(latencies), 4) if latencies else None,
+                'max': round(latencies[-1], 4) if latencies else None
+            }
+        }
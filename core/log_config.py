@@ -0,0 +1,164 @@
+"""
+Logging pipeline
+Queue-based, non-blocking logging: request threads only enqueue records and a
+listener thread formats and writes them, optionally as JSON lines
+"""
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry)
+
+
+JsonFormatter.converter = time.gmtime
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limit how often the same warning or error is logged
+
+    Records are grouped by call site (logger, level, file and line), so an
+    f-string error repeated for many containers counts as one message. After
+    `burst` records in `interval` seconds the rest are dropped, and the next
+    record let through reports how many were suppressed.
+
+    Args:
+        interval (float): Window length in seconds
+        burst (int): Records allowed per call site and window
+        min_level (int): Records below this level are never limited
+    """
+
+    def __init__(self, interval=60, burst=5, min_level=logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.min_level = min_level
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.min_level:
+            return True
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window['start'] >= self.interval:
+                suppressed = window['suppressed'] if window else 0
+                window = self.windows[key] = {'start': now, 'count': 0, 'suppressed': 0}
+                if suppressed:
+                    record.suppressed = suppressed
+                    record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+                    record.args = None
+            if window['count'] >= self.burst:
+                window['suppressed'] += 1
+                return False
+            window['count'] += 1
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Merge the message and exception text now, keeping them separate for JSON output"""
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+
+
+def configure_logging(level=logging.INFO, json_format=False, queue_size=10000, stream=None,
+                      rate_limit_interval=60, rate_limit_burst=5):
+    """
+    Route all logging through a queue drained by a background listener
+
+    Replaces the root logger's handlers, so calling it again reconfigures
+    the pipeline instead of adding a second one.
+
+    Args:
+        level (int or str): Root log level
+        json_format (bool): Write JSON lines instead of plain text
+        queue_size (int): Records buffered before new ones are dropped
+        stream: Where to write, stderr by default
+        rate_limit_interval (float): Window for limiting repeated warnings and errors
+        rate_limit_burst (int): Repeats allowed per window
+
+    Returns:
+        logging.handlers.QueueListener: The running listener
+    """
+    global _listener
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if json_format:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    output.addFilter(RateLimitFilter(rate_limit_interval, rate_limit_burst))
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+    _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,242 @@
+"""
+Prometheus-style metrics
+Counters, gauges and histograms rendered in the Prometheus text exposition
+format, plus instrumentation for Docker Engine API calls
+"""
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a fast inspect to a slow image pull
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Output size buckets in bytes, 64 B to 16 MiB
+SIZE_BUCKETS = tuple(64 * 4 ** i for i in range(10))
+
+# Docker Engine API methods to time. Every high-level SDK call goes through these:
+# containers.run -> create_container + start, exec_run -> exec_create + exec_start,
+# containers.list -> containers + inspect_container per result, and so on.
+DOCKER_API_OPERATIONS = (
+    'containers', 'inspect_container', 'create_container', 'start', 'stop', 'restart',
+    'kill', 'pause', 'unpause', 'remove_container', 'wait', 'logs', 'stats', 'top',
+    'exec_create', 'exec_start', 'exec_inspect', 'get_archive', 'put_archive', 'commit',
+    'images', 'inspect_image', 'build', 'pull', 'remove_image',
+    'networks', 'inspect_network', 'create_network', 'remove_network', 'prune_networks',
+    'connect_container_to_network', 'disconnect_container_from_network',
+    'volumes', 'inspect_volume', 'create_volume', 'remove_volume', 'df'
+)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down
+
+    With a function, the gauge is computed at scrape time. The function
+    returns a number, or a dict of label value tuples to numbers.
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self.values = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        if self.function is not None:
+            result = self.function()
+            values = result if isinstance(result, dict) else {(): result}
+            values = sorted((tuple(str(v) for v in key), value) for key, value in values.items())
+        else:
+            with self.lock:
+                values = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def count(self, **labels):
+        series = self.series.get(self._key(labels))
+        return series['count'] if series else 0
+
+    def samples(self):
+        with self.lock:
+            series = sorted((key, dict(value, counts=list(value['counts']))) for key, value in self.series.items())
+        lines = []
+        for key, value in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), value['counts']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(value['sum'])}")
+            lines.append(f"{self.name}_count{labels} {value['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together for a scrape"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Render every metric in the Prometheus text format"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+docker_calls = registry.counter(
+    'docker_api_calls_total', 'Docker Engine API calls by operation and outcome', ('operation', 'outcome'))
+docker_call_duration = registry.histogram(
+    'docker_api_call_duration_seconds', 'Docker Engine API call latency', ('operation',))
+
+
+@contextmanager
+def docker_call(operation):
+    """Time a Docker Engine API call and count its outcome"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'success'
+    finally:
+        docker_call_duration.observe(time.perf_counter() - start, operation=operation)
+        docker_calls.inc(operation=operation, outcome=outcome)
+
+
+def instrument_api_client(api, operations=DOCKER_API_OPERATIONS, call_context=docker_call):
+    """
+    Wrap the methods of a docker.APIClient so every call is timed
+
+    High-level SDK objects (containers, networks, volumes) all call through
+    the shared APIClient, so instrumenting it covers every Docker call.
+
+    Args:
+        api: The client's low-level docker.APIClient
+        operations (iterable): Method names to wrap
+        call_context (callable): Context manager factory taking the operation
+            name, entered around each call; docker_call by default
+
+    Returns:
+        The same APIClient
+    """
+    for operation in operations:
+        method = getattr(api, operation, None)
+        if method is None or getattr(method, '_instrumented', False):
+            continue
+
+        def wrapper(*args, _method=method, _operation=operation, **kwargs):
+            with call_context(_operation):
+                return _method(*args, **kwargs)
+
+        functools.update_wrapper(wrapper, method)
+        wrapper._instrumented = True
+        setattr(api, operation, wrapper)
+    return api
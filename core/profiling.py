@@ -0,0 +1,251 @@
+"""
+On-demand profiling
+Profiles live request handlers for a time window or the next N requests, with
+cProfile (pstats output) or a stack sampler (collapsed stacks for flamegraphs).
+Costs a single attribute check per request while no session is running.
+"""
+import io
+import sys
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+from collections import deque, Counter
+
+PROFILE_MODES = ('cprofile', 'sampling')
+
+
+class ProfileSession:
+    """One profiling run and its results"""
+
+    def __init__(self, mode, endpoint=None, max_requests=None, duration=None, interval=0.005):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.endpoint = endpoint
+        self.max_requests = max_requests
+        self.duration = duration
+        self.interval = interval
+        self.started_at = time.time()
+        self.finished_at = None
+        self.requests = 0
+        self.skipped = 0
+        self.samples = 0
+        self.stats = None
+        self.stacks = Counter()
+        self.active_threads = set()
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def expired(self):
+        if self.duration is not None and time.time() - self.started_at >= self.duration:
+            return True
+        return self.max_requests is not None and self.requests >= self.max_requests
+
+    def matches(self, endpoint):
+        return self.endpoint is None or self.endpoint == endpoint
+
+    def add_profile(self, profile):
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'mode': self.mode,
+            'endpoint': self.endpoint,
+            'max_requests': self.max_requests,
+            'duration': self.duration,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'requests_profiled': self.requests,
+            'requests_skipped': self.skipped,
+            'samples': self.samples,
+            'finished': self.finished
+        }
+
+    def pstats_text(self, sort='cumulative', limit=50):
+        """Render the merged cProfile statistics as text"""
+        if self.stats is None:
+            return 'No requests were profiled\n'
+        output = io.StringIO()
+        with self.lock:
+            stats = pstats.Stats(stream=output)
+            stats.add(self.stats)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def collapsed(self):
+        """Render stacks as 'frame;frame;frame count' lines for flamegraph tools"""
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', code.co_filename)
+    return f"{module}:{code.co_name}"
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Profiler:
+    """
+    Runs at most one profiling session at a time
+
+    The app calls request_started() and request_finished() around every
+    request; both return immediately when no session is running.
+
+    cProfile mode profiles whole requests one at a time: a request that
+    starts while another is being profiled is counted as skipped. Sampling
+    mode reads the stacks of threads serving matching requests every
+    `interval` seconds from a background thread.
+    """
+
+    def __init__(self, keep=10):
+        self.session = None
+        self.results = deque(maxlen=keep)
+        self.lock = threading.Lock()
+        self.cprofile_lock = threading.Lock()
+
+    def start(self, mode='cprofile', endpoint=None, max_requests=None, duration=None, interval=0.005):
+        """
+        Start a profiling session
+
+        Args:
+            mode (str): 'cprofile' or 'sampling'
+            endpoint (str): Only profile requests to this endpoint, e.g. 'exec_command'
+            max_requests (int): Stop after this many profiled requests
+            duration (float): Stop after this many seconds
+            interval (float): Seconds between stack samples in sampling mode
+
+        Returns:
+            ProfileSession: The new session
+
+        Raises:
+            ValueError: For an unknown mode or without any stop condition
+            RuntimeError: If a session is already running
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+        if max_requests is None and duration is None:
+            raise ValueError("Set requests, duration or both")
+        if (max_requests is not None and max_requests < 1) or (duration is not None and duration <= 0):
+            raise ValueError("requests and duration must be positive")
+        with self.lock:
+            self._expire()
+            if self.session is not None:
+                raise RuntimeError(f"Profiling session {self.session.id} is already running")
+            session = ProfileSession(mode, endpoint, max_requests, duration, interval)
+            self.session = session
+        if mode == 'sampling':
+            threading.Thread(target=self._sample, args=(session,), daemon=True, name='profiler-sampler').start()
+        return session
+
+    def stop(self):
+        """Stop the running session early and return it, or None"""
+        with self.lock:
+            session = self.session
+            if session is not None:
+                self._finish(session)
+        return session
+
+    def _finish(self, session):
+        """Move a session to the results. The caller holds the lock."""
+        if session.finished_at is None:
+            session.finished_at = time.time()
+            self.results.append(session)
+        if self.session is session:
+            self.session = None
+
+    def _expire(self):
+        session = self.session
+        if session is not None and session.expired() and not session.active_threads:
+            self._finish(session)
+
+    def current(self):
+        with self.lock:
+            self._expire()
+            return self.session
+
+    def get(self, session_id):
+        with self.lock:
+            self._expire()
+            if self.session is not None and self.session.id == session_id:
+                return self.session
+            for session in self.results:
+                if session.id == session_id:
+                    return session
+        return None
+
+    def request_started(self, endpoint):
+        """
+        Begin profiling the current request if a session wants it
+
+        Returns:
+            tuple or None: Handle to pass to request_finished()
+        """
+        session = self.session
+        if session is None or not session.matches(endpoint):
+            return None
+        with self.lock:
+            if self.session is not session or session.expired():
+                self._expire()
+                return None
+            if session.max_requests is not None and session.requests + len(session.active_threads) >= session.max_requests:
+                return None
+            thread_id = threading.get_ident()
+            if session.mode == 'cprofile':
+                if not self.cprofile_lock.acquire(blocking=False):
+                    session.skipped += 1
+                    return None
+                session.active_threads.add(thread_id)
+                profile = cProfile.Profile()
+                profile.enable()
+                return session, thread_id, profile
+            session.active_threads.add(thread_id)
+            return session, thread_id, None
+
+    def request_finished(self, handle):
+        if handle is None:
+            return
+        session, thread_id, profile = handle
+        if profile is not None:
+            profile.disable()
+            self.cprofile_lock.release()
+            session.add_profile(profile)
+        with self.lock:
+            session.active_threads.discard(thread_id)
+            session.requests += 1
+            if self.session is session:
+                self._expire()
+
+    def _sample(self, session):
+        own_thread = threading.get_ident()
+        while not session.finished:
+            time.sleep(session.interval)
+            threads = set(session.active_threads) - {own_thread}
+            if threads:
+                frames = sys._current_frames()
+                with session.lock:
+                    for thread_id in threads:
+                        frame = frames.get(thread_id)
+                        if frame is not None:
+                            session.stacks[_collapse(frame)] += 1
+                            session.samples += 1
+            with self.lock:
+                if self.session is session:
+                    self._expire()
@@ -0,0 +1,380 @@
+"""
+Container registry
+Thread-safe tracking of AI containers with atomic status transitions, snapshot
+iteration for readers and secondary indexes by name and status
+"""
+import threading
+from types import MappingProxyType
+
+from core.state_store import LazyContainer
+
+# Fields of a tracking record that only make sense inside one process
+LOCAL_FIELDS = ('container_obj',)
+
+_EMPTY = MappingProxyType({})
+
+
+class _State:
+    """Immutable view of the registry at one revision"""
+    __slots__ = ('records', 'by_name', 'by_status', 'revision')
+
+    def __init__(self, records, by_name, by_status, revision):
+        self.records = records
+        self.by_name = by_name
+        self.by_status = by_status
+        self.revision = revision
+
+
+class ContainerRegistry:
+    """
+    Registry of tracked containers, keyed by container ID
+
+    Writers serialize on a lock, build the next state from the current one and
+    publish it with a single reference swap (copy-on-write). Readers never take
+    the lock: they grab the current state and iterate it without copying, and
+    it never changes underneath them. Records are treated as immutable once
+    published; use update() or transition() to change indexed fields.
+
+    With a ContainerStateStore, every write also goes to SQLite and reads pick up
+    changes made by other processes, while container objects stay cached here.
+    A cached object is dropped when the record's 'docker_id' changes, i.e. when
+    another process removed the Docker container and created a new one.
+
+    The mapping protocol (`id in registry`, `registry[id]`, `del registry[id]`,
+    `items()`) is supported so existing callers keep working.
+    """
+
+    def __init__(self, store=None, resolve_container=None):
+        self.store = store
+        self.resolve_container = resolve_container
+        self._state = _State(_EMPTY, _EMPTY, _EMPTY, 0)
+        self._write_lock = threading.RLock()
+        self._container_locks = {}
+        self._container_locks_lock = threading.Lock()
+        self._synced_store_revision = None
+        self._listeners = []
+
+
+    def add_listener(self, listener):
+        """
+        Call listener(old_records, new_records, changed_ids, revision) after every change
+
+        Listeners run under the write lock, so they must be quick and must not
+        write to the registry.
+        """
+        self._listeners.append(listener)
+
+    def use_store(self, store):
+        """Switch to a different shared store, re-reading state from it on next access"""
+        with self._write_lock:
+            self.store = store
+            self._synced_store_revision = None
+            if store is None:
+                self._publish(replace=True)
+
+    @staticmethod
+    def _persistable(info):
+        return {key: value for key, value in info.items() if key not in LOCAL_FIELDS}
+
+    def _publish(self, upserts=None, removals=(), replace=False, revision=None):
+        """Build and publish the next state. The caller holds the write lock."""
+        state = self._state
+        records = {} if replace else dict(state.records)
+        by_name = {} if replace else dict(state.by_name)
+        by_status = {} if replace else dict(state.by_status)
+
+        def unindex(container_id, info):
+            if by_name.get(info.get('name')) == container_id:
+                del by_name[info.get('name')]
+            status = info.get('status')
+            remaining = by_status.get(status, frozenset()) - {container_id}
+            if remaining:
+                by_status[status] = remaining
+            else:
+                by_status.pop(status, None)
+
+        def index(container_id, info):
+            if info.get('name'):
+                by_name[info['name']] = container_id
+            status = info.get('status')
+            by_status[status] = by_status.get(status, frozenset()) | {container_id}
+
+        for container_id in removals:
+            old = records.pop(container_id, None)
+            if old is not None:
+                unindex(container_id, old)
+        for container_id, info in (upserts or {}).items():
+            old = records.get(container_id)
+            if old is not None:
+                unindex(container_id, old)
+            records[container_id] = info
+            index(container_id, info)
+
+        if revision is None:
+            revision = state.revision + 1
+        self._state = _State(MappingProxyType(records), MappingProxyType(by_name), MappingProxyType(by_status), revision)
+
+        if self._listeners:
+            if replace:
+                changed = set(state.records) | set(records)
+            else:
+                changed = set(removals) | set(upserts or ())
+            for listener in self._listeners:
+                listener(state.records, self._state.records, changed, revision)
+
+    def _record_store_write(self, store_revision):
+        """
+        Track the store revision after our own write, unless another process wrote in between
+
+        Returns:
+            int or None: Revision to publish the local state at
+        """
+        if store_revision is not None and self._synced_store_revision == store_revision - 1:
+            self._synced_store_revision = store_revision
+        return store_revision
+
+    def _sync(self):
+        """Pick up writes made by other processes through the shared store"""
+        if self.store is None or self.store.revision() == self._synced_store_revision:
+            return
+        with self._write_lock:
+            revision, records = self.store.load_all()
+            if revision == self._synced_store_revision:
+                return
+            current = self._state.records
+            upserts = {}
+            for container_id, record in records.items():
+                info = dict(record)
+                existing = current.get(container_id)
+                # Keep our container object unless another worker replaced the Docker container (wake, fork)
+                if (existing is not None and 'container_obj' in existing
+                        and existing.get('docker_id') == record.get('docker_id')):
+                    info['container_obj'] = existing['container_obj']
+                else:
+                    info['container_obj'] = LazyContainer(record.get('name'), self.resolve_container)
+                upserts[container_id] = info
+            self._publish(upserts, replace=True, revision=revision)
+            self._synced_store_revision = revision
+
+    def _current(self):
+        self._sync()
+        return self._state
+
+
+    @property
+    def revision(self):
+        """Monotonically increasing revision, bumped on every change"""
+        return self._current().revision
+
+    def refresh(self):
+        """Pick up writes made by other processes now, returning the revision"""
+        return self._current().revision
+
+    def snapshot(self):
+        """Read-only mapping of every record at the current revision"""
+        return self._current().records
+
+    def get(self, container_id, default=None):
+        return self._current().records.get(container_id, default)
+
+    def by_name(self, name):
+        """Find a record by container name"""
+        state = self._current()
+        container_id = state.by_name.get(name)
+        return state.records.get(container_id) if container_id is not None else None
+
+    def by_status(self, status):
+        """List the records currently in the given status"""
+        state = self._current()
+        return [state.records[container_id] for container_id in state.by_status.get(status, ())]
+
+    def status_counts(self):
+        return {status: len(ids) for status, ids in self._current().by_status.items()}
+
+    def __getitem__(self, container_id):
+        return self._current().records[container_id]
+
+    def __contains__(self, container_id):
+        return container_id in self._current().records
+
+    def __iter__(self):
+        return iter(self._current().records)
+
+    def __len__(self):
+        return len(self._current().records)
+
+    def keys(self):
+        return self._current().records.keys()
+
+    def values(self):
+        return self._current().records.values()
+
+    def items(self):
+        """Items of the current snapshot, safe to iterate while others modify the registry"""
+        return self._current().records.items()
+
+
+    def add(self, container_id, info):
+        """Add or replace a record"""
+        with self._write_lock:
+            revision = None
+            if self.store is not None:
+                revision = self._record_store_write(self.store.put(container_id, self._persistable(info)))
+            self._publish({container_id: info}, revision=revision)
+        return info
+
+    def __setitem__(self, container_id, info):
+        self.add(container_id, info)
+
+    def update(self, container_id, **fields):
+        """
+        Atomically replace fields of a record
+
+        Only the given fields are written; with a shared store they are merged
+        into the stored record, so a status another process set in the
+        meantime is not overwritten.
+
+        Returns:
+            dict or None: The new record, or None if the container is not tracked
+        """
+        with self._write_lock:
+            self._sync()
+            current = self._state.records.get(container_id)
+            if current is None:
+                return None
+            info = dict(current)
+            info.update(fields)
+            revision = None
+            if self.store is not None:
+                merged = self.store.merge(container_id, self._persistable(fields))
+                if merged is None:
+                    # Another process removed it first
+                    return None
+                store_revision, record = merged
+                info = dict(record)
+                if 'container_obj' in fields:
+                    info['container_obj'] = fields['container_obj']
+                elif 'container_obj' in current and current.get('docker_id') == record.get('docker_id'):
+                    info['container_obj'] = current['container_obj']
+                else:
+                    info['container_obj'] = LazyContainer(record.get('name'), self.resolve_container)
+                revision = self._record_store_write(store_revision)
+            self._publish({container_id: info}, revision=revision)
+            return info
+
+    def transition(self, container_id, to_status, from_statuses=None, exclude_statuses=(), **fields):
+        """
+        Atomically move a container to a new status
+
+        Args:
+            container_id (str): Container to update
+            to_status (str): New status
+            from_statuses (iterable): Statuses the move is allowed from; any
+                status other than to_status itself if None
+            exclude_statuses (iterable): Statuses the move is never allowed from
+            **fields: Other fields to set in the same step
+
+        Returns:
+            dict or None: The previous record if the transition happened, else None
+        """
+        with self._write_lock:
+            self._sync()
+            current = self._state.records.get(container_id)
+            if current is None:
+                return None
+            status = current.get('status')
+            if status in exclude_statuses:
+                return None
+            if from_statuses is None:
+                if status == to_status:
+                    return None
+                allowed = [status]
+            else:
+                allowed = list(from_statuses)
+                if status not in allowed:
+                    return None
+
+            info = dict(current)
+            info.update(fields)
+            info['status'] = to_status
+            revision = None
+            if self.store is not None:
+                store_revision = self.store.put_if_status(container_id, allowed, self._persistable(info))
+                if store_revision is None:
+                    # Another process changed it first
+                    return None
+                revision = self._record_store_write(store_revision)
+            self._publish({container_id: info}, revision=revision)
+            return current
+
+    def remove(self, container_id):
+        """
+        Stop tracking a container
+
+        Returns:
+            dict or None: The removed record, or None if it was not tracked
+        """
+        with self._write_lock:
+            self._sync()
+            current = self._state.records.get(container_id)
+            if current is None:
+                return None
+            revision = None
+            if self.store is not None:
+                revision = self._record_store_write(self.store.delete(container_id))
+            self._publish(removals=(container_id,), revision=revision)
+        with self._container_locks_lock:
+            self._container_locks.pop(container_id, None)
+        return current
+
+    def pop(self, container_id, *default):
+        removed = self.remove(container_id)
+        if removed is None:
+            if default:
+                return default[0]
+            raise KeyError(container_id)
+        return removed
+
+    def __delitem__(self, container_id):
+        if self.remove(container_id) is None:
+            raise KeyError(container_id)
+
+    def replace_all(self, records, keep_newer_than=None):
+        """
+        Atomically replace the whole registry, e.g. after a reconcile
+
+        Args:
+            records (dict): New records keyed by container ID
+            keep_newer_than (float): Keep existing records created at or after
+                this time that are missing from records, so containers created
+                while a reconcile was running are not dropped
+        """
+        with self._write_lock:
+            self._sync()
+            records = dict(records)
+            if keep_newer_than is not None:
+                for container_id, info in self._state.records.items():
+                    if container_id not in records and (info.get('created_at') or 0) >= keep_newer_than:
+                        records[container_id] = info
+            revision = None
+            if self.store is not None:
+                revision = self._record_store_write(self.store.replace_all(
+                    {container_id: self._persistable(info) for container_id, info in records.items()}
+                ))
+            self._publish(records, replace=True, revision=revision)
+
+    def clear(self):
+        self.replace_all({})
+
+
+    def lock_for(self, container_id):
+        """
+        Lock serializing slow operations (stop, restart, remove) on one container
+
+        Operations on different containers do not contend with each other.
+        """
+        with self._container_locks_lock:
+            lock = self._container_locks.get(container_id)
+            if lock is None:
+                lock = self._container_locks[container_id] = threading.RLock()
+            return lock
@@ -0,0 +1,273 @@
+"""
+Container resource profiles
+Named CPU/memory profiles, host capacity read from /proc and a ledger of
+reservations that picks the least loaded cores for each container's cpuset
+"""
+import os
+import math
+import uuid
+import threading
+
+# cpus: CPU cores' worth of time (nano_cpus); memory: bytes, also the swap limit
+DEFAULT_PROFILES = {
+    'small': {'cpus': 1, 'memory': 1024 ** 3},
+    'medium': {'cpus': 2, 'memory': 4 * 1024 ** 3},
+    'large': {'cpus': 4, 'memory': 8 * 1024 ** 3}
+}
+
+_MEMORY_UNITS = {'': 1, 'b': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_memory(value):
+    """
+    Parse a memory size such as 536870912, '512m' or '4g'
+
+    Raises:
+        ValueError: If the value is not a positive size
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid memory size: {value}")
+    if isinstance(value, (int, float)):
+        size = int(value)
+    else:
+        text = str(value).strip().lower()
+        for suffix in ('ib', 'b'):
+            # '4GiB' and '4gb' mean '4g'
+            if len(text) > len(suffix) + 1 and text.endswith(suffix) and text[-len(suffix) - 1] in 'kmgt':
+                text = text[:-len(suffix)]
+                break
+        unit = text[-1] if text and text[-1] in _MEMORY_UNITS else ''
+        try:
+            size = int(float(text[:len(text) - len(unit)]) * _MEMORY_UNITS[unit])
+        except ValueError:
+            raise ValueError(f"Invalid memory size: {value}")
+    if size <= 0:
+        raise ValueError(f"Invalid memory size: {value}")
+    return size
+
+
+def normalize_profile(spec):
+    """
+    Validate a profile spec into {'cpus': float, 'memory': int}
+
+    Raises:
+        ValueError: If cpus or memory is missing or not positive
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("A resource profile needs cpus and memory")
+    cpus = spec.get('cpus')
+    if isinstance(cpus, bool) or not isinstance(cpus, (int, float)) or cpus <= 0:
+        raise ValueError("cpus must be a positive number")
+    return {'cpus': float(cpus), 'memory': parse_memory(spec.get('memory'))}
+
+
+def read_host_capacity(proc='/proc'):
+    """
+    CPU ids and total memory of the host from /proc
+
+    Returns:
+        tuple: (list of CPU ids, memory in bytes)
+    """
+    cpu_ids = []
+    try:
+        with open(os.path.join(proc, 'cpuinfo')) as f:
+            for line in f:
+                if line.startswith('processor'):
+                    cpu_ids.append(int(line.split(':', 1)[1]))
+    except (OSError, ValueError):
+        pass
+    if not cpu_ids:
+        cpu_ids = list(range(os.cpu_count() or 1))
+
+    memory = None
+    try:
+        with open(os.path.join(proc, 'meminfo')) as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    memory = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    if memory is None:
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    return cpu_ids, memory
+
+
+class Reservation:
+    """Resources set aside for one container"""
+    __slots__ = ('token', 'profile', 'cpus', 'memory', 'cpuset')
+
+    def __init__(self, token, profile, cpus, memory, cpuset):
+        self.token = token
+        self.profile = profile
+        self.cpus = cpus
+        self.memory = memory
+        self.cpuset = cpuset
+
+    def record(self):
+        """Fields stored in the container's tracking record"""
+        return {'profile': self.profile, 'cpus': self.cpus, 'memory': self.memory, 'cpuset': self.cpuset}
+
+    def run_options(self):
+        """Keyword arguments for client.containers.run()"""
+        options = {'nano_cpus': int(self.cpus * 1e9), 'mem_limit': self.memory, 'memswap_limit': self.memory}
+        if self.cpuset:
+            options['cpuset_cpus'] = ','.join(str(cpu) for cpu in self.cpuset)
+        return options
+
+
+class ResourceLedger:
+    """
+    Tracks CPU and memory reserved by containers against host capacity
+
+    Reservations of tracked containers are read from their records (the
+    'resources' field), so they are shared between workers and released
+    when the record goes away. Creates in progress hold a pending
+    reservation until their record exists: in this process, or with a
+    ContainerStateStore as a lease that every worker sees, taken in the same
+    transaction that checks it fits.
+
+    Args:
+        records (callable): Returns the tracking records to count; with a
+            store it is passed the stored records to pick from
+        profiles (dict): Profile name -> {'cpus', 'memory'}
+        cpu_ids (list): Host CPU ids available for containers
+        memory (int): Host memory in bytes available for containers
+        cpu_overcommit (float): Allowed ratio of reserved to available CPU
+        memory_overcommit (float): Allowed ratio of reserved to available memory
+        pin_cpus (bool): Give each container a cpuset of the least loaded cores
+        store (ContainerStateStore): Shared store for pending reservations, or None
+    """
+
+    def __init__(self, records, profiles=None, cpu_ids=None, memory=None,
+                 cpu_overcommit=1.0, memory_overcommit=1.0, pin_cpus=True, store=None):
+        host_cpus, host_memory = read_host_capacity() if cpu_ids is None or memory is None else (None, None)
+        self.records = records
+        self.profiles = {name: normalize_profile(spec) for name, spec in (profiles or DEFAULT_PROFILES).items()}
+        self.cpu_ids = list(cpu_ids if cpu_ids is not None else host_cpus)
+        self.memory = memory if memory is not None else host_memory
+        self.cpu_overcommit = cpu_overcommit
+        self.memory_overcommit = memory_overcommit
+        self.pin_cpus = pin_cpus
+        self.store = store
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    @property
+    def cpu_capacity(self):
+        return len(self.cpu_ids) * self.cpu_overcommit
+
+    @property
+    def memory_capacity(self):
+        return int(self.memory * self.memory_overcommit)
+
+    def resolve(self, profile=None, custom=None, default=None):
+        """
+        Turn a create request's profile name or custom resources into a demand
+
+        Returns:
+            dict or None: {'profile', 'cpus', 'memory'}, or None for an
+            unlimited container when no profile is requested or defaulted
+
+        Raises:
+            ValueError: For unknown profiles, invalid custom specs or demands
+                larger than the whole host
+        """
+        if custom is not None:
+            demand = dict(normalize_profile(custom), profile='custom')
+        else:
+            name = profile or default
+            if not name:
+                return None
+            if name not in self.profiles:
+                raise ValueError(f"Unknown resource profile {name}; choose from {', '.join(sorted(self.profiles))}")
+            demand = dict(self.profiles[name], profile=name)
+        if demand['cpus'] > len(self.cpu_ids) or demand['memory'] > self.memory_capacity:
+            raise ValueError(f"A {demand['cpus']:g} CPU / {demand['memory'] // 1024 ** 2} MiB container can never fit "
+                             f"on this host ({len(self.cpu_ids)} CPUs, {self.memory_capacity // 1024 ** 2} MiB)")
+        return demand
+
+    def _allocations(self, records=None, pending=None):
+        """Every reservation currently held: tracked containers' plus pending ones"""
+        if records is None:
+            records = self.records()
+        if pending is None:
+            if self.store is not None:
+                pending = self.store.leases('reservation')
+            else:
+                pending = [reservation.record() for reservation in self.pending.values()]
+        return [info['resources'] for info in records if info.get('resources')] + list(pending)
+
+    def usage(self):
+        """
+        Returns:
+            dict: Capacity, reserved and available CPU and memory, and per-core load
+        """
+        with self.lock:
+            allocations = self._allocations()
+        core_load = self._core_load(allocations)
+        reserved_cpus = sum(allocation['cpus'] for allocation in allocations)
+        reserved_memory = sum(allocation['memory'] for allocation in allocations)
+        return {
+            'capacity': {'cpus': self.cpu_capacity, 'memory': self.memory_capacity},
+            'reserved': {'cpus': round(reserved_cpus, 3), 'memory': reserved_memory},
+            'available': {'cpus': round(self.cpu_capacity - reserved_cpus, 3),
+                          'memory': self.memory_capacity - reserved_memory},
+            'core_load': {str(cpu): round(load, 3) for cpu, load in core_load.items()},
+            'profiles': self.profiles
+        }
+
+    def _core_load(self, allocations):
+        load = {cpu: 0.0 for cpu in self.cpu_ids}
+        for allocation in allocations:
+            cpuset = [cpu for cpu in allocation.get('cpuset') or () if cpu in load]
+            for cpu in cpuset:
+                load[cpu] += allocation['cpus'] / len(cpuset)
+        return load
+
+    def reserve(self, demand):
+        """
+        Reserve resources for a container if they fit
+
+        Returns:
+            Reservation or None: None if the host would be overcommitted
+        """
+        token = f"reservation-{uuid.uuid4().hex}"
+        with self.lock:
+            if self.store is None:
+                reservation = self._fit(token, demand, self._allocations())
+                if reservation is not None:
+                    self.pending[token] = reservation
+                return reservation
+
+            fitted = []
+
+            def decide(records, pending):
+                reservation = self._fit(token, demand, self._allocations(self.records(records), pending))
+                if reservation is None:
+                    return None
+                fitted.append(reservation)
+                return reservation.record()
+
+            return fitted[0] if self.store.acquire_lease(token, 'reservation', decide) is not None else None
+
+    def _fit(self, token, demand, allocations):
+        """A reservation for demand on top of allocations, or None if the host would be overcommitted"""
+        if sum(allocation['cpus'] for allocation in allocations) + demand['cpus'] > self.cpu_capacity + 1e-9:
+            return None
+        if sum(allocation['memory'] for allocation in allocations) + demand['memory'] > self.memory_capacity:
+            return None
+        cpuset = None
+        if self.pin_cpus:
+            core_load = self._core_load(allocations)
+            cores = max(1, math.ceil(demand['cpus']))
+            cpuset = sorted(sorted(self.cpu_ids, key=lambda cpu: (core_load[cpu], cpu))[:cores])
+        return Reservation(token, demand['profile'], demand['cpus'], demand['memory'], cpuset)
+
+    def release(self, reservation):
+        """Drop a pending reservation once the container is tracked, or its create failed"""
+        with self.lock:
+            if self.store is not None:
+                self.store.release_lease(reservation.token)
+            else:
+                self.pending.pop(reservation.token, None)
@@ -0,0 +1,342 @@
+"""
+Workspace snapshot store
+Streams container archives into compressed, content-addressed chunks on disk so
+repeated snapshots of mostly unchanged workspaces share storage
+"""
+import os
+import gzip
+import json
+import time
+import uuid
+import zlib
+import hashlib
+import threading
+
+try:
+    import zstandard
+except ImportError:  # gzip is used when zstandard is not installed
+    zstandard = None
+
+TAR_BLOCK_SIZE = 512
+
+# Chunks are cut at tar member boundaries chosen from the member header, so a
+# change to one file does not shift the boundaries of the chunks after it
+CHUNK_TARGET_SIZE = 4 * 1024 * 1024
+CHUNK_MAX_SIZE = 8 * 1024 * 1024
+BOUNDARY_MASK = 0x0F  # Roughly one boundary every 16 members
+
+# Chunks written or reused this recently are never collected, because a snapshot
+# in another worker process may still be streaming and not have its manifest yet
+CHUNK_GC_GRACE_SECONDS = 3600
+
+
+def _tar_member_size(header):
+    """Parse the size field of a tar header, including base-256 encoded sizes"""
+    field = header[124:136]
+    if field[0] & 0x80:
+        return int.from_bytes(field[1:], 'big')
+    field = field.replace(b'\0', b' ').strip()
+    return int(field, 8) if field else 0
+
+
+class _StreamReader:
+    """Read exact byte counts from an iterator of arbitrarily sized chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+        self.bytes_read = 0
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            try:
+                self.buffer += next(self.chunks)
+            except StopIteration:
+                break
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.bytes_read += len(data)
+        return data
+
+    def read_rest(self):
+        data = bytes(self.buffer) + b''.join(self.chunks)
+        self.buffer.clear()
+        self.bytes_read += len(data)
+        return data
+
+
+def iter_tar_chunks(stream, target_size=CHUNK_TARGET_SIZE, max_size=CHUNK_MAX_SIZE):
+    """
+    Split a tar stream into content-defined chunks
+
+    Boundaries fall after a member whose header hashes to a boundary value, or
+    once a chunk reaches the target size. Members larger than the target start
+    a fresh chunk and are split at fixed offsets, so unchanged large files
+    always produce identical chunks.
+
+    Args:
+        stream: Iterator of bytes making up a tar archive
+        target_size (int): Preferred chunk size
+        max_size (int): Hard upper bound for a chunk
+
+    Yields:
+        bytes: Consecutive chunks that concatenate back into the original stream
+    """
+    reader = _StreamReader(stream)
+    chunk = bytearray()
+
+    while True:
+        header = reader.read(TAR_BLOCK_SIZE)
+        if len(header) < TAR_BLOCK_SIZE or not header.strip(b'\0'):
+            # End-of-archive marker and padding, or a truncated stream
+            chunk += header + reader.read_rest()
+            break
+
+        member_size = _tar_member_size(header)
+        padded_size = -(-member_size // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE
+
+        if padded_size >= target_size and chunk:
+            yield bytes(chunk)
+            chunk = bytearray()
+
+        chunk += header
+        remaining = padded_size
+        while remaining:
+            if len(chunk) >= max_size:
+                yield bytes(chunk)
+                chunk = bytearray()
+            piece = reader.read(min(remaining, max_size - len(chunk)))
+            if not piece:
+                break
+            chunk += piece
+            remaining -= len(piece)
+
+        if len(chunk) >= target_size or (zlib.crc32(header[:100]) & BOUNDARY_MASK) == 0:
+            yield bytes(chunk)
+            chunk = bytearray()
+
+    if chunk:
+        yield bytes(chunk)
+
+
+class SnapshotStore:
+    """
+    Content-addressed snapshot storage on the local filesystem
+
+    Several worker processes can share one store. A snapshot being written
+    touches every chunk it uses, and delete leaves chunks touched within
+    `gc_grace` seconds alone, so chunks of a snapshot that has no manifest
+    yet are not collected.
+    """
+
+    def __init__(self, root, compression=None, gc_grace=CHUNK_GC_GRACE_SECONDS):
+        self.root = root
+        self.chunk_dir = os.path.join(root, 'chunks')
+        self.manifest_dir = os.path.join(root, 'manifests')
+        if compression is None:
+            compression = 'zstd' if zstandard is not None else 'gzip'
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        self.compression = compression
+        self.gc_grace = gc_grace
+        # Serializes deletes in this process; creates do not take it
+        self.lock = threading.Lock()
+
+    def _ensure_dirs(self):
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    @staticmethod
+    def _extension(compression):
+        return 'zst' if compression == 'zstd' else 'gz'
+
+    def _chunk_path(self, digest, compression):
+        return os.path.join(self.chunk_dir, digest[:2], f"{digest}.{self._extension(compression)}")
+
+    def _manifest_path(self, snapshot_id):
+        return os.path.join(self.manifest_dir, f"{snapshot_id}.json")
+
+    def _compress(self, data):
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    @staticmethod
+    def _decompress(data, compression):
+        if compression == 'zstd':
+            if zstandard is None:
+                raise ValueError("Snapshot is zstd compressed but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def create(self, stream, source_path, container_id=None, container_name=None, label=None):
+        """
+        Store a tar stream as a new snapshot
+
+        Args:
+            stream: Iterator of bytes from get_archive
+            source_path (str): Path the archive was taken from
+            container_id (str): ID of the source container
+            container_name (str): Name of the source container
+            label (str): Optional user-supplied label
+
+        Returns:
+            dict: The snapshot manifest
+        """
+        self._ensure_dirs()
+        start_time = time.perf_counter()
+        digests = []
+        raw_bytes = 0
+        new_chunks = 0
+        new_bytes = 0
+
+        for chunk in iter_tar_chunks(stream):
+            digest = hashlib.sha256(chunk).hexdigest()
+            digests.append(digest)
+            raw_bytes += len(chunk)
+
+            # Touching an existing chunk renews its grace period; if a delete took it first, write it again
+            path = self._chunk_path(digest, self.compression)
+            try:
+                os.utime(path)
+                continue
+            except FileNotFoundError:
+                pass
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = self._compress(chunk)
+            self._write_atomic(path, compressed)
+            new_chunks += 1
+            new_bytes += len(compressed)
+
+        snapshot_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        manifest = {
+            'id': snapshot_id,
+            'container_id': container_id,
+            'container_name': container_name,
+            'source_path': source_path,
+            'label': label,
+            'created_at': time.time(),
+            'compression': self.compression,
+            'chunks': digests,
+            'raw_bytes': raw_bytes,
+            'new_chunks': new_chunks,
+            'new_stored_bytes': new_bytes,
+            'seconds': round(time.perf_counter() - start_time, 4)
+        }
+        self._write_atomic(self._manifest_path(snapshot_id), json.dumps(manifest).encode('utf-8'))
+
+        return manifest
+
+    def get(self, snapshot_id):
+        """Load a manifest, or return None if the snapshot does not exist"""
+        if os.path.basename(snapshot_id) != snapshot_id:
+            return None
+        try:
+            with open(self._manifest_path(snapshot_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self, container_id=None):
+        """List manifests, newest first, optionally for one container"""
+        try:
+            names = os.listdir(self.manifest_dir)
+        except FileNotFoundError:
+            return []
+
+        manifests = []
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            manifest = self.get(name[:-len('.json')])
+            if manifest and (container_id is None or manifest.get('container_id') == container_id):
+                manifests.append(manifest)
+        manifests.sort(key=lambda m: m.get('created_at', 0), reverse=True)
+        return manifests
+
+    def verify(self, manifest):
+        """
+        Check that every chunk of a snapshot is present and intact
+
+        Raises:
+            ValueError: If a chunk is missing, unreadable or does not match its hash
+        """
+        compression = manifest.get('compression', 'gzip')
+        for digest in set(manifest['chunks']):
+            try:
+                with open(self._chunk_path(digest, compression), 'rb') as f:
+                    data = self._decompress(f.read(), compression)
+            except FileNotFoundError:
+                raise ValueError(f"Snapshot {manifest['id']} is missing chunk {digest}")
+            except Exception as e:
+                raise ValueError(f"Snapshot {manifest['id']} has an unreadable chunk {digest}: {str(e)}")
+            if hashlib.sha256(data).hexdigest() != digest:
+                raise ValueError(f"Snapshot {manifest['id']} has a corrupt chunk {digest}")
+
+    def iter_archive(self, manifest):
+        """Yield the original tar stream of a snapshot one chunk at a time"""
+        compression = manifest.get('compression', 'gzip')
+        for digest in manifest['chunks']:
+            with open(self._chunk_path(digest, compression), 'rb') as f:
+                yield self._decompress(f.read(), compression)
+
+    def delete(self, snapshot_id):
+        """
+        Delete a snapshot and any chunks no other snapshot references
+
+        Returns:
+            int or None: Number of chunk files removed, or None if not found
+        """
+        with self.lock:
+            manifest = self.get(snapshot_id)
+            if manifest is None:
+                return None
+            os.remove(self._manifest_path(snapshot_id))
+
+            referenced = set()
+            for other in self.list():
+                referenced.update((digest, other.get('compression', 'gzip')) for digest in other['chunks'])
+
+            removed = 0
+            compression = manifest.get('compression', 'gzip')
+            for digest in set(manifest['chunks']):
+                if (digest, compression) not in referenced and self._collect_chunk(self._chunk_path(digest, compression)):
+                    removed += 1
+            return removed
+
+    def _collect_chunk(self, path):
+        """
+        Remove an unreferenced chunk unless a snapshot in progress touched it recently
+
+        The chunk is moved aside before its age is checked. A create that touches
+        it after the move finds it missing and writes it again, and one that
+        touched it before the move makes it recent, so it is put back.
+
+        Returns:
+            bool: True if the chunk was removed
+        """
+        doomed = f"{path}.{uuid.uuid4().hex}.gc"
+        try:
+            os.rename(path, doomed)
+        except FileNotFoundError:
+            return False
+        if os.stat(doomed).st_mtime >= time.time() - self.gc_grace:
+            # Same content as any copy written meanwhile, so replacing it is safe
+            os.replace(doomed, path)
+            return False
+        os.remove(doomed)
+        return True
+
+    @staticmethod
+    def summary(manifest):
+        """Manifest without the chunk list, for API responses"""
+        result = {key: value for key, value in manifest.items() if key != 'chunks'}
+        result['chunk_count'] = len(manifest['chunks'])
+        return result
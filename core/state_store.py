@@ -0,0 +1,186 @@
+"""
+Shared container state
+Keeps container tracking records in SQLite so several worker processes see the
+same containers, with container objects cached per process
+"""
+import json
+import time
+import sqlite3
+import threading
+
+# A worker that dies holding a lease loses it after this long; no request runs
+# longer than the production server's timeout
+LEASE_TTL_SECONDS = 600
+
+
+class ContainerStateStore:
+    """SQLite-backed record store with a revision counter bumped on every write"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS containers (id TEXT PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)")
+            conn.execute('CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, kind TEXT NOT NULL, data TEXT NOT NULL, expires_at REAL NOT NULL)')
+            self.local.conn = conn
+        return conn
+
+    def _write(self, statements, check=None):
+        """
+        Run statements in one write transaction and bump the revision
+
+        Args:
+            statements (list or callable): (sql, params) pairs, or a function of
+                the connection returning them, called inside the transaction
+            check (callable): Optional predicate on the connection, evaluated
+                inside the transaction; the write is skipped if it returns False
+
+        Returns:
+            int or None: The new revision, or None if the check failed
+        """
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if check is not None and not check(conn):
+                conn.execute('ROLLBACK')
+                return None
+            if callable(statements):
+                statements = statements(conn)
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+            revision = conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+            conn.execute('COMMIT')
+            return revision
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def revision(self):
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def load_all(self):
+        """Return the current revision and every record, read in one transaction"""
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            revision = conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+            records = {row[0]: json.loads(row[1]) for row in conn.execute('SELECT id, record FROM containers')}
+        finally:
+            conn.execute('COMMIT')
+        return revision, records
+
+    @staticmethod
+    def _put_statement(container_id, record):
+        return (
+            'INSERT OR REPLACE INTO containers (id, record, updated_at) VALUES (?, ?, ?)',
+            (container_id, json.dumps(record), time.time())
+        )
+
+    def put(self, container_id, record):
+        return self._write([self._put_statement(container_id, record)])
+
+    def put_if_status(self, container_id, expected_statuses, record):
+        """Write a record only if the stored status is one of expected_statuses"""
+        def check(conn):
+            row = conn.execute('SELECT record FROM containers WHERE id = ?', (container_id,)).fetchone()
+            return row is not None and json.loads(row[0]).get('status') in expected_statuses
+        return self._write([self._put_statement(container_id, record)], check=check)
+
+    def merge(self, container_id, fields):
+        """
+        Set some fields of a stored record, leaving the others as stored
+
+        The record is read and written in the same transaction, so fields other
+        processes changed meanwhile (such as the status) are kept.
+
+        Returns:
+            tuple or None: (new revision, merged record), or None if the record does not exist
+        """
+        merged = {}
+
+        def check(conn):
+            row = conn.execute('SELECT record FROM containers WHERE id = ?', (container_id,)).fetchone()
+            if row is None:
+                return False
+            merged.update(json.loads(row[0]))
+            merged.update(fields)
+            return True
+
+        revision = self._write(lambda conn: [self._put_statement(container_id, merged)], check=check)
+        return None if revision is None else (revision, merged)
+
+    def delete(self, container_id):
+        return self._write([('DELETE FROM containers WHERE id = ?', (container_id,))])
+
+    def replace_all(self, records):
+        """Atomically replace every record"""
+        statements = [('DELETE FROM containers', ())]
+        statements.extend(self._put_statement(container_id, record) for container_id, record in records.items())
+        return self._write(statements)
+
+    def acquire_lease(self, lease_id, kind, decide, ttl=LEASE_TTL_SECONDS):
+        """
+        Take a lease if decide() allows it, deciding and writing in one transaction
+
+        Leases hold what a create needs until its record exists, such as a
+        fleet slot, a resource reservation or an SSH port, where every worker
+        sees them. They do not bump the revision.
+
+        Args:
+            lease_id (str): Unique ID to release it with
+            kind (str): Kind of lease
+            decide (callable): decide(records, leases) gets every container
+                record and the data of every unexpired lease of this kind, and
+                returns the new lease's data, or None to not take it
+            ttl (float): Seconds until it expires if never released
+
+        Returns:
+            The lease data, or None if decide() refused
+        """
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            conn.execute('DELETE FROM leases WHERE expires_at < ?', (now,))
+            records = [json.loads(row[0]) for row in conn.execute('SELECT record FROM containers')]
+            leases = [json.loads(row[0]) for row in conn.execute('SELECT data FROM leases WHERE kind = ?', (kind,))]
+            data = decide(records, leases)
+            if data is not None:
+                conn.execute('INSERT OR REPLACE INTO leases (id, kind, data, expires_at) VALUES (?, ?, ?, ?)',
+                             (lease_id, kind, json.dumps(data), now + ttl))
+            conn.execute('COMMIT')
+            return data
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def release_lease(self, lease_id):
+        self._conn().execute('DELETE FROM leases WHERE id = ?', (lease_id,))
+
+    def leases(self, kind):
+        """Data of every unexpired lease of a kind"""
+        rows = self._conn().execute('SELECT data FROM leases WHERE kind = ? AND expires_at >= ?', (kind, time.time()))
+        return [json.loads(row[0]) for row in rows]
+
+
+class LazyContainer:
+    """Stand-in for a container tracked by another worker, looked up on first use"""
+
+    def __init__(self, name, resolve):
+        self._name = name
+        self._resolve = resolve
+        self._container = None
+
+    def __getattr__(self, attr):
+        if self._container is None:
+            self._container = self._resolve(self._name)
+        return getattr(self._container, attr)
@@ -0,0 +1,262 @@
+"""
+Container templates
+Named container specs (base image, environment, volumes, resource profile and
+setup commands) whose setup runs once and is committed into content-hashed
+image layers that later creates start from
+"""
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_NAME_PATTERN = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9_.-]{0,62}$')
+VOLUME_NAME_PATTERN = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9_.-]+$')
+
+TEMPLATE_IMAGE_REPOSITORY = 'ai-container-template'
+TEMPLATE_IMAGE_LABEL = 'ai-container-manager.template'
+MAX_SETUP_COMMANDS = 50
+
+# Paths the manager mounts itself
+RESERVED_MOUNT_PATHS = ('/workspace', '/root/.ssh')
+
+# Environment variables the manager sets itself
+RESERVED_ENVIRONMENT = ('CONTAINER_ID',)
+
+# Keeps the builder running whatever the base image's own command does
+BUILDER_ENTRYPOINT = ['sleep']
+BUILDER_COMMAND = ['infinity']
+
+
+class TemplateBuildError(Exception):
+    """A setup command failed while building a template image"""
+
+    def __init__(self, message, command, exit_code, output):
+        super().__init__(message)
+        self.command = command
+        self.exit_code = exit_code
+        self.output = output
+
+
+def normalize_template(data, default_image):
+    """
+    Validate a template spec
+
+    Args:
+        data (dict): name, image, environment, volumes, profile, resources and setup
+        default_image (str): Base image when none is given
+
+    Returns:
+        dict: The normalized template, without timestamps
+
+    Raises:
+        ValueError: If a field is invalid
+    """
+    if not isinstance(data, dict):
+        raise ValueError("A template must be a JSON object")
+    name = data.get('name')
+    if not isinstance(name, str) or not TEMPLATE_NAME_PATTERN.match(name):
+        raise ValueError("Template name must be 1-63 letters, digits, '_', '.' or '-'")
+
+    image = data.get('image') or default_image
+    if not isinstance(image, str):
+        raise ValueError("image must be an image name")
+
+    environment = data.get('environment') or {}
+    if not isinstance(environment, dict):
+        raise ValueError("environment must be an object of variable names to values")
+    environment = {str(key): str(value) for key, value in environment.items()}
+    for key in RESERVED_ENVIRONMENT:
+        if key in environment:
+            raise ValueError(f"{key} is set by the manager")
+
+    volumes = {}
+    for source, target in (data.get('volumes') or {}).items():
+        if isinstance(target, str):
+            target = {'bind': target, 'mode': 'rw'}
+        if not isinstance(target, dict) or not isinstance(target.get('bind'), str) or not target['bind'].startswith('/'):
+            raise ValueError(f"Volume {source} needs an absolute mount path")
+        if target['bind'].rstrip('/') in RESERVED_MOUNT_PATHS:
+            raise ValueError(f"{target['bind']} is mounted by the manager")
+        # Host paths would let a template mount anything on the host, writable
+        if not VOLUME_NAME_PATTERN.match(source):
+            raise ValueError(f"Volume {source} must be a named Docker volume")
+        mode = target.get('mode', 'rw')
+        if mode not in ('rw', 'ro'):
+            raise ValueError(f"Volume {source} mode must be 'rw' or 'ro'")
+        volumes[source] = {'bind': target['bind'], 'mode': mode}
+
+    setup = data.get('setup') or []
+    if not isinstance(setup, list) or not all(isinstance(command, str) and command.strip() for command in setup):
+        raise ValueError("setup must be a list of shell commands")
+    if len(setup) > MAX_SETUP_COMMANDS:
+        raise ValueError(f"setup can have at most {MAX_SETUP_COMMANDS} commands")
+
+    return {
+        'name': name,
+        'description': data.get('description') or '',
+        'image': image,
+        'environment': environment,
+        'volumes': volumes,
+        'profile': data.get('profile'),
+        'resources': data.get('resources'),
+        'setup': setup
+    }
+
+
+def layer_hashes(base_image_id, environment, setup):
+    """
+    Content hash of the image after each setup command
+
+    Each hash covers the base image, the environment and every command up to
+    and including its own, so editing a command only invalidates the layers
+    from that command on.
+
+    Returns:
+        list: One hex digest per setup command
+    """
+    digest = hashlib.sha256(json.dumps([base_image_id, environment], sort_keys=True).encode('utf-8')).hexdigest()
+    hashes = []
+    for command in setup:
+        digest = hashlib.sha256(f"{digest}\n{command}".encode('utf-8')).hexdigest()
+        hashes.append(digest)
+    return hashes
+
+
+def layer_tag(digest):
+    return f"{TEMPLATE_IMAGE_REPOSITORY}:{digest[:32]}"
+
+
+class TemplateRegistry:
+    """Registry of container templates, persisted as a JSON index in the store directory"""
+
+    def __init__(self, root):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.json')
+        self.lock = threading.Lock()
+        self._build_locks = {}
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, index):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def list(self):
+        return sorted(self._load().values(), key=lambda t: t['name'])
+
+    def get(self, name):
+        return self._load().get(name)
+
+    def save(self, template, replace=False):
+        """
+        Store a normalized template
+
+        Raises:
+            FileExistsError: If it exists and replace is not set
+        """
+        with self.lock:
+            index = self._load()
+            existing = index.get(template['name'])
+            if existing is not None and not replace:
+                raise FileExistsError(f"Template {template['name']} already exists")
+            now = time.time()
+            record = dict(template, created_at=existing['created_at'] if existing else now, updated_at=now)
+            index[template['name']] = record
+            self._save(index)
+        return record
+
+    def delete(self, name):
+        with self.lock:
+            index = self._load()
+            record = index.pop(name, None)
+            if record is not None:
+                self._save(index)
+        return record
+
+    def _build_lock(self, key):
+        with self.lock:
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    def build(self, client, template, volumes=None, environment=None):
+        """
+        Get the image with a template's setup applied, building missing layers
+
+        Layers already committed by an earlier build of this or any template
+        with the same base, environment and leading commands are reused. A
+        builder container runs the remaining commands one by one, committing
+        a layer after each.
+
+        Args:
+            client: Docker client
+            template (dict): The template
+            volumes (dict): Extra volumes for the builder, such as shared caches
+            environment (dict): Extra environment for the builder
+
+        Returns:
+            tuple: (image to run, number of setup commands run; 0 when cached)
+
+        Raises:
+            TemplateBuildError: If a setup command fails
+        """
+        base_image = client.images.get(template['image'])
+        base_image_id = base_image.id
+        hashes = layer_hashes(base_image_id, template['environment'], template['setup'])
+        if not hashes:
+            return template['image'], 0
+
+        # Concurrent creates from the same template build it once
+        with self._build_lock(hashes[-1]):
+            start = 0
+            for index in range(len(hashes) - 1, -1, -1):
+                try:
+                    client.images.get(layer_tag(hashes[index]))
+                    start = index + 1
+                    break
+                except Exception:
+                    continue
+            if start == len(hashes):
+                return layer_tag(hashes[-1]), 0
+
+            logger.info(f"Building template {template['name']}: running setup commands {start + 1}-{len(hashes)}")
+            # Committed layers keep the base image's entrypoint and command, not the builder's
+            config = base_image.attrs.get('Config') or {}
+            restore = [f"ENTRYPOINT {json.dumps(config.get('Entrypoint') or [])}",
+                       f"CMD {json.dumps(config.get('Cmd') or [])}",
+                       f"LABEL {TEMPLATE_IMAGE_LABEL}={template['name']}"]
+            builder = client.containers.run(
+                layer_tag(hashes[start - 1]) if start else template['image'],
+                name=f"ai-template-build-{hashes[-1][:12]}-{uuid.uuid4().hex[:6]}",
+                detach=True,
+                entrypoint=BUILDER_ENTRYPOINT,
+                command=BUILDER_COMMAND,
+                environment=dict(environment or {}, **template['environment']),
+                volumes=volumes or {}
+            )
+            try:
+                for index in range(start, len(hashes)):
+                    command = template['setup'][index]
+                    result = builder.exec_run(['/bin/bash', '-c', command])
+                    if result.exit_code != 0:
+                        output = (result.output or b'').decode('utf-8', errors='replace')[-4000:]
+                        raise TemplateBuildError(
+                            f"Setup command {index + 1} of template {template['name']} exited with {result.exit_code}",
+                            command, result.exit_code, output)
+                    repository, tag = layer_tag(hashes[index]).split(':')
+                    builder.commit(repository=repository, tag=tag, changes=restore)
+            finally:
+                builder.remove(force=True)
+        return layer_tag(hashes[-1]), len(hashes) - start
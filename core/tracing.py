@@ -0,0 +1,183 @@
+"""
+Request tracing
+Lightweight span trees for HTTP requests, with a child span for every Docker
+API call, kept in an in-process ring buffer and optionally exported as JSON lines
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import functools
+import threading
+import contextvars
+from collections import deque, Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """One timed operation in a trace"""
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent', 'kind', 'attributes', 'start', 'end', 'error', 'children')
+
+    def __init__(self, name, trace_id, parent=None, kind='internal', attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self.error = None
+        self.children = []
+
+    @property
+    def duration_ms(self):
+        end = self.end if self.end is not None else time.time()
+        return round((end - self.start) * 1000, 3)
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self):
+        span = {
+            'name': self.name,
+            'span_id': self.span_id,
+            'kind': self.kind,
+            'start': self.start,
+            'duration_ms': self.duration_ms
+        }
+        if self.attributes:
+            span['attributes'] = self.attributes
+        if self.error:
+            span['error'] = self.error
+        if self.children:
+            span['children'] = [child.to_dict() for child in self.children]
+        return span
+
+
+class Tracer:
+    """
+    Collects a span tree per request
+
+    Spans opened outside a trace (background jobs, startup) are not recorded.
+    Traces with more Docker calls than n_plus_one_threshold are flagged, since
+    that usually means a per-item API call inside a loop.
+
+    Args:
+        buffer_size (int): Number of finished traces kept in memory
+        export_path (str): Append finished traces to this JSON-lines file
+        n_plus_one_threshold (int): Flag traces with more Docker calls than this
+    """
+
+    def __init__(self, buffer_size=200, export_path=None, n_plus_one_threshold=10):
+        self.traces = deque(maxlen=buffer_size)
+        self.export_path = export_path
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.lock = threading.Lock()
+
+    def start_trace(self, name, **attributes):
+        """Start a new trace in the current context and return its root span"""
+        root = Span(name, uuid.uuid4().hex, kind='request', attributes=attributes)
+        _current_span.set(root)
+        return root
+
+    def finish_trace(self, **attributes):
+        """
+        Finish the trace started in the current context
+
+        Returns:
+            dict or None: The finished trace, or None if no trace is active
+        """
+        span = _current_span.get()
+        if span is None:
+            return None
+        _current_span.set(None)
+        root = span
+        while root.parent is not None:
+            root = root.parent
+        root.attributes.update(attributes)
+        root.end = time.time()
+
+        trace = self._summarize(root)
+        with self.lock:
+            self.traces.append(trace)
+            if self.export_path:
+                try:
+                    os.makedirs(os.path.dirname(self.export_path) or '.', exist_ok=True)
+                    with open(self.export_path, 'a') as f:
+                        f.write(json.dumps(trace) + '\n')
+                except OSError as e:
+                    logger.error(f"Failed to export trace {trace['trace_id']}: {str(e)}")
+        if trace['n_plus_one']:
+            logger.warning(f"{trace['name']} made {trace['docker_calls']} Docker calls "
+                           f"(threshold {self.n_plus_one_threshold}): {trace['docker_calls_by_operation']}")
+        return trace
+
+    def _summarize(self, root):
+        docker_calls = Counter(span.attributes.get('operation') for span in root.walk() if span.kind == 'docker')
+        total = sum(docker_calls.values())
+        return {
+            'trace_id': root.trace_id,
+            'name': root.name,
+            'start': root.start,
+            'duration_ms': root.duration_ms,
+            'attributes': root.attributes,
+            'docker_calls': total,
+            'docker_calls_by_operation': dict(docker_calls.most_common()),
+            'n_plus_one': total > self.n_plus_one_threshold,
+            'spans': [child.to_dict() for child in root.children]
+        }
+
+    @contextmanager
+    def span(self, name, kind='internal', **attributes):
+        """Record a child span of the current span, if a trace is active"""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(name, parent.trace_id, parent=parent, kind=kind, attributes=attributes)
+        parent.children.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            span.end = time.time()
+            _current_span.reset(token)
+
+    def traced(self, name=None):
+        """Decorator recording each call of a function as a span"""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def recent(self, limit=50, n_plus_one_only=False):
+        """Most recent finished traces, newest first"""
+        with self.lock:
+            traces = list(self.traces)
+        traces.reverse()
+        if n_plus_one_only:
+            traces = [trace for trace in traces if trace['n_plus_one']]
+        return traces[:limit]
+
+    def get(self, trace_id):
+        with self.lock:
+            for trace in self.traces:
+                if trace['trace_id'] == trace_id:
+                    return trace
+        return None
@@ -0,0 +1,55 @@
+"""
+Streaming archive transfers between containers
+Pipes get_archive output from one container straight into put_archive on another
+"""
+import time
+
+# Chunk size requested from the Docker API when reading archives
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+
+class CountingStream:
+    """Iterator wrapper that counts the bytes passing through it"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.bytes = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.bytes += len(chunk)
+            yield chunk
+
+
+def transfer_path(source, source_path, destination, destination_path):
+    """
+    Copy a file or directory from one container to another without buffering it
+
+    The tar stream from the source is handed to the destination as a chunked
+    request body, so only one chunk is held in memory at a time.
+
+    Args:
+        source: Docker container object to read from
+        source_path (str): File or directory in the source container
+        destination: Docker container object to write to
+        destination_path (str): Directory in the destination to extract into
+
+    Returns:
+        dict: Bytes moved, elapsed seconds and throughput
+    """
+    start_time = time.perf_counter()
+
+    chunks, stat = source.get_archive(source_path, chunk_size=ARCHIVE_CHUNK_SIZE)
+    stream = CountingStream(chunks)
+    if not destination.put_archive(destination_path, stream):
+        raise Exception(f"Failed to extract archive into {destination_path}")
+
+    elapsed = time.perf_counter() - start_time
+    throughput = stream.bytes / elapsed if elapsed > 0 else 0.0
+    return {
+        'bytes': stream.bytes,
+        'source_size': (stat or {}).get('size'),
+        'seconds': round(elapsed, 4),
+        'throughput_bytes_per_sec': round(throughput, 1),
+        'throughput_mb_per_sec': round(throughput / (1024 * 1024), 2)
+    }
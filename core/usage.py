@@ -0,0 +1,378 @@
+"""
+Container resource usage
+Background sampler of Docker stats for tracked containers, kept in fixed-size
+array-backed ring buffers with 1 second, 1 minute and 1 hour rollups
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = (
+    'cpu_percent', 'memory_bytes', 'memory_percent',
+    'net_rx_bps', 'net_tx_bps', 'blk_read_bps', 'blk_write_bps'
+)
+
+# (name, bucket seconds, points kept)
+RESOLUTIONS = (
+    ('1s', 1, 360),
+    ('1m', 60, 180),
+    ('1h', 3600, 72)
+)
+
+NAN = float('nan')
+
+
+class RingBuffer:
+    """
+    Fixed-size time series backed by two arrays of doubles
+
+    Rows are stored row-major in one values array, so memory is allocated
+    once: (capacity * (width + 1) * 8) bytes whatever is appended.
+    """
+
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        self.width = width
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity * width))
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, row):
+        self.times[self.head] = timestamp
+        offset = self.head * self.width
+        self.values[offset:offset + self.width] = array('d', row)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def rows(self, since=None):
+        """(timestamp, values) pairs, oldest first"""
+        start = (self.head - self.count) % self.capacity
+        rows = []
+        for step in range(self.count):
+            index = (start + step) % self.capacity
+            timestamp = self.times[index]
+            if since is None or timestamp >= since:
+                offset = index * self.width
+                rows.append((timestamp, tuple(self.values[offset:offset + self.width])))
+        return rows
+
+
+class Rollup:
+    """One resolution: averages samples per bucket into a ring buffer"""
+
+    def __init__(self, seconds, capacity, width):
+        self.seconds = seconds
+        self.buffer = RingBuffer(capacity, width)
+        self.bucket = None
+        self.sums = [0.0] * width
+        self.counts = [0] * width
+
+    def add(self, timestamp, row):
+        bucket = timestamp - timestamp % self.seconds
+        if self.bucket is not None and bucket != self.bucket:
+            self.flush()
+        self.bucket = bucket
+        for index, value in enumerate(row):
+            if not math.isnan(value):
+                self.sums[index] += value
+                self.counts[index] += 1
+
+    def _average(self):
+        return [total / count if count else NAN for total, count in zip(self.sums, self.counts)]
+
+    def flush(self):
+        if self.bucket is not None:
+            self.buffer.append(self.bucket, self._average())
+        self.sums = [0.0] * len(self.sums)
+        self.counts = [0] * len(self.counts)
+        self.bucket = None
+
+    def points(self, since=None):
+        """Closed buckets plus the bucket still being filled"""
+        rows = self.buffer.rows(since)
+        if self.bucket is not None and (since is None or self.bucket >= since):
+            rows.append((self.bucket, tuple(self._average())))
+        return rows
+
+
+class ContainerUsage:
+    """Usage history of one container at every resolution"""
+
+    def __init__(self):
+        self.rollups = {name: Rollup(seconds, capacity, len(USAGE_FIELDS)) for name, seconds, capacity in RESOLUTIONS}
+        self.latest = None
+        self.latest_at = None
+        self.counters = None
+
+    def add(self, timestamp, row):
+        self.latest = row
+        self.latest_at = timestamp
+        for rollup in self.rollups.values():
+            rollup.add(timestamp, row)
+
+    def latest_dict(self):
+        if self.latest is None:
+            return None
+        return dict(zip(USAGE_FIELDS, (_json_number(value) for value in self.latest)))
+
+    def series(self, resolution, since=None):
+        points = self.rollups[resolution].points(since)
+        return {
+            'timestamps': [timestamp for timestamp, _ in points],
+            'series': {field: [_json_number(row[index]) for _, row in points] for index, field in enumerate(USAGE_FIELDS)}
+        }
+
+
+def _json_number(value):
+    return None if math.isnan(value) else round(value, 3)
+
+
+def parse_stats(stats):
+    """
+    Extract cumulative counters from one Docker stats response
+
+    Handles both cgroup v1 and v2 layouts.
+
+    Returns:
+        dict: CPU, memory, network and block I/O counters
+    """
+    cpu = stats.get('cpu_stats') or {}
+    memory = stats.get('memory_stats') or {}
+    memory_detail = memory.get('stats') or {}
+    # Page cache is reclaimable; report the working set like `docker stats` does
+    cache = memory_detail.get('inactive_file', memory_detail.get('total_inactive_file', memory_detail.get('cache', 0)))
+    networks = (stats.get('networks') or {}).values()
+    block = (stats.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []
+    return {
+        'cpu_total': (cpu.get('cpu_usage') or {}).get('total_usage', 0),
+        'system_cpu': cpu.get('system_cpu_usage', 0),
+        'online_cpus': cpu.get('online_cpus') or len((cpu.get('cpu_usage') or {}).get('percpu_usage') or []) or 1,
+        'memory_bytes': max(0, memory.get('usage', 0) - cache),
+        'memory_limit': memory.get('limit', 0),
+        'net_rx': sum(network.get('rx_bytes', 0) for network in networks),
+        'net_tx': sum(network.get('tx_bytes', 0) for network in networks),
+        'blk_read': sum(entry.get('value', 0) for entry in block if str(entry.get('op')).lower() == 'read'),
+        'blk_write': sum(entry.get('value', 0) for entry in block if str(entry.get('op')).lower() == 'write')
+    }
+
+
+def usage_row(previous, current, elapsed):
+    """
+    Turn two consecutive counter readings into a row of USAGE_FIELDS
+
+    Rates and CPU need a previous reading; without one they are NaN.
+    """
+    memory_percent = current['memory_bytes'] / current['memory_limit'] * 100 if current['memory_limit'] else NAN
+    if previous is None or elapsed <= 0:
+        return [NAN, current['memory_bytes'], memory_percent, NAN, NAN, NAN, NAN]
+
+    system_delta = current['system_cpu'] - previous['system_cpu']
+    cpu_delta = current['cpu_total'] - previous['cpu_total']
+    cpu_percent = cpu_delta / system_delta * current['online_cpus'] * 100 if system_delta > 0 and cpu_delta >= 0 else NAN
+
+    def rate(key):
+        delta = current[key] - previous[key]
+        return delta / elapsed if delta >= 0 else NAN
+
+    return [cpu_percent, current['memory_bytes'], memory_percent,
+            rate('net_rx'), rate('net_tx'), rate('blk_read'), rate('blk_write')]
+
+
+class UsageSampler:
+    """
+    Samples Docker stats for a set of containers at a fixed interval
+
+    Stats calls for one round run concurrently on a small thread pool. Each
+    container gets a ContainerUsage of bounded size, dropped once the
+    container is no longer sampled.
+
+    With export_path set, the sampling process writes every round to that
+    file and other processes serve usage from it.
+
+    Args:
+        fetch_stats (callable): container_id -> Docker stats dict
+        interval (float): Seconds between rounds
+        workers (int): Concurrent stats calls
+        export_path (str): File shared with other worker processes
+    """
+
+    def __init__(self, fetch_stats, interval=10, workers=8, export_path=None):
+        self.fetch_stats = fetch_stats
+        self.interval = interval
+        self.workers = workers
+        self.export_path = export_path
+        self.usage = {}
+        self.sampled_at = None
+        self.running = False
+        self.lock = threading.Lock()
+        self._pool = None
+        self._loaded_mtime = None
+
+    def _fetch(self, container_id):
+        try:
+            return container_id, time.monotonic(), parse_stats(self.fetch_stats(container_id))
+        except Exception as e:
+            logger.debug(f"Failed to read stats for {container_id}: {str(e)}")
+            return container_id, None, None
+
+    def sample(self, container_ids):
+        """Run one sampling round for the given containers"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='usage-sampler')
+        container_ids = list(container_ids)
+        results = list(self._pool.map(self._fetch, container_ids))
+        now = time.time()
+
+        with self.lock:
+            for container_id in set(self.usage) - set(container_ids):
+                del self.usage[container_id]
+            for container_id, taken_at, counters in results:
+                if counters is None:
+                    continue
+                usage = self.usage.get(container_id)
+                if usage is None:
+                    usage = self.usage[container_id] = ContainerUsage()
+                previous = usage.counters
+                elapsed = taken_at - previous[0] if previous else 0
+                usage.add(now, usage_row(previous[1] if previous else None, counters, elapsed))
+                usage.counters = (taken_at, counters)
+            self.sampled_at = now
+
+        if self.export_path:
+            try:
+                self.export(self.export_path)
+            except OSError as e:
+                logger.error(f"Failed to export usage samples to {self.export_path}: {str(e)}")
+
+    def run(self, container_ids):
+        """Sample forever; container_ids() returns the containers to sample each round"""
+        self.running = True
+        while True:
+            started = time.monotonic()
+            try:
+                self.sample(container_ids())
+            except Exception as e:
+                logger.error(f"Error in usage sampler: {str(e)}")
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+
+    def _refresh(self):
+        """In processes that do not sample, reload the sampling process's export"""
+        if self.running or not self.export_path:
+            return
+        try:
+            mtime = os.stat(self.export_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            try:
+                usage, sampled_at = self.load(self.export_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to load usage samples from {self.export_path}: {str(e)}")
+                return
+            with self.lock:
+                self.usage, self.sampled_at, self._loaded_mtime = usage, sampled_at, mtime
+
+    def container(self, container_id, resolution='1m', since=None):
+        """
+        Usage history of one container
+
+        Returns:
+            dict or None: Latest sample and the series, or None if never sampled
+        """
+        self._refresh()
+        with self.lock:
+            usage = self.usage.get(container_id)
+            if usage is None:
+                return None
+            return dict({'latest': usage.latest_dict(), 'latest_at': usage.latest_at}, **usage.series(resolution, since))
+
+    def fleet(self):
+        """
+        Latest sample of every container and fleet totals
+
+        Returns:
+            dict: sampled_at, totals and per-container latest samples
+        """
+        self._refresh()
+        with self.lock:
+            latest = {container_id: usage.latest_dict() for container_id, usage in self.usage.items()
+                      if usage.latest is not None}
+            sampled_at = self.sampled_at
+        totals = {}
+        for field in USAGE_FIELDS:
+            if field == 'memory_percent':
+                continue
+            values = [row[field] for row in latest.values() if row[field] is not None]
+            totals[field] = round(sum(values), 3)
+        return {'sampled_at': sampled_at, 'interval': self.interval, 'totals': totals, 'containers': latest}
+
+
+    def export(self, path):
+        """Atomically write every ContainerUsage to path: a JSON header line, then the arrays"""
+        header = {'sampled_at': self.sampled_at, 'fields': USAGE_FIELDS, 'resolutions': RESOLUTIONS, 'containers': {}}
+        chunks = []
+        with self.lock:
+            for container_id, usage in self.usage.items():
+                rollups = {}
+                for name, rollup in usage.rollups.items():
+                    rollups[name] = {
+                        'head': rollup.buffer.head,
+                        'count': rollup.buffer.count,
+                        'bucket': rollup.bucket,
+                        'sums': rollup.sums,
+                        'counts': rollup.counts
+                    }
+                    chunks.append(rollup.buffer.times.tobytes())
+                    chunks.append(rollup.buffer.values.tobytes())
+                header['containers'][container_id] = {
+                    'latest': [None if math.isnan(value) else value for value in usage.latest] if usage.latest else None,
+                    'latest_at': usage.latest_at,
+                    'rollups': rollups
+                }
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def load(path):
+        """
+        Read a file written by export()
+
+        Returns:
+            tuple: (dict of ContainerUsage by container ID, sampled_at)
+        """
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            if tuple(header['fields']) != USAGE_FIELDS or [tuple(r) for r in header['resolutions']] != list(RESOLUTIONS):
+                raise ValueError("Usage export was written with a different layout")
+            usage = {}
+            for container_id, saved in header['containers'].items():
+                container = ContainerUsage()
+                if saved['latest'] is not None:
+                    container.latest = [NAN if value is None else value for value in saved['latest']]
+                container.latest_at = saved['latest_at']
+                for name, rollup in container.rollups.items():
+                    state = saved['rollups'][name]
+                    buffer = rollup.buffer
+                    buffer.times = array('d')
+                    buffer.times.frombytes(f.read(8 * buffer.capacity))
+                    buffer.values = array('d')
+                    buffer.values.frombytes(f.read(8 * buffer.capacity * buffer.width))
+                    if len(buffer.values) != buffer.capacity * buffer.width:
+                        raise ValueError("Usage export is truncated")
+                    buffer.head, buffer.count = state['head'], state['count']
+                    rollup.bucket, rollup.sums, rollup.counts = state['bucket'], state['sums'], state['counts']
+                usage[container_id] = container
+        return usage, header['sampled_at']
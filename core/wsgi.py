@@ -0,0 +1,8 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn -c core/gunicorn_conf.py core.wsgi:app
+"""
+from core.app import create_app
+
+app = create_app()
@@ -2,7 +2,38 @@
 """
 Main entry point for AI Container Manager
 """
-from core.app import app
+import os
+import sys
+import argparse
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="AI Container Manager")
+    parser.add_argument("--production", action="store_true", help="Serve with gunicorn using threaded workers")
+    parser.add_argument("--host", default="0.0.0.0", help="Host to bind to (default: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=5000, help="Port to bind to (default: 5000)")
+    parser.add_argument("--workers", type=int, help="Number of worker processes in production mode")
+    parser.add_argument("--threads", type=int, help="Threads per worker in production mode")
+    parser.add_argument("--no-debug", action="store_true", help="Disable the debugger and reloader in development mode")
+    args = parser.parse_args()
+
+    if args.production:
+        # Replace this process with gunicorn so signals go straight to the master
+        os.environ['BIND'] = f"{args.host}:{args.port}"
+        if args.workers:
+            os.environ['WEB_CONCURRENCY'] = str(args.workers)
+        if args.threads:
+            os.environ['THREADS'] = str(args.threads)
+        project_dir = os.path.dirname(os.path.abspath(__file__))
+        os.chdir(project_dir)
+        os.execvp(sys.executable, [
+            sys.executable, "-m", "gunicorn",
+            "-c", os.path.join(project_dir, "core", "gunicorn_conf.py"),
+            "core.wsgi:app"
+        ])
+
+    from core.app import create_app
+
+    debug = not args.no_debug
+    # With the reloader, the parent process only watches files and the child serves
+    start_services = not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    create_app({'START_SERVICES': start_services}).run(host=args.host, port=args.port, debug=debug)
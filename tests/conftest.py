@@ -8,21 +8,16 @@ from unittest.mock import MagicMock, patch
 # Add the parent directory to the path so we can import the core modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# Mock the docker module before importing app
-docker_mock = MagicMock()
-sys.modules['docker'] = docker_mock
+# Importing the app has no side effects; the mock Docker client is injected through the factory
+from core.app import create_app, active_containers
 
-# Create mock Docker client
 mock_client = MagicMock()
-docker_mock.from_env.return_value = mock_client
 
-# Now import app with mocked docker
-from core.app import app, active_containers
+app = create_app({'TESTING': True, 'DOCKER_CLIENT': mock_client, 'START_SERVICES': False})
 
 @pytest.fixture
 def api_client():
     """Create a test client for the API"""
-    app.config['TESTING'] = True
     with app.test_client() as client:
         yield client
 
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test admission control and the prioritized create queue
+"""
+import time
+import threading
+
+import pytest
+
+from core.admission import AdmissionController, AdmissionRejected
+from core.state_store import ContainerStateStore
+
+def test_admits_until_the_cap():
+    """Creates in progress count toward the cap until they finish"""
+    fleet = []
+    controller = AdmissionController(2, 4, count=lambda: len(fleet))
+    with controller.admit():
+        fleet.append('a')
+    with controller.admit():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit():
+                pass
+    assert rejected.value.reason == 'full'
+    assert rejected.value.retry_after == 5
+    assert controller.stats()['in_flight'] == 0
+
+def test_queue_is_bounded_and_times_out():
+    """A full queue rejects at once; queued creates give up at their deadline"""
+    controller = AdmissionController(1, 1, count=lambda: 1, poll_interval=0.01)
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as rejected:
+        with controller.admit(wait=0.05):
+            pass
+    assert rejected.value.reason == 'timeout'
+    assert time.monotonic() - started >= 0.05
+
+    waiter = threading.Thread(target=lambda: pytest.raises(AdmissionRejected, controller.admit(wait=0.5).__enter__))
+    waiter.start()
+    while not controller.waiters:
+        time.sleep(0.005)
+    with pytest.raises(AdmissionRejected) as rejected:
+        with controller.admit(wait=1):
+            pass
+    assert rejected.value.reason == 'queue_full'
+    waiter.join()
+    assert controller.stats()['timed_out'] == 2
+
+def test_higher_priority_leaves_the_queue_first():
+    """Queued creates are admitted by priority, then arrival"""
+    fleet = ['existing']
+    controller = AdmissionController(1, 10, count=lambda: len(fleet), poll_interval=0.01)
+    order = []
+
+    def create(name, priority):
+        with controller.admit(priority=priority, wait=5):
+            order.append(name)
+            fleet.append(name)
+            fleet.remove(name)
+
+    threads = []
+    for name, priority in [('low', 0), ('high', 10), ('medium', 5)]:
+        thread = threading.Thread(target=create, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        while len(controller.waiters) < len(threads):
+            time.sleep(0.005)
+    time.sleep(0.02)
+    fleet.remove('existing')
+    controller.notify()
+    for thread in threads:
+        thread.join()
+    assert order == ['high', 'medium', 'low']
+    assert controller.stats()['recent_wait_seconds']['max'] >= 0.02
+
+def test_cap_holds_across_workers(tmp_path):
+    """Creates in progress on one worker take slots another worker sees"""
+    path = str(tmp_path / 'state.db')
+    count = lambda records: len([r for r in records if r['status'] != 'hibernated'])
+    first, second = (AdmissionController(2, 4, count=count, store=ContainerStateStore(path)) for _ in range(2))
+    first.store.put('a', {'status': 'running'})
+    first.store.put('b', {'status': 'hibernated'})
+
+    with first.admit():
+        assert second.stats()['in_flight'] == 1
+        with pytest.raises(AdmissionRejected) as rejected:
+            with second.admit():
+                pass
+        assert rejected.value.reason == 'full'
+
+    # The finished create's record now counts instead of its slot
+    first.store.put('c', {'status': 'running'})
+    with pytest.raises(AdmissionRejected):
+        with second.admit():
+            pass
+    first.store.delete('a')
+    with second.admit():
+        assert first.stats()['in_flight'] == 1
+    assert first.store.leases('admission') == []
+
+def test_create_rejected_with_429_when_full(api_client, container_id):
+    """At the cap, creates that will not wait get 429 with Retry-After"""
+    from core.app import admission
+
+    previous = admission.max_containers
+    admission.max_containers = 1
+    try:
+        response = api_client.post('/api/containers', json={})
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == str(response.json['retry_after'])
+        assert response.json['reason'] == 'full'
+
+        assert api_client.post('/api/containers', json={'wait': -1}).status_code == 400
+        assert api_client.post('/api/containers', json={'priority': 'high'}).status_code == 400
+
+        stats = api_client.get('/api/stats').json['admission']
+        assert stats['max_containers'] == 1
+        assert stats['rejected'] >= 1
+    finally:
+        admission.max_containers = previous
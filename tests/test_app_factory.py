@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test the application factory and the lazily connected Docker client
+"""
+import subprocess
+import sys
+import os
+from unittest.mock import MagicMock
+
+from core.docker_client import LazyDockerClient
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def test_import_has_no_side_effects():
+    """Importing the app module does not import docker, connect or start threads"""
+    code = (
+        "import sys, threading, core.app; "
+        "print('docker' in sys.modules, core.app.client.connected, threading.active_count())"
+    )
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=PROJECT_DIR, text=True)
+    assert output.split() == ['False', 'False', '1']
+
+def test_lazy_client_connects_once_on_first_use():
+    """The factory runs on first attribute access only"""
+    docker_client = MagicMock()
+    factory = MagicMock(return_value=docker_client)
+    lazy = LazyDockerClient()
+    lazy.configure(factory=factory)
+
+    assert not lazy.connected
+    factory.assert_not_called()
+
+    lazy.containers.list()
+    lazy.networks.list()
+
+    factory.assert_called_once_with()
+    docker_client.containers.list.assert_called_once()
+    assert lazy.connected
+
+def test_create_app_applies_config(tmp_path):
+    """Config passed to create_app reaches the module-level services"""
+    import core.app as app_module
+
+    snapshot_dir = str(tmp_path / 'snapshots')
+    previous_dir = app_module.SNAPSHOT_DIR
+    try:
+        flask_app = app_module.create_app({
+            'TESTING': True,
+            'START_SERVICES': False,
+            'SNAPSHOT_DIR': snapshot_dir
+        })
+        assert flask_app.config['TESTING']
+        assert app_module.snapshot_store.root == snapshot_dir
+        assert 'api.list_containers' in flask_app.view_functions
+    finally:
+        app_module.create_app({'START_SERVICES': False, 'SNAPSHOT_DIR': previous_dir})
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test shared cache volumes: mounting, size accounting and eviction
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+
+from core.caches import SharedCacheManager
+
+@pytest.fixture
+def manager():
+    return SharedCacheManager(MagicMock(), max_bytes=1000)
+
+def test_resolve_cache_names(manager):
+    """True selects every cache, lists select by name and unknown names fail"""
+    assert manager.resolve(True) == ['pip', 'npm', 'huggingface']
+    assert manager.resolve(False) == []
+    assert manager.resolve(['pip', 'pip']) == ['pip']
+    with pytest.raises(ValueError):
+        manager.resolve(['maven'])
+    for malformed in ([1], [['pip']], {'pip': True}, 5):
+        with pytest.raises(ValueError):
+            manager.resolve(malformed)
+
+def test_create_rejects_malformed_caches(api_client):
+    """A malformed caches field is a bad request, not a server error"""
+    for caches in ([1], [['pip']], {'pip': True}):
+        assert api_client.post('/api/containers', json={'caches': caches}).status_code == 400
+
+def test_mounts_point_tools_at_volumes(manager):
+    """Mounts bind the shared volumes and set the cache environment variables"""
+    volumes, environment = manager.mounts(['pip', 'huggingface'])
+    assert volumes['ai-cache-pip'] == {'bind': '/root/.cache/pip', 'mode': 'rw'}
+    assert 'ai-cache-huggingface' in volumes
+    assert environment['PIP_CACHE_DIR'] == '/root/.cache/pip'
+    assert environment['HF_HOME'] == '/root/.cache/huggingface'
+    assert 'pip' in manager.last_used
+
+def test_usage_and_eviction(manager):
+    """Caches over budget are shrunk by the helper container"""
+    manager.client.df.return_value = {'Volumes': [
+        {'Name': 'ai-cache-pip', 'UsageData': {'Size': 5000, 'RefCount': 2}},
+        {'Name': 'ai-cache-npm', 'UsageData': {'Size': 10, 'RefCount': 0}}
+    ]}
+    manager.client.containers.run.return_value = b"5000 4300 12\n"
+
+    usage = manager.usage()
+    assert usage['pip']['size_bytes'] == 5000
+    assert usage['pip']['containers_using'] == 2
+    assert usage['huggingface']['size_bytes'] is None
+
+    results = manager.evict_over_budget()
+    assert [r['cache'] for r in results] == ['pip']
+    assert results[0]['freed_bytes'] == 4300
+    args, kwargs = manager.client.containers.run.call_args
+    assert args[1][-1] == '800'
+    assert kwargs['volumes'] == {'ai-cache-pip': {'bind': '/cache', 'mode': 'rw'}}
+
+def test_create_container_with_caches(api_client):
+    """Create mounts the requested caches"""
+    from core.app import active_containers, client
+    with patch('core.app.setup_ssh_for_container', return_value=True):
+        response = api_client.post('/api/containers', json={'caches': ['npm']})
+    assert response.status_code == 201
+    active_containers.pop(response.json['id'], None)
+
+    kwargs = client.containers.run.call_args[1]
+    assert 'ai-cache-npm' in kwargs['volumes']
+    assert 'ai-cache-pip' not in kwargs['volumes']
+    assert kwargs['environment']['npm_config_cache'] == '/root/.npm'
+    assert response.json['caches'] == ['npm']
+
+def test_create_container_rejects_unknown_cache(api_client):
+    response = api_client.post('/api/containers', json={'caches': ['maven']})
+    assert response.status_code == 400
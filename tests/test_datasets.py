@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test the dataset registry and read-only dataset mounts
+"""
+import io
+import os
+import tarfile
+import pytest
+from unittest.mock import patch
+
+from core.datasets import DatasetRegistry
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = DatasetRegistry(str(tmp_path / 'store'), host_roots=[str(tmp_path)])
+    with patch('core.app.dataset_registry', registry):
+        yield registry
+
+def test_register_host_path_by_reference(registry, tmp_path):
+    """Host paths are mounted in place unless a copy is requested"""
+    source = tmp_path / 'corpus'
+    source.mkdir()
+    (source / 'a.csv').write_text('x,y\n1,2\n')
+
+    record = registry.register_host_path('corpus', str(source))
+    assert record['host_path'] == str(source)
+    assert record['managed'] is False
+    assert record['files'] == 1
+
+    copied = registry.register_host_path('corpus-copy', str(source), copy=True)
+    assert copied['managed'] is True
+    assert os.path.exists(os.path.join(copied['host_path'], 'a.csv'))
+
+    assert registry.mounts(['corpus']) == {str(source): {'bind': '/datasets/corpus', 'mode': 'ro'}}
+    with pytest.raises(FileExistsError):
+        registry.register_host_path('corpus', str(source))
+
+def test_upload_and_extract(registry, api_client):
+    """Uploaded archives can be extracted into the dataset"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        info = tarfile.TarInfo('train/part-0.csv')
+        info.size = 3
+        tar.addfile(info, io.BytesIO(b'1,2'))
+    buffer.seek(0)
+
+    response = api_client.post('/api/datasets', data={
+        'name': 'sales',
+        'extract': 'true',
+        'files': (buffer, 'sales.tar.gz')
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 201
+    record = response.json
+    assert record['source'] == 'upload'
+    assert os.path.exists(os.path.join(record['host_path'], 'train', 'part-0.csv'))
+    assert not os.path.exists(os.path.join(record['host_path'], 'sales.tar.gz'))
+    assert [d['name'] for d in api_client.get('/api/datasets').json] == ['sales']
+
+def test_create_mounts_datasets_read_only(registry, api_client, tmp_path):
+    """Containers get registered datasets read-only and deletion waits until they are unused"""
+    from core.app import active_containers, client
+    registry.register_host_path('corpus', str(tmp_path))
+
+    with patch('core.app.setup_ssh_for_container', return_value=True):
+        response = api_client.post('/api/containers', json={'datasets': ['corpus']})
+    assert response.status_code == 201
+    container_id = response.json['id']
+    assert response.json['datasets'] == {'corpus': '/datasets/corpus'}
+    assert client.containers.run.call_args[1]['volumes'][str(tmp_path)] == {'bind': '/datasets/corpus', 'mode': 'ro'}
+
+    try:
+        assert api_client.get('/api/datasets/corpus').json['used_by'] == [container_id]
+        assert api_client.delete('/api/datasets/corpus').status_code == 409
+    finally:
+        active_containers.pop(container_id, None)
+    assert api_client.delete('/api/datasets/corpus').status_code == 200
+
+def test_create_with_unknown_dataset(registry, api_client):
+    response = api_client.post('/api/containers', json={'datasets': ['missing']})
+    assert response.status_code == 404
+
+def test_create_rejects_malformed_datasets(registry, api_client):
+    for datasets in ([{}], [1], [['corpus']], 'corpus'):
+        assert api_client.post('/api/containers', json={'datasets': datasets}).status_code == 400
+
+def test_register_requires_absolute_path(registry, api_client):
+    response = api_client.post('/api/datasets', json={'name': 'rel', 'host_path': 'data/rel'})
+    assert response.status_code == 400
+
+def test_host_paths_outside_roots_are_rejected(registry, api_client, tmp_path):
+    """Only paths that resolve under DATASET_HOST_ROOTS can be mounted"""
+    (tmp_path / 'escape').symlink_to('/etc')
+    for host_path in ('/', '/etc', '/var/run/docker.sock', str(tmp_path / 'escape'), f'{tmp_path}/../..'):
+        response = api_client.post('/api/datasets', json={'name': 'leak', 'host_path': host_path})
+        assert response.status_code == 400, host_path
+
+    closed = DatasetRegistry(str(tmp_path / 'closed'))
+    with pytest.raises(ValueError, match='DATASET_HOST_ROOTS'):
+        closed.register_host_path('corpus', str(tmp_path))
+
+@pytest.mark.parametrize('kind', [tarfile.SYMTYPE, tarfile.CHRTYPE, tarfile.FIFOTYPE])
+def test_upload_rejects_special_archive_members(registry, api_client, kind):
+    """Links, devices and fifos in uploaded archives are refused"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        info = tarfile.TarInfo('data/special')
+        info.type = kind
+        info.linkname = '/etc/passwd' if kind == tarfile.SYMTYPE else ''
+        tar.addfile(info)
+    buffer.seek(0)
+
+    response = api_client.post('/api/datasets', data={'name': 'special', 'extract': 'true',
+                                                      'files': (buffer, 'special.tar')},
+                               content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert registry.get('special') is None
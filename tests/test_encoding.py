@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test response compression, the fast JSON provider and MessagePack negotiation
+"""
+import gzip
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from core import encoding
+
+OUTPUT = 'line "quoted"\t\\ tab\n' * 500
+
+@pytest.fixture
+def big_exec(container_id):
+    """A tracked container whose commands print escape-heavy output"""
+    from core.app import active_containers
+    container = active_containers[container_id]['container_obj']
+    container.exec_run.return_value.output = (OUTPUT.encode(), b'')
+    return container_id
+
+def test_large_responses_are_gzipped(api_client, big_exec):
+    """Clients accepting gzip get a compressed body that decodes to the same JSON"""
+    response = api_client.post(f'/api/containers/{big_exec}/exec', json={'command': 'cat log'},
+                               headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    body = gzip.decompress(response.data)
+    assert len(response.data) < len(body) / 10
+    assert json.loads(body)['output'] == OUTPUT
+
+def test_small_or_unaccepted_responses_are_not_compressed(api_client, big_exec, container_id):
+    """Identity clients and responses under the threshold are sent as is"""
+    response = api_client.post(f'/api/containers/{big_exec}/exec', json={'command': 'cat log'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.json['output'] == OUTPUT
+
+    response = api_client.get('/api/containers?fields=id', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_choose_encoding(monkeypatch):
+    """zstd is preferred when installed, and q=0 refuses an encoding"""
+    from werkzeug.http import parse_accept_header
+
+    def accept(value):
+        return parse_accept_header(value)
+
+    monkeypatch.setattr(encoding, 'zstandard', object())
+    assert encoding.choose_encoding(accept('gzip, zstd')) == 'zstd'
+    assert encoding.choose_encoding(accept('gzip, zstd;q=0.5')) == 'gzip'
+    monkeypatch.setattr(encoding, 'zstandard', None)
+    assert encoding.choose_encoding(accept('zstd')) is None
+    assert encoding.choose_encoding(accept('gzip;q=0')) is None
+    assert encoding.choose_encoding(accept('*')) == 'gzip'
+
+@pytest.mark.parametrize('backend', ['orjson', 'json'])
+def test_provider_matches_default_output(monkeypatch, backend):
+    """Both backends produce the same JSON as Flask's default provider"""
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    if backend == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(encoding, 'orjson', None)
+
+    flask_app = Flask(__name__)
+    provider = encoding.FastJSONProvider(flask_app)
+    default = DefaultJSONProvider(flask_app)
+    value = {'b': [1, 2.5, None, True], 'a': datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+             'big': 2 ** 70, 'text': OUTPUT[:40]}
+
+    assert json.loads(provider.dumps(value)) == json.loads(default.dumps(value))
+    assert provider.loads('{"a": [1, "x"]}') == {'a': [1, 'x']}
+    with flask_app.app_context():
+        assert json.loads(provider.response(value).get_data()) == json.loads(default.dumps(value))
+
+def test_msgpack_negotiation(api_client, container_id):
+    """Clients that prefer MessagePack get it; everyone else gets JSON"""
+    msgpack = pytest.importorskip('msgpack')
+    response = api_client.get('/api/containers', headers={'Accept': 'application/msgpack'})
+    assert response.mimetype == 'application/msgpack'
+    assert container_id in [c['id'] for c in msgpack.unpackb(response.data)]
+
+    response = api_client.get('/api/containers', headers={'Accept': 'application/json, application/msgpack;q=0.5'})
+    assert response.mimetype == 'application/json'
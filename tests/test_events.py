@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test the container event log and the server-sent events watch endpoint
+"""
+import json
+import time
+from unittest.mock import MagicMock
+
+from core.events import EventLog, parse_event_id
+from core.registry import ContainerRegistry
+
+def make_registry(size=100):
+    registry = ContainerRegistry()
+    log = EventLog(size)
+    registry.add_listener(log.record)
+    return registry, log
+
+def record(container_id, status='running', **fields):
+    return dict({'id': container_id, 'name': f'ai-container-{container_id}', 'status': status}, **fields)
+
+def parse_messages(text):
+    """Split an SSE stream into (id, event, data) tuples, skipping comments"""
+    messages = []
+    for block in text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if not line.startswith(':'))
+        if fields:
+            messages.append((fields.get('id'), fields.get('event'), json.loads(fields['data'])))
+    return messages
+
+def test_registry_changes_become_events():
+    """Creates, status changes, expiry and deletes are logged in revision order"""
+    registry, log = make_registry()
+    registry['a'] = record('a')
+    registry['b'] = record('b')
+    registry.update('a', ssh_port=11001)  # No status change, no event
+    registry.transition('a', 'exited')
+    registry.transition('b', 'removing', removal_reason='expired')
+    registry.remove('b')
+    registry.remove('a')
+
+    events = log.since((0, 0))
+    assert [(event.type, event.data['id']) for event in events] == [
+        ('created', 'a'), ('created', 'b'), ('status', 'a'), ('status', 'b'), ('expired', 'b'), ('deleted', 'a')
+    ]
+    assert events[2].data['previous_status'] == 'running'
+    assert events[3].data['reason'] == 'expired'
+    assert [event.data['revision'] for event in events] == [1, 2, 4, 5, 6, 7]
+
+def test_resume_after_event_and_snapshot():
+    """Resuming returns only later events; snapshots resume after their revision"""
+    registry, log = make_registry()
+    registry['a'] = record('a')
+    first = log.since((0, 0))[0]
+    registry['b'] = record('b')
+
+    assert [event.data['id'] for event in log.since(parse_event_id(first.id))] == ['b']
+
+    revision, containers = log.snapshot()
+    assert [c['id'] for c in containers] == ['a', 'b']
+    assert log.since(parse_event_id(str(revision))) == []
+
+def test_evicted_or_unknown_positions_cannot_resume():
+    """Clients that fell out of the bounded log must start from a snapshot"""
+    registry, log = make_registry(size=3)
+    for container_id in 'abcde':
+        registry[container_id] = record(container_id)
+
+    assert log.since((1, 0)) is None
+    assert [event.data['id'] for event in log.since((3, 0))] == ['d', 'e']
+    assert log.since((99, 0)) is None
+    assert parse_event_id('not-an-id') is None
+
+def test_watch_streams_snapshot_then_events(api_client, monkeypatch):
+    """The watch endpoint sends a snapshot, then live changes with resumable IDs"""
+    import core.app as app_module
+    monkeypatch.setattr(app_module, 'WATCH_POLL_SECONDS', 0.05)
+    monkeypatch.setattr(app_module, 'WATCH_MAX_SECONDS', 5)
+    registry = app_module.active_containers
+
+    response = api_client.get('/api/containers/watch')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    try:
+        event_id, event, data = parse_messages(next(stream).decode())[0]
+        assert event == 'snapshot' and data['reset'] is False
+        assert event_id == str(data['revision'])
+
+        registry['watch1'] = record('watch1', container_obj=MagicMock(), created_at=time.time())
+        event_id, event, data = parse_messages(next(stream).decode())[0]
+        assert (event, data['id'], data['status']) == ('created', 'watch1', 'running')
+    finally:
+        response.close()
+
+    registry.transition('watch1', 'exited')
+    registry.remove('watch1')
+    resumed = api_client.get('/api/containers/watch', headers={'Last-Event-ID': event_id})
+    stream = iter(resumed.response)
+    try:
+        messages = parse_messages(next(stream).decode()) + parse_messages(next(stream).decode())
+        assert [(event, data['id']) for _, event, data in messages] == [('status', 'watch1'), ('deleted', 'watch1')]
+    finally:
+        resumed.close()
+
+def test_watch_streams_are_limited_per_worker(api_client, monkeypatch):
+    """Streams above WATCH_MAX_STREAMS get a 503 until one closes"""
+    import core.app as app_module
+    monkeypatch.setattr(app_module, 'WATCH_MAX_STREAMS', 1)
+
+    first = api_client.get('/api/containers/watch')
+    assert first.status_code == 200
+    rejected = api_client.get('/api/containers/watch')
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After'] == str(app_module.WATCH_RETRY_AFTER_SECONDS)
+
+    first.close()
+    second = api_client.get('/api/containers/watch')
+    assert second.status_code == 200
+    second.close()
+
+def test_watch_with_stale_id_gets_reset_snapshot(api_client):
+    """An ID from before the log started yields a reset snapshot"""
+    response = api_client.get('/api/containers/watch?last_event_id=999999-0')
+    stream = iter(response.response)
+    try:
+        _, event, data = parse_messages(next(stream).decode())[0]
+        assert event == 'snapshot' and data['reset'] is True
+    finally:
+        response.close()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test forking a container into clones from a cached commit
+"""
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+@pytest.fixture
+def fork_client(container_id):
+    """Patch Docker calls made by forks; yields (run mock, source container, created IDs)"""
+    from core.app import active_containers, client
+
+    source = active_containers[container_id]['container_obj']
+    source.commit.side_effect = lambda **kwargs: MagicMock(id=f'sha256:image{source.commit.call_count}')
+    created = []
+
+    def run(image, command=None, **kwargs):
+        return MagicMock(name=kwargs['name']) if kwargs.get('detach') else b''
+
+    with patch.object(client.containers, 'run', side_effect=run) as mock_run, \
+         patch('core.app.setup_ssh_for_container', return_value=True):
+        yield mock_run, source, created
+
+    for child_id in created:
+        active_containers.pop(child_id, None)
+
+def test_fork_starts_children_from_commit(api_client, container_id, fork_client):
+    """Children run from the committed image with copies of the workspace and their own ports"""
+    from core.app import active_containers
+
+    mock_run, source, created = fork_client
+    response = api_client.post(f'/api/containers/{container_id}/fork?count=3')
+    assert response.status_code == 201
+    result = response.json
+    created.extend(child['id'] for child in result['children'])
+
+    assert len(result['children']) == 3
+    assert result['image'] == 'sha256:image1'
+    assert result['image_cached'] is False
+    source.pause.assert_called_once()
+    source.unpause.assert_called_once()
+    assert len({child['ssh_port'] for child in result['children']}) == 3
+
+    clone_call = next(call for call in mock_run.call_args_list if not call[1].get('detach'))
+    volumes = clone_call[1]['volumes']
+    assert volumes[f'{active_containers[container_id]["name"]}-workspace']['mode'] == 'ro'
+    for child in result['children']:
+        assert f"{child['name']}-workspace" in volumes
+        assert active_containers[child['id']]['forked_from'] == container_id
+    launches = [call for call in mock_run.call_args_list if call[1].get('detach')]
+    assert {call[0][0] for call in launches} == {'sha256:image1'}
+
+def test_fork_commits_again_unless_cache_is_requested(api_client, container_id, fork_client):
+    """Forks commit every time by default, so changes made over SSH are never missed"""
+    _, source, created = fork_client
+    first = api_client.post(f'/api/containers/{container_id}/fork').json
+    second = api_client.post(f'/api/containers/{container_id}/fork').json
+    assert second['image_cached'] is False
+    assert source.commit.call_count == 2
+    created.extend(child['id'] for result in (first, second) for child in result['children'])
+
+def test_cached_fork_image_until_the_source_changes(api_client, container_id, fork_client):
+    """With cache, a fork reuses the commit; an exec or an open session makes the next fork commit again"""
+    _, source, created = fork_client
+    with patch('core.app.container_in_use', return_value=False):
+        first = api_client.post(f'/api/containers/{container_id}/fork').json
+        second = api_client.post(f'/api/containers/{container_id}/fork?cache=true').json
+        assert second['image_cached'] is True
+        assert second['image'] == first['image']
+        assert source.commit.call_count == 1
+
+        api_client.post(f'/api/containers/{container_id}/exec', json={'command': 'pip install rich'})
+        third = api_client.post(f'/api/containers/{container_id}/fork?cache=true').json
+        assert third['image_cached'] is False
+        assert third['image'] == 'sha256:image2'
+
+    with patch('core.app.container_in_use', return_value=True):
+        fourth = api_client.post(f'/api/containers/{container_id}/fork?cache=true').json
+    assert fourth['image_cached'] is False
+    created.extend(child['id'] for result in (first, second, third, fourth) for child in result['children'])
+
+def test_fork_unpauses_a_container_paused_meanwhile(api_client, container_id, fork_client):
+    """A container the idle pauser paused before the fork claimed it is unpaused, not paused twice"""
+    from core.app import active_containers, idle_pauser
+
+    _, source, created = fork_client
+    real_resume = idle_pauser.resume
+    calls = []
+
+    def pause_then_resume(cid):
+        # The idle pauser wins the race after the request woke the container, before the fork claims it
+        calls.append(cid)
+        if len(calls) == 2:
+            active_containers.transition(cid, 'paused')
+        return real_resume(cid)
+
+    with patch.object(idle_pauser, 'resume', side_effect=pause_then_resume):
+        response = api_client.post(f'/api/containers/{container_id}/fork')
+    assert response.status_code == 201
+    created.extend(child['id'] for child in response.json['children'])
+    assert len(calls) == 2
+    # Unpaused once by the fork's resume and once after the commit, paused only by the fork itself
+    assert source.unpause.call_count == 2
+    assert source.pause.call_count == 1
+    assert active_containers[container_id]['status'] == 'running'
+
+def test_forking_container_is_left_alone(api_client, container_id, fork_client):
+    """While committing, the parent is 'forking', so pausing, deleting or another fork must wait"""
+    from core.app import active_containers
+
+    _, source, created = fork_client
+    seen = []
+    commit = source.commit.side_effect
+
+    def commit_while_busy(**kwargs):
+        seen.append(active_containers[container_id]['status'])
+        seen.append(active_containers.transition(container_id, 'paused', from_statuses=['running']))
+        # Requests from another thread, like another worker's, get their own request context
+        other = api_client.application.test_client()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            seen.append(executor.submit(other.delete, f'/api/containers/{container_id}').result().status_code)
+            seen.append(executor.submit(other.post, f'/api/containers/{container_id}/fork').result().status_code)
+        return commit(**kwargs)
+
+    source.commit.side_effect = commit_while_busy
+    response = api_client.post(f'/api/containers/{container_id}/fork')
+    assert response.status_code == 201
+    created.extend(child['id'] for child in response.json['children'])
+    assert seen == ['forking', None, 409, 409]
+    assert active_containers[container_id]['status'] == 'running'
+
+def test_fork_count_is_validated(api_client, container_id):
+    """count must be between 1 and FORK_MAX_COUNT"""
+    for count in ('0', 'many', '1000'):
+        assert api_client.post(f'/api/containers/{container_id}/fork?count={count}').status_code == 400
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test hibernating containers and recreating them on demand
+"""
+import time
+from unittest.mock import patch, MagicMock
+
+def woken_container():
+    container = MagicMock()
+    container.exec_run.return_value.exit_code = 0
+    container.exec_run.return_value.output = (b"still here", b"")
+    return container
+
+def test_hibernate_keeps_record_and_frees_the_slot(api_client, container_id):
+    """Hibernating removes the container but keeps its record out of the fleet count"""
+    from core.app import active_containers, admission, expires_at, HIBERNATE_EXPIRY_HOURS
+
+    old_container = active_containers[container_id]['container_obj']
+    fleet = admission.count()
+    response = api_client.post(f'/api/containers/{container_id}/hibernate')
+    assert response.status_code == 200
+    old_container.stop.assert_called_once()
+    old_container.remove.assert_called_once_with()
+
+    info = active_containers[container_id]
+    assert info['status'] == 'hibernated'
+    assert info['container_obj'] is None
+    assert info['ssh_port'] == 11001
+    assert info['spec']['caches'] == []
+    assert admission.count() == fleet - 1
+    assert abs(expires_at(info) - (time.time() + HIBERNATE_EXPIRY_HOURS * 3600)) < 5
+
+    assert api_client.post(f'/api/containers/{container_id}/hibernate').status_code == 409
+    listed = {item['id']: item for item in api_client.get('/api/containers').json}
+    assert listed[container_id]['status'] == 'hibernated'
+
+def test_exec_wakes_hibernated_container(api_client, container_id):
+    """The next exec recreates the container with its name, SSH port and workspace"""
+    from core.app import active_containers, client
+
+    api_client.post(f'/api/containers/{container_id}/hibernate')
+    new_container = woken_container()
+    with patch.object(client.containers, 'run', return_value=new_container) as run, \
+         patch('core.app.setup_ssh_for_container', return_value=True):
+        response = api_client.post(f'/api/containers/{container_id}/exec', json={'command': 'ls'})
+
+    assert response.status_code == 200
+    assert response.json['output'] == 'still here'
+    kwargs = run.call_args[1]
+    name = f"ai-container-{container_id[:8]}"
+    assert kwargs['name'] == name
+    assert kwargs['ports'] == {'22/tcp': 11001}
+    assert kwargs['volumes'][f'{name}-workspace'] == {'bind': '/workspace', 'mode': 'rw'}
+    assert kwargs['environment']['CONTAINER_ID'] == container_id
+    info = active_containers[container_id]
+    assert info['status'] == 'running'
+    assert info['container_obj'] is new_container
+
+def test_wake_endpoint(api_client, container_id):
+    """Explicit wakes return the container details; awake containers cannot be woken"""
+    from core.app import client
+
+    assert api_client.post(f'/api/containers/{container_id}/wake').status_code == 409
+    api_client.post(f'/api/containers/{container_id}/hibernate')
+    with patch.object(client.containers, 'run', return_value=woken_container()), \
+         patch('core.app.setup_ssh_for_container', return_value=True):
+        response = api_client.post(f'/api/containers/{container_id}/wake', json={'wait': 1})
+    assert response.status_code == 200
+    assert response.json['status'] == 'running'
+    assert response.json['ssh_port'] == 11001
+
+def test_failed_wake_stays_hibernated(api_client, container_id):
+    """A container that cannot be recreated stays hibernated"""
+    from core.app import active_containers, client
+
+    api_client.post(f'/api/containers/{container_id}/hibernate')
+    with patch.object(client.containers, 'run', side_effect=Exception('no such image')):
+        response = api_client.post(f'/api/containers/{container_id}/wake')
+    assert response.status_code == 500
+    assert active_containers[container_id]['status'] == 'hibernated'
+
+def test_delete_hibernated(api_client, container_id):
+    """Deleting a hibernated container only drops its record"""
+    from core.app import active_containers
+
+    api_client.post(f'/api/containers/{container_id}/hibernate')
+    assert api_client.delete(f'/api/containers/{container_id}').status_code == 200
+    assert container_id not in active_containers
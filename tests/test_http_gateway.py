@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test the HTTP preview gateway that proxies requests into containers
+"""
+import pytest
+import requests
+from unittest.mock import patch, MagicMock
+
+def make_upstream(status=200, headers=None, chunks=(b"hello ", b"world")):
+    """Build a fake streaming upstream response"""
+    upstream = MagicMock()
+    upstream.status_code = status
+    upstream.raw.headers.items.return_value = list((headers or {}).items())
+    upstream.raw.stream.return_value = iter(chunks)
+    return upstream
+
+def test_preview_forwards_to_container_ip(container_id, api_client):
+    """Requests are forwarded to the container IP and the body is streamed back"""
+    from core.app import container_ips, preview_gateway
+    container_ips[container_id] = '172.18.0.5'
+
+    upstream = make_upstream(headers={'Content-Type': 'text/plain', 'Connection': 'keep-alive'})
+    with patch.object(preview_gateway.session, 'request', return_value=upstream) as mock_request:
+        response = api_client.get(f'/api/containers/{container_id}/http/8080/app/index.html?x=1')
+
+    assert response.status_code == 200
+    assert response.data == b"hello world"
+    assert response.headers['Content-Type'] == 'text/plain'
+    assert 'Connection' not in response.headers or response.headers['Connection'] != 'keep-alive'
+
+    method, url = mock_request.call_args[0]
+    assert method == 'GET'
+    assert url == 'http://172.18.0.5:8080/app/index.html?x=1'
+    assert mock_request.call_args[1]['stream'] is True
+    upstream.close.assert_called_once()
+
+def test_preview_resolves_and_caches_ip(container_id, api_client):
+    """The container IP is read from Docker once and then cached"""
+    from core.app import container_ips, client, preview_gateway
+    inspect_result = {'NetworkSettings': {'IPAddress': '', 'Networks': {'bridge': {'IPAddress': '172.17.0.9'}}}}
+
+    with patch.object(client.api, 'inspect_container', return_value=inspect_result) as mock_inspect, \
+         patch.object(preview_gateway.session, 'request', side_effect=lambda *a, **k: make_upstream()):
+        api_client.get(f'/api/containers/{container_id}/http/3000/')
+        api_client.get(f'/api/containers/{container_id}/http/3000/')
+
+    assert mock_inspect.call_count == 1
+    assert container_ips[container_id] == '172.17.0.9'
+
+def test_preview_rewrites_redirects(container_id, api_client):
+    """Absolute-path redirects stay inside the gateway prefix"""
+    from core.app import container_ips, preview_gateway
+    container_ips[container_id] = '172.18.0.5'
+
+    upstream = make_upstream(status=302, headers={'Location': '/login'}, chunks=())
+    with patch.object(preview_gateway.session, 'request', return_value=upstream):
+        response = api_client.get(f'/api/containers/{container_id}/http/8080/')
+
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(f'/api/containers/{container_id}/http/8080/login')
+
+def test_preview_upstream_unavailable(container_id, api_client):
+    """Connection failures return 502 and drop the cached IP"""
+    from core.app import container_ips, preview_gateway
+    container_ips[container_id] = '172.18.0.5'
+
+    with patch.object(preview_gateway.session, 'request', side_effect=requests.exceptions.ConnectionError("refused")):
+        response = api_client.post(f'/api/containers/{container_id}/http/8080/api', data=b"payload")
+
+    assert response.status_code == 502
+    assert container_id not in container_ips
+
+def test_preview_unknown_container(api_client):
+    """Unknown containers return 404"""
+    response = api_client.get('/api/containers/does-not-exist/http/8080/')
+    assert response.status_code == 404
+
+def test_preview_strips_credentials(container_id, api_client):
+    """Manager credentials and hop-by-hop headers are not forwarded into the container"""
+    from core.app import container_ips, preview_gateway
+    container_ips[container_id] = '172.18.0.5'
+
+    with patch.object(preview_gateway.session, 'request', return_value=make_upstream()) as mock_request:
+        api_client.get(f'/api/containers/{container_id}/http/8080/', headers={
+            'Authorization': 'Bearer secret', 'X-Admin-Token': 'secret', 'Cookie': 'session=abc',
+            'Connection': 'X-Trace-Hop', 'X-Trace-Hop': '1', 'Accept': 'text/html'})
+
+    forwarded = {name.lower(): value for name, value in mock_request.call_args[1]['headers'].items()}
+    for name in ('authorization', 'x-admin-token', 'cookie', 'connection', 'x-trace-hop'):
+        assert name not in forwarded
+    assert forwarded['accept'] == 'text/html'
+    assert forwarded['x-forwarded-prefix'] == f'/api/containers/{container_id}/http/8080'
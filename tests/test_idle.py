@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test pausing idle containers and unpausing them on the next use
+"""
+import time
+from unittest.mock import MagicMock
+
+from core.idle import IdlePauser, open_connections
+from core.registry import ContainerRegistry
+
+TCP_TABLE = """  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode
+   0: 00000000:0016 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 1
+   1: 0200A8C0:0016 0100A8C0:D2F4 01 00000000:00000000 02:000A7B2E 00000000     0        0 2
+   2: 0200A8C0:1F90 0100A8C0:D2F6 01 00000000:00000000 02:000A7B2E 00000000     0        0 3
+"""
+
+def make_registry(last_active_at):
+    registry = ContainerRegistry()
+    container = MagicMock()
+    registry.add('c1', {'id': 'c1', 'name': 'ai-container-c1', 'container_obj': container, 'status': 'running',
+                        'created_at': last_active_at, 'last_active_at': last_active_at})
+    return registry, container
+
+def test_open_connections():
+    """Only established connections to the local port count, not listeners or other ports"""
+    assert open_connections(TCP_TABLE, 22) == 1
+    assert open_connections(TCP_TABLE, 8080) == 1
+    assert open_connections(TCP_TABLE, 443) == 0
+
+def test_pauses_idle_and_resumes():
+    """Idle containers are paused once and unpaused with their latency recorded"""
+    now = time.time()
+    registry, container = make_registry(now - 120)
+    pauser = IdlePauser(registry, 300)
+    assert pauser.check(now) == 0
+
+    pauser.idle_seconds = 60
+    assert pauser.check(now) == 1
+    container.pause.assert_called_once()
+    assert registry['c1']['status'] == 'paused'
+    assert pauser.check(now) == 0
+
+    assert pauser.resume('c1') is not None
+    container.unpause.assert_called_once()
+    assert registry['c1']['status'] == 'running'
+    assert registry['c1']['last_active_at'] > now - 1
+    assert pauser.resume('c1') is None
+    assert pauser.stats()['resumes'] == 1
+
+def test_busy_containers_count_as_active():
+    """A container with an open session is left running and its idle clock restarts"""
+    now = time.time()
+    registry, container = make_registry(now - 120)
+    pauser = IdlePauser(registry, 60, busy=lambda info: True)
+    assert pauser.check(now) == 0
+    container.pause.assert_not_called()
+    assert registry['c1']['last_active_at'] == now
+
+def test_touch_is_throttled():
+    """Activity is only written when the recorded time is stale"""
+    now = time.time()
+    registry, _ = make_registry(now)
+    pauser = IdlePauser(registry, 60)
+    revision = registry.revision
+    pauser.touch('c1', now + 1)
+    assert registry.revision == revision
+    pauser.touch('c1', now + 30)
+    assert registry['c1']['last_active_at'] == now + 30
+
+def test_exec_unpauses(api_client, container_id):
+    """Exec on a paused container unpauses it first; listings show the paused status"""
+    from core.app import active_containers, idle_pauser
+
+    active_containers.transition(container_id, 'paused')
+    listed = {item['id']: item for item in api_client.get('/api/containers').json}
+    assert listed[container_id]['status'] == 'paused'
+
+    response = api_client.post(f'/api/containers/{container_id}/exec', json={'command': 'ls'})
+    assert response.status_code == 200
+    active_containers[container_id]['container_obj'].unpause.assert_called_once()
+    assert active_containers[container_id]['status'] == 'running'
+    assert idle_pauser.stats()['paused'] == 0
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test conditional GET, pagination, status filtering and field projection on listings
+"""
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+@pytest.fixture
+def fleet():
+    """Three tracked containers in different states"""
+    from core.app import active_containers
+    ids = ['aaa111', 'bbb222', 'ccc333']
+    for container_id, status in zip(ids, ['running', 'exited', 'running']):
+        active_containers[container_id] = {
+            'id': container_id,
+            'name': f'ai-container-{container_id}',
+            'container_obj': MagicMock(),
+            'status': status,
+            'created_at': time.time(),
+            'ssh_port': 11001
+        }
+    yield ids
+    for container_id in ids:
+        active_containers.pop(container_id, None)
+
+def test_unchanged_listing_returns_304(api_client, fleet):
+    """Polls with the current ETag get 304 until the registry changes"""
+    from core.app import active_containers
+
+    first = api_client.get('/api/containers')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    repeat = api_client.get('/api/containers', headers={'If-None-Match': etag})
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+
+    active_containers.update('aaa111', status='exited')
+    changed = api_client.get('/api/containers', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+def test_untracked_containers_change_the_etag(api_client, fleet):
+    """A container appearing outside the registry invalidates the ETag"""
+    from core.app import client
+
+    etag = api_client.get('/api/containers').headers['ETag']
+    client.api.containers.return_value = [{'Id': 'd' * 64, 'Names': ['/ai-container-ddd444'], 'State': 'running'}]
+    client.api.inspect_container.return_value = {
+        'Created': '2024-01-01T00:00:00Z',
+        'HostConfig': {'PortBindings': {'22/tcp': [{'HostPort': '11500'}]}}
+    }
+    try:
+        response = api_client.get('/api/containers', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        untracked = [c for c in response.json if c.get('untracked')]
+        assert untracked == [{'id': 'ddd444', 'name': 'ai-container-ddd444', 'status': 'running',
+                              'created_at': '2024-01-01T00:00:00Z', 'ssh_port': '11500', 'untracked': True}]
+    finally:
+        client.api.containers.return_value = MagicMock()
+        client.api.inspect_container.return_value = MagicMock()
+
+def test_cursor_pagination(api_client, fleet):
+    """limit and cursor walk the listing in ID order"""
+    first = api_client.get('/api/containers?limit=2&fields=id')
+    assert first.json == [{'id': 'aaa111'}, {'id': 'bbb222'}]
+    cursor = first.headers['X-Next-Cursor']
+
+    second = api_client.get(f'/api/containers?limit=2&fields=id&cursor={cursor}')
+    assert second.json == [{'id': 'ccc333'}]
+    assert 'X-Next-Cursor' not in second.headers
+
+def test_status_filter_and_projection(api_client, fleet):
+    """status narrows the listing and fields projects each entry"""
+    response = api_client.get('/api/containers?status=exited&fields=id,status')
+    assert response.json == [{'id': 'bbb222', 'status': 'exited'}]
+
+    stats = api_client.get('/api/stats?status=running&fields=id,tracked')
+    assert stats.status_code == 200
+    assert sorted(c['id'] for c in stats.json['containers']) == ['aaa111', 'ccc333']
+    assert all(set(c) == {'id', 'tracked'} for c in stats.json['containers'])
+
+@pytest.mark.parametrize('query', ['fields=password', 'limit=0', 'limit=ten', 'cursor=%%%'])
+def test_invalid_listing_arguments(api_client, query):
+    """Bad query arguments are rejected"""
+    assert api_client.get(f'/api/containers?{query}').status_code == 400
+
+def test_stats_conditional_get(api_client, fleet):
+    """Stats polls also get 304 while nothing changes"""
+    etag = api_client.get('/api/stats').headers['ETag']
+    assert api_client.get('/api/stats', headers={'If-None-Match': etag}).status_code == 304
+
+def test_stats_etag_covers_idle_counters(api_client, fleet):
+    """A resume changes the idle section of stats, so the ETag changes too"""
+    from core.app import idle_pauser
+    etag = api_client.get('/api/stats').headers['ETag']
+    idle_pauser.resumes += 1
+    try:
+        assert api_client.get('/api/stats', headers={'If-None-Match': etag}).status_code == 200
+    finally:
+        idle_pauser.resumes -= 1
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the queue-based logging pipeline, JSON records, rate limiting and command sampling
+"""
+import io
+import json
+import queue
+import logging
+from unittest.mock import patch
+
+import pytest
+
+from core.log_config import JsonFormatter, RateLimitFilter, DroppingQueueHandler, configure_logging
+
+def make_record(message, level=logging.ERROR, lineno=10, **extra):
+    record = logging.LogRecord('core.app', level, 'app.py', lineno, message, (), None)
+    record.__dict__.update(extra)
+    return record
+
+def test_json_formatter_includes_extra_fields():
+    """Records become JSON objects carrying fields passed with extra="""
+    entry = json.loads(JsonFormatter().format(make_record('boom', container_id='abc')))
+    assert entry['level'] == 'ERROR'
+    assert entry['logger'] == 'core.app'
+    assert entry['message'] == 'boom'
+    assert entry['container_id'] == 'abc'
+
+def test_rate_limit_filter_reports_suppressed_records():
+    """Repeats from one call site are dropped after the burst and counted"""
+    limiter = RateLimitFilter(interval=60, burst=2)
+    with patch('core.log_config.time.monotonic', return_value=0):
+        results = [limiter.filter(make_record(f'failed {i}')) for i in range(5)]
+        assert limiter.filter(make_record('other site', lineno=20))
+        assert limiter.filter(make_record('info', level=logging.INFO))
+    assert results == [True, True, False, False, False]
+
+    with patch('core.log_config.time.monotonic', return_value=61):
+        record = make_record('failed again')
+        assert limiter.filter(record)
+    assert record.suppressed == 3
+    assert record.getMessage() == 'failed again (3 similar messages suppressed)'
+
+def test_queue_handler_drops_instead_of_blocking():
+    """A full queue drops records rather than blocking the caller"""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.emit(make_record('first'))
+    handler.emit(make_record('second'))
+    assert handler.dropped == 1
+
+def test_configure_logging_writes_through_listener():
+    """Records logged in the request thread are written by the listener thread"""
+    stream = io.StringIO()
+    listener = configure_logging(json_format=True, stream=stream)
+    try:
+        try:
+            raise ValueError("bad input")
+        except ValueError:
+            logging.getLogger('core.app').exception("Command failed")
+        listener.stop()
+        entry = json.loads(stream.getvalue().splitlines()[-1])
+        assert entry['message'] == 'Command failed'
+        assert 'ValueError: bad input' in entry['exception']
+    finally:
+        configure_logging()
+
+@pytest.mark.parametrize('max_chars,sample_rate,random_value,expected', [
+    (200, 1.0, 0.99, 'echo hello'),
+    (4, 1.0, 0.99, 'echo... (10 chars)'),
+    (200, 0.1, 0.5, None),
+    (200, 0.1, 0.05, 'echo hello'),
+])
+def test_command_for_log(max_chars, sample_rate, random_value, expected):
+    """Exec commands are truncated and sampled before logging"""
+    import core.app as app_module
+    with patch.object(app_module, 'LOG_COMMAND_MAX_CHARS', max_chars), \
+            patch.object(app_module, 'LOG_COMMAND_SAMPLE_RATE', sample_rate), \
+            patch('core.app.random.random', return_value=random_value):
+        assert app_module.command_for_log('echo hello') == expected
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test the Prometheus metrics endpoint and Docker call instrumentation
+"""
+import pytest
+
+from core.metrics import MetricsRegistry, instrument_api_client, docker_calls, docker_call_duration
+
+def test_histogram_renders_cumulative_buckets():
+    """Buckets are cumulative and end with +Inf, followed by sum and count"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, route='a')
+    histogram.observe(0.5, route='a')
+    histogram.observe(5, route='a')
+
+    lines = registry.render().splitlines()
+    assert '# TYPE latency_seconds histogram' in lines
+    assert 'latency_seconds_bucket{route="a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{route="a"} 5.55' in lines
+    assert 'latency_seconds_count{route="a"} 3' in lines
+
+def test_labels_must_match():
+    """Observations with the wrong labels are rejected"""
+    counter = MetricsRegistry().counter('calls_total', 'Calls', ('operation',))
+    with pytest.raises(ValueError):
+        counter.inc(op='stop')
+
+def test_instrumented_api_client_records_calls():
+    """Wrapped APIClient methods are counted and timed, including failures"""
+    class FakeAPIClient:
+        def stop(self, container, timeout=10):
+            return timeout
+
+        def inspect_container(self, container):
+            raise RuntimeError("not found")
+
+    api = instrument_api_client(FakeAPIClient(), operations=('stop', 'inspect_container'))
+    instrument_api_client(api, operations=('stop',))  # Instrumenting twice does not double count
+    before_success = docker_calls.value(operation='stop', outcome='success')
+    before_error = docker_calls.value(operation='inspect_container', outcome='error')
+    before_timed = docker_call_duration.count(operation='stop')
+
+    assert api.stop('abc', timeout=5) == 5
+    with pytest.raises(RuntimeError):
+        api.inspect_container('abc')
+
+    assert docker_calls.value(operation='stop', outcome='success') == before_success + 1
+    assert docker_calls.value(operation='inspect_container', outcome='error') == before_error + 1
+    assert docker_call_duration.count(operation='stop') == before_timed + 1
+
+def test_metrics_endpoint(api_client, container_id):
+    """Route latency, exec output size and container gauges are exposed"""
+    api_client.post(f'/api/containers/{container_id}/exec', json={'command': 'echo hi'})
+
+    response = api_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{endpoint="exec_command",method="POST",status="200"}' in body
+    assert 'exec_output_bytes_count' in body
+    assert 'tracked_containers{status="running"}' in body
+    assert 'ssh_ports_in_use 1' in body
+    assert 'container_expiry_lag_seconds 0' in body
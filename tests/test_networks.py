@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test managed container networks and peer discovery
+"""
+import pytest
+from unittest.mock import patch, MagicMock, PropertyMock
+
+@pytest.fixture
+def created_ids():
+    """Collect created container IDs and untrack them after the test"""
+    from core.app import active_containers
+    ids = []
+    yield ids
+    for container_id in ids:
+        active_containers.pop(container_id, None)
+
+def test_create_on_managed_network(api_client, created_ids):
+    """Creating with a network attaches the container with DNS aliases"""
+    from core.app import client
+    network = MagicMock()
+    network.name = 'ai-net-team'
+
+    with patch.object(client.networks, 'list', return_value=[]), \
+         patch.object(client.networks, 'create', return_value=network) as mock_create, \
+         patch('core.app.setup_ssh_for_container', return_value=True):
+        response = api_client.post('/api/containers', json={'network': 'team', 'alias': 'planner'})
+
+    assert response.status_code == 201
+    result = response.json
+    created_ids.append(result['id'])
+
+    assert mock_create.call_args[0][0] == 'ai-net-team'
+    assert mock_create.call_args[1]['driver'] == 'bridge'
+    aliases = network.connect.call_args[1]['aliases']
+    assert result['name'] in aliases
+    assert 'planner' in aliases
+    assert result['network'] == 'team'
+
+def test_create_rejects_invalid_network(api_client):
+    """Network names must be valid Docker names"""
+    response = api_client.post('/api/containers', json={'network': '../bad name'})
+    assert response.status_code == 400
+
+def test_list_peers(api_client, created_ids):
+    """Peers are the other tracked containers on the same managed network"""
+    from core.app import active_containers, client
+    network = MagicMock()
+    network.name = 'ai-net-team'
+
+    with patch.object(client.networks, 'list', return_value=[network]), \
+         patch('core.app.setup_ssh_for_container', return_value=True):
+        first = api_client.post('/api/containers', json={'network': 'team'}).json
+        second = api_client.post('/api/containers', json={'network': 'team'}).json
+        other = api_client.post('/api/containers').json
+    created_ids.extend([first['id'], second['id'], other['id']])
+
+    second_obj = active_containers[second['id']]['container_obj']
+    network.attrs = {'Containers': {second_obj.id: {'IPv4Address': '172.20.0.3/16'}}}
+
+    with patch.object(client.networks, 'get', return_value=network):
+        response = api_client.get(f"/api/containers/{first['id']}/peers")
+
+    assert response.status_code == 200
+    peers = response.json['peers']
+    assert [peer['id'] for peer in peers] == [second['id']]
+    assert peers[0]['ip_address'] == '172.20.0.3'
+    assert second['name'] in peers[0]['aliases']
+
+def test_peers_without_network(container_id, api_client):
+    """Containers outside a managed network have no peers"""
+    response = api_client.get(f'/api/containers/{container_id}/peers')
+    assert response.status_code == 200
+    assert response.json == {'network': None, 'peers': []}
+
+def test_list_peers_skips_hibernated(api_client, created_ids):
+    """Hibernated peers have no Docker container and are left out instead of failing the listing"""
+    from core.app import active_containers, client
+    network = MagicMock()
+    network.name = 'ai-net-team'
+    network.attrs = {'Containers': {}}
+
+    with patch.object(client.networks, 'list', return_value=[network]), \
+         patch('core.app.setup_ssh_for_container', return_value=True):
+        first = api_client.post('/api/containers', json={'network': 'team'}).json
+        second = api_client.post('/api/containers', json={'network': 'team'}).json
+    created_ids.extend([first['id'], second['id']])
+
+    # Another worker's view of a hibernated container: looking it up fails
+    missing = MagicMock()
+    type(missing).id = PropertyMock(side_effect=Exception('404 Client Error: Not Found'))
+    active_containers.transition(second['id'], 'hibernated', container_obj=missing, docker_id=None)
+
+    with patch.object(client.networks, 'get', return_value=network):
+        response = api_client.get(f"/api/containers/{first['id']}/peers")
+    assert response.status_code == 200
+    assert response.json['peers'] == []
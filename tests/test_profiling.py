@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test on-demand profiling: admin checks, cProfile for the next N requests and stack sampling
+"""
+import time
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from core.profiling import Profiler
+
+ADMIN = {'Authorization': 'Bearer secret'}
+
+@pytest.fixture
+def admin_token():
+    with patch('core.app.ADMIN_TOKEN', 'secret'):
+        yield
+
+def test_profile_endpoints_need_admin_token(api_client):
+    """Profiling is disabled without ADMIN_TOKEN and rejects a wrong token"""
+    with patch('core.app.ADMIN_TOKEN', None):
+        assert api_client.get('/api/debug/profile').status_code == 403
+    with patch('core.app.ADMIN_TOKEN', 'secret'):
+        assert api_client.get('/api/debug/profile', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        assert api_client.get('/api/debug/profile', headers={'X-Admin-Token': 'secret'}).status_code == 200
+
+def test_cprofile_next_requests_to_endpoint(api_client, container_id, admin_token):
+    """Only the next N requests to the chosen endpoint are profiled"""
+    response = api_client.post('/api/debug/profile', headers=ADMIN,
+                               json={'mode': 'cprofile', 'endpoint': 'exec_command', 'requests': 2})
+    assert response.status_code == 201
+    session_id = response.json['id']
+
+    # A second session cannot start while this one runs
+    assert api_client.post('/api/debug/profile', headers=ADMIN, json={'requests': 1}).status_code == 409
+
+    api_client.get('/api/containers')
+    for _ in range(2):
+        api_client.post(f'/api/containers/{container_id}/exec', json={'command': 'ls'})
+
+    status = api_client.get('/api/debug/profile', headers=ADMIN).json
+    assert status['current'] is None
+    result = next(session for session in status['results'] if session['id'] == session_id)
+    assert result['requests_profiled'] == 2
+
+    response = api_client.get(f'/api/debug/profile/{session_id}?limit=20', headers=ADMIN)
+    assert response.status_code == 200
+    assert 'exec_command' in response.get_data(as_text=True)
+
+def test_start_profile_validates_input(api_client, admin_token):
+    """A session needs a known mode and a stop condition"""
+    assert api_client.post('/api/debug/profile', headers=ADMIN, json={'mode': 'perf', 'requests': 1}).status_code == 400
+    assert api_client.post('/api/debug/profile', headers=ADMIN, json={'mode': 'cprofile'}).status_code == 400
+
+def test_sampling_collects_collapsed_stacks():
+    """Stacks of threads serving matching requests are sampled and collapsed"""
+    profiler = Profiler()
+    session = profiler.start('sampling', endpoint='exec_command', duration=0.3, interval=0.005)
+
+    def slow_handler_work():
+        time.sleep(0.15)
+
+    def request_thread():
+        handle = profiler.request_started('exec_command')
+        slow_handler_work()
+        profiler.request_finished(handle)
+
+    thread = threading.Thread(target=request_thread)
+    thread.start()
+    thread.join()
+    assert profiler.request_started('list_containers') is None
+
+    deadline = time.time() + 2
+    while not session.finished and time.time() < deadline:
+        time.sleep(0.02)
+    assert session.finished
+    assert session.requests == 1
+    collapsed = session.collapsed()
+    assert 'test_profiling:slow_handler_work' in collapsed
+    stack, count = collapsed.splitlines()[0].rsplit(' ', 1)
+    assert int(count) > 0 and ';' in stack
+
+def test_idle_profiler_is_a_no_op():
+    """Without a session, request hooks do nothing"""
+    profiler = Profiler()
+    handle = profiler.request_started('exec_command')
+    assert handle is None
+    profiler.request_finished(handle)
+    assert profiler.current() is None
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Test the container registry: indexes, atomic transitions, snapshots and shared state
+"""
+import threading
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from core.registry import ContainerRegistry
+from core.state_store import ContainerStateStore
+
+def record(container_id, status='running', **fields):
+    return {'id': container_id, 'name': f'ai-container-{container_id}', 'container_obj': MagicMock(),
+            'status': status, 'created_at': 100.0, **fields}
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two registries backed by the same database, like two gunicorn workers"""
+    path = str(tmp_path / 'state.db')
+    resolver = MagicMock(side_effect=lambda name: MagicMock(name=f"container:{name}"))
+    first = ContainerRegistry(ContainerStateStore(path), resolve_container=resolver)
+    second = ContainerRegistry(ContainerStateStore(path), resolve_container=resolver)
+    return first, second, resolver
+
+def test_indexes_follow_updates():
+    """Name and status indexes stay consistent with the records"""
+    registry = ContainerRegistry()
+    registry.add('a', record('a'))
+    registry.add('b', record('b', status='exited'))
+
+    assert registry.by_name('ai-container-b')['id'] == 'b'
+    assert [r['id'] for r in registry.by_status('running')] == ['a']
+
+    registry.update('b', status='running')
+    assert sorted(r['id'] for r in registry.by_status('running')) == ['a', 'b']
+    assert registry.by_status('exited') == []
+
+    registry.remove('a')
+    assert registry.by_name('ai-container-a') is None
+    assert registry.status_counts() == {'running': 1}
+
+def test_transition_is_compare_and_set():
+    """Only one of two competing transitions wins"""
+    registry = ContainerRegistry()
+    registry.add('a', record('a'))
+
+    previous = registry.transition('a', 'removing', exclude_statuses=('removing',))
+    assert previous['status'] == 'running'
+    assert registry.transition('a', 'removing', exclude_statuses=('removing',)) is None
+    assert registry.transition('a', 'restarting', from_statuses=['running']) is None
+    assert registry['a']['status'] == 'removing'
+
+def test_snapshots_are_stable_and_revision_increases():
+    """Iterating a snapshot is unaffected by concurrent writes"""
+    registry = ContainerRegistry()
+    for i in range(5):
+        registry.add(str(i), record(str(i)))
+    revision = registry.revision
+
+    seen = []
+    for container_id, _ in registry.items():
+        registry.remove(container_id)
+        registry.add(f'new-{container_id}', record(f'new-{container_id}'))
+        seen.append(container_id)
+
+    assert seen == ['0', '1', '2', '3', '4']
+    assert registry.revision > revision
+
+def test_concurrent_writers_and_readers():
+    """Readers iterating while writers add and delete never fail"""
+    registry = ContainerRegistry()
+    errors = []
+
+    def writer(offset):
+        for i in range(200):
+            container_id = f'{offset}-{i}'
+            registry.add(container_id, record(container_id))
+            registry.remove(container_id)
+
+    def reader():
+        try:
+            for _ in range(200):
+                for container_id, info in registry.items():
+                    info['status']
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    threads += [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(registry) == 0
+
+def test_replace_all_keeps_newer_records():
+    """A reconcile does not drop containers created while it ran"""
+    registry = ContainerRegistry()
+    registry.add('old', record('old', created_at=10.0))
+    registry.add('new', record('new', created_at=200.0))
+
+    registry.replace_all({'found': record('found')}, keep_newer_than=150.0)
+    assert sorted(registry.keys()) == ['found', 'new']
+
+def test_writes_are_visible_to_other_workers(workers):
+    """Records created in one worker show up in the other without the container object"""
+    first, second, resolver = workers
+    container = MagicMock()
+    first['abc'] = {'id': 'abc', 'name': 'ai-container-abc', 'container_obj': container, 'status': 'running'}
+
+    assert 'abc' in second
+    assert second['abc']['status'] == 'running'
+    assert first['abc']['container_obj'] is container
+    assert first.revision == second.revision
+
+    # The other worker looks the container up by name on first use
+    second['abc']['container_obj'].restart()
+    resolver.assert_called_once_with('ai-container-abc')
+
+    first.update('abc', status='exited')
+    assert second.by_status('exited')[0]['id'] == 'abc'
+
+def test_replaced_containers_are_looked_up_again(workers):
+    """A worker drops its container object once another worker recreates the container"""
+    first, second, resolver = workers
+    old = MagicMock()
+    second.add('abc', record('abc', container_obj=old, docker_id='d1'))
+    first.update('abc', last_active_at=200.0)
+    assert second['abc']['container_obj'] is old
+
+    # First wakes it from hibernation: a new Docker container under the same name
+    first.transition('abc', 'hibernated', container_obj=None, docker_id=None)
+    first.add('abc', record('abc', docker_id='d2'))
+    assert second['abc']['container_obj'] is not old
+    second['abc']['container_obj'].exec_run('ls')
+    resolver.assert_called_once_with('ai-container-abc')
+
+def test_transitions_are_atomic_across_workers(workers):
+    """The shared store rejects a transition another worker already made"""
+    first, second, _ = workers
+    first.add('abc', record('abc'))
+    assert second['abc']['status'] == 'running'
+
+    assert first.transition('abc', 'removing', from_statuses=['running']) is not None
+    # Simulate second racing before it re-reads the store: the store-level check still stops it
+    second._sync = lambda: None
+    assert second['abc']['status'] == 'running'
+    assert second.transition('abc', 'removing', from_statuses=['running']) is None
+
+def test_update_keeps_status_set_by_other_worker(workers):
+    """A field update from a stale worker does not undo another worker's transition"""
+    first, second, _ = workers
+    first.add('abc', record('abc'))
+    assert second['abc']['status'] == 'running'
+
+    second._sync = lambda: None
+    assert first.transition('abc', 'removing', from_statuses=['running']) is not None
+    updated = second.update('abc', last_active_at=200.0)
+    assert updated['status'] == 'removing'
+    assert first['abc']['status'] == 'removing'
+    assert first['abc']['last_active_at'] == 200.0
+
+    first.remove('abc')
+    assert second.update('abc', last_active_at=300.0) is None
+
+def test_delete_and_clear(workers):
+    first, second, _ = workers
+    first['a'] = record('a')
+    first['b'] = record('b')
+    assert sorted(second.keys()) == ['a', 'b']
+
+    del second['a']
+    assert 'a' not in first
+    with pytest.raises(KeyError):
+        del first['a']
+
+    first.clear()
+    assert len(second) == 0
+
+def test_delete_endpoint_rejects_busy_container(container_id, api_client):
+    """A container that is already being removed is not removed twice"""
+    from core.app import active_containers
+    active_containers.transition(container_id, 'removing')
+
+    response = api_client.delete(f'/api/containers/{container_id}')
+    assert response.status_code == 409
+    active_containers[container_id]['container_obj'].stop.assert_not_called()
+
+def test_reconcile_keeps_container_ids(api_client):
+    """Containers created through the API keep their ID and spec across a reconcile"""
+    from core.app import active_containers, client, handle_existing_containers
+
+    launched = MagicMock(id='d1', status='running')
+    launched.exec_run.return_value = MagicMock(exit_code=0, output=(b'ok', b''))
+    with patch.object(client.containers, 'run', return_value=launched), \
+         patch('core.app.setup_ssh_for_container', return_value=True):
+        response = api_client.post('/api/containers', json={'caches': False})
+    assert response.status_code == 201
+    container_id = response.json['id']
+    launched.name = active_containers[container_id]['name']
+    known = dict(active_containers[container_id])
+
+    details = {'Created': datetime.now(timezone.utc).isoformat(),
+               'HostConfig': {'PortBindings': {'22/tcp': [{'HostPort': str(known['ssh_port'])}]}}}
+    try:
+        with patch.object(client.containers, 'list', return_value=[launched]), \
+             patch.object(client.api, 'inspect_container', return_value=details):
+            handle_existing_containers()
+
+        assert container_id in active_containers
+        assert launched.name.split('-')[-1] not in active_containers
+        assert active_containers[container_id]['spec'] == known['spec']
+        assert active_containers[container_id]['docker_id'] == 'd1'
+
+        response = api_client.post(f'/api/containers/{container_id}/exec', json={'command': 'true'})
+        assert response.status_code == 200
+    finally:
+        active_containers.pop(container_id, None)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test resource profiles, host capacity accounting and cpuset assignment
+"""
+import pytest
+from unittest.mock import patch
+
+from core.resources import ResourceLedger, parse_memory, read_host_capacity
+from core.state_store import ContainerStateStore
+
+GB = 1024 ** 3
+
+def make_ledger(records, cpus=4, memory=8 * GB, **kwargs):
+    return ResourceLedger(lambda: records, cpu_ids=list(range(cpus)), memory=memory, **kwargs)
+
+def test_parse_memory():
+    """Sizes accept bytes and k/m/g suffixes"""
+    assert parse_memory('512m') == 512 * 1024 ** 2
+    assert parse_memory('4GiB') == 4 * GB
+    assert parse_memory(1024) == 1024
+    for value in ('lots', '-1g', 0, None):
+        with pytest.raises(ValueError):
+            parse_memory(value)
+
+def test_read_host_capacity(tmp_path):
+    """CPUs and memory come from /proc/cpuinfo and /proc/meminfo"""
+    (tmp_path / 'cpuinfo').write_text('processor\t: 0\nmodel name\t: x\n\nprocessor\t: 1\n')
+    (tmp_path / 'meminfo').write_text('MemTotal:       2048 kB\nMemFree:         100 kB\n')
+    assert read_host_capacity(str(tmp_path)) == ([0, 1], 2048 * 1024)
+
+def test_resolve_profiles():
+    """Named and custom profiles resolve to demands; impossible ones are refused"""
+    ledger = make_ledger([])
+    assert ledger.resolve('medium') == {'profile': 'medium', 'cpus': 2.0, 'memory': 4 * GB}
+    assert ledger.resolve(custom={'cpus': 0.5, 'memory': '256m'})['profile'] == 'custom'
+    assert ledger.resolve() is None
+    assert ledger.resolve(default='small')['profile'] == 'small'
+    with pytest.raises(ValueError):
+        ledger.resolve('huge')
+    with pytest.raises(ValueError):
+        ledger.resolve(custom={'cpus': 8, 'memory': '1g'})
+
+def test_reservations_spread_cpusets_and_refuse_overcommit():
+    """Cores are handed out least loaded first; reservations beyond capacity are refused"""
+    records = []
+    ledger = make_ledger(records)
+    first = ledger.reserve(ledger.resolve('medium'))
+    assert first.cpuset == [0, 1]
+    records.append({'resources': first.record()})
+    ledger.release(first)
+
+    second = ledger.reserve(ledger.resolve('small'))
+    assert second.cpuset == [2]
+    assert second.run_options() == {'nano_cpus': 1000000000, 'mem_limit': GB, 'memswap_limit': GB, 'cpuset_cpus': '2'}
+    third = ledger.reserve(ledger.resolve('small'))
+    assert third.cpuset == [3]
+    assert ledger.reserve(ledger.resolve('small')) is None
+
+    ledger.release(third)
+    assert ledger.usage()['reserved'] == {'cpus': 3.0, 'memory': 5 * GB}
+    assert ledger.usage()['core_load'] == {'0': 1.0, '1': 1.0, '2': 1.0, '3': 0.0}
+
+def test_overcommit_ratio():
+    """An overcommit ratio above 1 lets reservations exceed the physical CPUs"""
+    records = [{'resources': {'cpus': 4.0, 'memory': GB, 'cpuset': [0, 1, 2, 3]}}]
+    assert make_ledger(records).reserve({'profile': 'small', 'cpus': 1.0, 'memory': GB}) is None
+    assert make_ledger(records, cpu_overcommit=2).reserve({'profile': 'small', 'cpus': 1.0, 'memory': GB}) is not None
+
+def test_pending_reservations_are_shared_between_workers(tmp_path):
+    """With a shared store, a reservation pending in one worker counts in the others"""
+    store = ContainerStateStore(str(tmp_path / 'state.db'))
+    tracked = lambda records=None: list(store.load_all()[1].values()) if records is None else records
+    first, second = (ResourceLedger(tracked, cpu_ids=[0, 1, 2, 3], memory=8 * GB,
+                                    store=ContainerStateStore(store.path)) for _ in range(2))
+    pending = first.reserve(first.resolve('medium'))
+    assert pending.cpuset == [0, 1]
+    assert second.usage()['reserved'] == {'cpus': 2.0, 'memory': 4 * GB}
+
+    other = second.reserve(second.resolve('medium'))
+    assert other.cpuset == [2, 3]
+    assert first.reserve(first.resolve('small')) is None
+
+    # Once tracked, the container's record holds the reservation instead
+    store.put('a', {'status': 'running', 'resources': pending.record()})
+    first.release(pending)
+    second.release(other)
+    assert second.reserve(second.resolve('medium')).cpuset == [2, 3]
+
+def test_launch_ports_are_shared_between_workers(tmp_path):
+    """Launches in progress on other workers keep their SSH ports"""
+    from core.app import active_containers, hold_launch_port, release_launch_port
+
+    active_containers.use_store(ContainerStateStore(str(tmp_path / 'state.db')))
+    try:
+        with patch('core.app.docker_host_ports', return_value={11001}):
+            first, first_lease = hold_launch_port()
+            other_worker = ContainerStateStore(str(tmp_path / 'state.db'))
+            assert other_worker.leases('port') == [{'port': 11002}]
+            second, second_lease = hold_launch_port()
+            assert (first, second) == (11002, 11003)
+
+            release_launch_port(first, first_lease)
+            release_launch_port(second, second_lease)
+            assert other_worker.leases('port') == []
+            assert hold_launch_port(11050)[0] == 11050
+    finally:
+        active_containers.use_store(None)
+
+def test_create_with_profile(api_client):
+    """Creates apply the profile's limits and are refused when the host is full"""
+    from core.app import resource_ledger, active_containers, client
+
+    with patch.object(resource_ledger, 'cpu_ids', [0, 1]), patch.object(resource_ledger, 'memory', 8 * GB), \
+         patch('core.app.setup_ssh_for_container', return_value=True):
+        response = api_client.post('/api/containers', json={'profile': 'medium'})
+        try:
+            assert response.status_code == 201
+            assert response.json['resources'] == {'profile': 'medium', 'cpus': 2.0, 'memory': 4 * GB, 'cpuset': [0, 1]}
+            kwargs = client.containers.run.call_args[1]
+            assert kwargs['nano_cpus'] == 2 * 10 ** 9 and kwargs['cpuset_cpus'] == '0,1'
+
+            rejected = api_client.post('/api/containers', json={'profile': 'small'})
+            assert rejected.status_code == 429
+            assert rejected.json['reason'] == 'resources'
+            assert api_client.post('/api/containers', json={'profile': 'large'}).status_code == 400
+            assert api_client.get('/api/resources').json['available'] == {'cpus': 0.0, 'memory': 4 * GB}
+        finally:
+            active_containers.pop(response.json['id'], None)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test workspace snapshots: tar chunking, deduplication and the API endpoints
+"""
+import io
+import os
+import tarfile
+import pytest
+from unittest.mock import patch, MagicMock
+
+from core.snapshots import SnapshotStore, iter_tar_chunks
+
+def make_tar(files):
+    """Build an in-memory tar archive of a workspace directory"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(f"workspace/{name}")
+            info.size = len(content)
+            info.mtime = 1700000000
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+def split(data, size=1000):
+    """Feed data as an iterator of odd-sized pieces, like a Docker stream"""
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+def workspace(changed=b"v1"):
+    files = {f"file{i}.txt": (b"%d" % i) * 5000 for i in range(60)}
+    files["file30.txt"] = changed * 5000
+    return files
+
+def test_chunks_reassemble_to_original():
+    """Chunks concatenate back into the exact archive"""
+    data = make_tar(workspace())
+    chunks = list(iter_tar_chunks(split(data), target_size=64 * 1024, max_size=128 * 1024))
+    assert b"".join(chunks) == data
+    assert len(chunks) > 1
+
+def test_large_members_split_at_fixed_offsets():
+    """Chunks never exceed the maximum size"""
+    data = make_tar({"big.bin": os.urandom(300 * 1024), "small.txt": b"x"})
+    chunks = list(iter_tar_chunks(split(data, 7000), target_size=64 * 1024, max_size=128 * 1024))
+    assert b"".join(chunks) == data
+    assert max(len(chunk) for chunk in chunks) <= 128 * 1024
+
+def test_snapshots_deduplicate(tmp_path):
+    """A second snapshot with one changed file stores only a few new chunks"""
+    store = SnapshotStore(str(tmp_path), compression='gzip', gc_grace=0)
+    first = store.create(split(make_tar(workspace(b"v1"))), '/workspace', container_id='c1')
+    second = store.create(split(make_tar(workspace(b"v2"))), '/workspace', container_id='c1')
+
+    assert first['new_chunks'] == len(first['chunks'])
+    assert 0 < second['new_chunks'] < len(second['chunks'])
+    assert b"".join(store.iter_archive(second)) == make_tar(workspace(b"v2"))
+
+    # Deleting the first snapshot keeps chunks the second still uses
+    removed = store.delete(first['id'])
+    assert removed == len(set(first['chunks']) - set(second['chunks']))
+    assert b"".join(store.iter_archive(store.get(second['id']))) == make_tar(workspace(b"v2"))
+    assert [m['id'] for m in store.list()] == [second['id']]
+
+def test_snapshot_and_restore_endpoints(container_id, api_client, tmp_path):
+    """Snapshots are taken from and restored into /workspace"""
+    from core.app import active_containers
+    container = active_containers[container_id]['container_obj']
+    archive = make_tar(workspace())
+    container.get_archive.return_value = (split(archive), {'size': 4096})
+    restored = []
+    container.put_archive.side_effect = lambda path, data: restored.append((path, b"".join(data))) or True
+
+    with patch('core.app.snapshot_store', SnapshotStore(str(tmp_path), compression='gzip')):
+        response = api_client.post(f'/api/containers/{container_id}/snapshots', json={'label': 'before-refactor'})
+        assert response.status_code == 201
+        snapshot = response.json
+        assert snapshot['label'] == 'before-refactor'
+        assert snapshot['raw_bytes'] == len(archive)
+        assert 'chunks' not in snapshot
+
+        listing = api_client.get(f'/api/containers/{container_id}/snapshots').json
+        assert [s['id'] for s in listing] == [snapshot['id']]
+
+        response = api_client.post(f'/api/containers/{container_id}/restore', json={'snapshot_id': snapshot['id']})
+        assert response.status_code == 200
+        assert restored == [('/', archive)]
+
+        response = api_client.delete(f"/api/snapshots/{snapshot['id']}")
+        assert response.status_code == 200
+        assert api_client.get('/api/snapshots').json == []
+
+def test_restore_unknown_snapshot(container_id, api_client, tmp_path):
+    """Unknown snapshots return 404"""
+    with patch('core.app.snapshot_store', SnapshotStore(str(tmp_path), compression='gzip')):
+        response = api_client.post(f'/api/containers/{container_id}/restore', json={'snapshot_id': 'nope'})
+    assert response.status_code == 404
+
+def test_damaged_snapshot_leaves_workspace_alone(container_id, api_client, tmp_path):
+    """A missing or corrupt chunk fails the restore before the workspace is cleared"""
+    from core.app import active_containers
+    container = active_containers[container_id]['container_obj']
+    store = SnapshotStore(str(tmp_path), compression='gzip')
+    manifest = store.create(split(make_tar(workspace())), '/workspace', container_id=container_id)
+    digest = manifest['chunks'][-1]
+    store._write_atomic(store._chunk_path(digest, 'gzip'), store._compress(b"something else"))
+
+    with patch('core.app.snapshot_store', store):
+        response = api_client.post(f'/api/containers/{container_id}/restore', json={'snapshot_id': manifest['id']})
+    assert response.status_code == 500
+    assert 'corrupt' in response.json['error']
+    container.exec_run.assert_not_called()
+    container.put_archive.assert_not_called()
+
+    os.remove(store._chunk_path(digest, 'gzip'))
+    with pytest.raises(ValueError, match='missing'):
+        store.verify(manifest)
+
+def test_delete_keeps_chunks_of_snapshots_in_progress(tmp_path):
+    """Chunks a snapshot still being written in another process relies on survive a delete"""
+    writer = SnapshotStore(str(tmp_path), compression='gzip')
+    collector = SnapshotStore(str(tmp_path), compression='gzip', gc_grace=60)
+    first = writer.create(split(make_tar(workspace())), '/workspace')
+    # Age the first snapshot's chunks past the grace period
+    for digest in first['chunks']:
+        os.utime(writer._chunk_path(digest, 'gzip'), (0, 0))
+    chunks = list(iter_tar_chunks(split(make_tar(workspace()))))
+
+    def interrupted():
+        # Deliver the same workspace, deleting the first snapshot from the other store halfway through
+        for index, chunk in enumerate(chunks):
+            if index == len(chunks) // 2:
+                assert collector.delete(first['id']) == len(set(chunks[index:]))
+            yield chunk
+
+    second = writer.create(interrupted(), '/workspace')
+    # Chunks touched before the delete were kept; the rest were collected and written again
+    assert 0 < second['new_chunks'] < len(second['chunks'])
+    writer.verify(second)
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith('.gc')]
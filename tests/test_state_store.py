@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test the SQLite store behind the shared container state
+"""
+import pytest
+
+from core.state_store import ContainerStateStore
+
+@pytest.fixture
+def stores(tmp_path):
+    """Two connections to the same database, like two gunicorn workers"""
+    path = str(tmp_path / 'state.db')
+    return ContainerStateStore(path), ContainerStateStore(path)
+
+def test_writes_bump_the_shared_revision(stores):
+    first, second = stores
+    assert first.revision() == second.revision() == 0
+
+    assert first.put('a', {'status': 'running'}) == 1
+    assert second.put('b', {'status': 'exited'}) == 2
+    assert first.load_all() == (2, {'a': {'status': 'running'}, 'b': {'status': 'exited'}})
+
+def test_put_if_status(stores):
+    """Conditional writes only apply from the expected statuses"""
+    first, second = stores
+    first.put('a', {'status': 'running'})
+
+    assert second.put_if_status('a', ['running'], {'status': 'removing'}) is not None
+    assert first.put_if_status('a', ['running'], {'status': 'restarting'}) is None
+    assert first.put_if_status('missing', ['running'], {'status': 'removing'}) is None
+    assert first.load_all()[1] == {'a': {'status': 'removing'}}
+
+def test_merge_keeps_other_fields(stores):
+    """Merging fields keeps whatever else another connection wrote"""
+    first, second = stores
+    first.put('a', {'status': 'running', 'last_active_at': 1.0})
+    second.put_if_status('a', ['running'], {'status': 'removing', 'last_active_at': 1.0})
+
+    revision, record = first.merge('a', {'last_active_at': 2.0})
+    assert record == {'status': 'removing', 'last_active_at': 2.0}
+    assert second.load_all() == (revision, {'a': record})
+    assert first.merge('missing', {'last_active_at': 2.0}) is None
+
+def test_delete_and_replace_all(stores):
+    first, second = stores
+    first.put('a', {'status': 'running'})
+    first.put('b', {'status': 'running'})
+
+    second.delete('a')
+    assert list(first.load_all()[1]) == ['b']
+
+    second.replace_all({'c': {'status': 'exited'}})
+    assert first.load_all()[1] == {'c': {'status': 'exited'}}
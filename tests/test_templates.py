@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test container templates and their memoized setup layers
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+
+from core.templates import TemplateRegistry, TemplateBuildError, normalize_template, layer_hashes, layer_tag
+
+class FakeImages:
+    """Docker images that exist: the base image plus whatever builders commit"""
+
+    def __init__(self):
+        self.tags = {'ai-container-image:latest': 'sha256:base'}
+
+    def get(self, name):
+        if name not in self.tags:
+            raise Exception(f'No such image: {name}')
+        return MagicMock(id=self.tags[name], attrs={'Config': {'Entrypoint': None, 'Cmd': ['/root/init.sh']}})
+
+def fake_client(fail_on=None):
+    """Docker client whose builders commit layers into FakeImages; returns (client, commands run)"""
+    docker = MagicMock()
+    docker.images = FakeImages()
+    commands = []
+
+    def run(image, **kwargs):
+        builder = MagicMock()
+        run.builders.append(builder)
+
+        def exec_run(cmd):
+            commands.append(cmd[-1])
+            return MagicMock(exit_code=1 if cmd[-1] == fail_on else 0, output=b'E: Unable to locate package')
+
+        builder.exec_run.side_effect = exec_run
+        builder.commit.side_effect = lambda repository, tag, **kw: docker.images.tags.setdefault(
+            f'{repository}:{tag}', f'sha256:{tag}')
+        return builder
+
+    run.builders = []
+    docker.containers.run.side_effect = run
+    return docker, commands
+
+def python_template(**overrides):
+    data = {'name': 'python-ml', 'environment': {'PYTHONUNBUFFERED': 1},
+            'setup': ['apt-get install -y build-essential', 'pip install numpy pandas']}
+    data.update(overrides)
+    return normalize_template(data, 'ai-container-image:latest')
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = TemplateRegistry(str(tmp_path / 'templates'))
+    with patch('core.app.template_registry', registry):
+        yield registry
+
+def test_normalize_template():
+    """Defaults are filled in and unsafe volumes rejected"""
+    template = python_template(volumes={'models': '/models'})
+    assert template['image'] == 'ai-container-image:latest'
+    assert template['environment'] == {'PYTHONUNBUFFERED': '1'}
+    assert template['volumes'] == {'models': {'bind': '/models', 'mode': 'rw'}}
+
+    for bad in ({'name': 'bad name'}, {'name': 't', 'setup': 'pip install numpy'},
+                {'name': 't', 'volumes': {'models': '/workspace'}}, {'name': 't', 'volumes': {'../etc': '/etc'}},
+                {'name': 't', 'volumes': {'/': '/host'}}, {'name': 't', 'volumes': {'/var/run/docker.sock': '/sock'}},
+                {'name': 't', 'environment': {'CONTAINER_ID': 'spoofed'}}):
+        with pytest.raises(ValueError):
+            normalize_template(bad, 'ai-container-image:latest')
+
+def test_layer_hashes_share_prefixes():
+    """Changing a command only changes the hashes from that command on"""
+    first = layer_hashes('sha256:base', {}, ['a', 'b', 'c'])
+    assert layer_hashes('sha256:base', {}, ['a', 'b', 'd'])[:2] == first[:2]
+    assert layer_hashes('sha256:base', {}, ['a', 'b', 'd'])[2] != first[2]
+    assert layer_hashes('sha256:rebuilt', {}, ['a', 'b', 'c'])[0] != first[0]
+    assert layer_hashes('sha256:base', {'X': '1'}, ['a', 'b', 'c'])[0] != first[0]
+
+def test_build_reuses_layers(registry):
+    """Setup runs once; an edited spec only reruns the commands after the edit"""
+    docker, commands = fake_client()
+    template = python_template()
+    image, steps = registry.build(docker, template)
+    assert steps == 2
+    assert commands == template['setup']
+    assert image == layer_tag(layer_hashes('sha256:base', template['environment'], template['setup'])[-1])
+
+    assert registry.build(docker, template) == (image, 0)
+    assert docker.containers.run.call_count == 1
+
+    # The builder stays up on its own command; layers get the base image's entrypoint and command back
+    run_kwargs = docker.containers.run.call_args[1]
+    assert (run_kwargs['entrypoint'], run_kwargs['command']) == (['sleep'], ['infinity'])
+    changes = docker.containers.run.side_effect.builders[0].commit.call_args[1]['changes']
+    assert 'ENTRYPOINT []' in changes and 'CMD ["/root/init.sh"]' in changes
+    docker.containers.run.side_effect.builders[0].remove.assert_called_once_with(force=True)
+
+    edited = python_template(setup=template['setup'][:1] + ['pip install numpy pandas torch'])
+    new_image, steps = registry.build(docker, edited)
+    assert new_image != image
+    assert steps == 1
+    assert commands[-1] == 'pip install numpy pandas torch'
+    assert docker.containers.run.call_args[0][0] == layer_tag(layer_hashes('sha256:base', template['environment'],
+                                                                           template['setup'])[0])
+
+def test_failed_setup_command(registry):
+    """A failing command raises with its output and leaves no layer for it"""
+    docker, _ = fake_client(fail_on='pip install numpy pandas')
+    with pytest.raises(TemplateBuildError) as error:
+        registry.build(docker, python_template())
+    assert error.value.exit_code == 1
+    assert 'Unable to locate' in error.value.output
+    assert len([tag for tag in docker.images.tags if tag.startswith('ai-container-template:')]) == 1
+    docker.containers.run.side_effect.builders[0].remove.assert_called_once_with(force=True)
+
+def test_create_from_template(registry, api_client):
+    """Creates start from the built image with the template's environment and volumes"""
+    from core.app import active_containers, client
+
+    response = api_client.post('/api/templates', json={
+        'name': 'python-ml', 'environment': {'PYTHONUNBUFFERED': '1'}, 'volumes': {'models': '/models'},
+        'setup': ['pip install numpy']})
+    assert response.status_code == 201
+    assert api_client.post('/api/templates', json={'name': 'python-ml'}).status_code == 409
+
+    docker, commands = fake_client()
+    launched = MagicMock()
+    with patch.object(client.images, 'get', side_effect=docker.images.get), \
+         patch.object(client.containers, 'run', side_effect=lambda image, **kwargs: (
+             docker.containers.run(image, **kwargs) if kwargs['name'].startswith('ai-template-build-') else launched)) as run, \
+         patch('core.app.setup_ssh_for_container', return_value=True):
+        first = api_client.post('/api/containers', json={'template': 'python-ml', 'caches': False})
+        second = api_client.post('/api/containers', json={'template': 'python-ml', 'caches': False})
+    created = [first.json['id'], second.json['id']]
+    try:
+        assert first.status_code == second.status_code == 201
+        assert first.json['template'] == 'python-ml'
+        assert commands == ['pip install numpy']
+        kwargs = run.call_args[1]
+        assert run.call_args[0][0].startswith('ai-container-template:')
+        assert kwargs['environment']['PYTHONUNBUFFERED'] == '1'
+        assert kwargs['environment']['CONTAINER_ID'] == second.json['id']
+        assert kwargs['volumes']['models'] == {'bind': '/models', 'mode': 'rw'}
+        assert api_client.get('/api/templates/python-ml').json['used_by'] == created
+    finally:
+        for container_id in created:
+            active_containers.pop(container_id, None)
+
+def test_template_requests_are_validated(registry, api_client):
+    assert api_client.post('/api/containers', json={'template': 'missing'}).status_code == 404
+    assert api_client.post('/api/templates', json={'name': 't', 'profile': 'huge'}).status_code == 400
+    assert api_client.post('/api/templates', json={'name': 't', 'volumes': {'/etc': '/host-etc'}}).status_code == 400
+    assert api_client.put('/api/templates/t', json={'setup': ['true']}).status_code == 201
+    assert api_client.put('/api/templates/t', json={'setup': ['true', 'true']}).status_code == 200
+    assert api_client.delete('/api/templates/t').status_code == 200
+    assert api_client.get('/api/templates/t').status_code == 404
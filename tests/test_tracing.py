@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test request tracing: span trees, N+1 detection and the debug endpoint
+"""
+import json
+import pytest
+
+from core.tracing import Tracer
+
+def test_span_tree_and_docker_call_counts():
+    """Child spans nest under the request and Docker calls are counted by operation"""
+    tracer = Tracer(n_plus_one_threshold=2)
+    tracer.start_trace('GET /api/containers')
+    with tracer.span('find_available_port'):
+        for _ in range(3):
+            with tracer.span('docker.inspect_container', kind='docker', operation='inspect_container'):
+                pass
+    trace = tracer.finish_trace(status=200)
+
+    assert trace['docker_calls'] == 3
+    assert trace['docker_calls_by_operation'] == {'inspect_container': 3}
+    assert trace['n_plus_one'] is True
+    assert trace['attributes']['status'] == 200
+    assert [child['name'] for child in trace['spans'][0]['children']] == ['docker.inspect_container'] * 3
+
+def test_spans_outside_a_trace_are_ignored():
+    """Background work without an active trace records nothing"""
+    tracer = Tracer()
+    with tracer.span('docker.containers', kind='docker', operation='containers') as span:
+        assert span is None
+    assert tracer.finish_trace() is None
+    assert tracer.recent() == []
+
+def test_failed_span_records_error():
+    """An exception inside a span is recorded and re-raised"""
+    tracer = Tracer()
+    tracer.start_trace('POST /api/containers')
+    with pytest.raises(RuntimeError):
+        with tracer.span('docker.start', kind='docker', operation='start'):
+            raise RuntimeError("port is already allocated")
+    trace = tracer.finish_trace()
+    assert trace['spans'][0]['error'] == "port is already allocated"
+
+def test_ring_buffer_and_export(tmp_path):
+    """Only the newest traces are kept, and every trace is exported as a JSON line"""
+    export_path = tmp_path / 'traces.jsonl'
+    tracer = Tracer(buffer_size=2, export_path=str(export_path))
+    for index in range(3):
+        tracer.start_trace(f'GET /{index}')
+        tracer.finish_trace()
+
+    assert [trace['name'] for trace in tracer.recent()] == ['GET /2', 'GET /1']
+    lines = export_path.read_text().splitlines()
+    assert [json.loads(line)['name'] for line in lines] == ['GET /0', 'GET /1', 'GET /2']
+
+def test_debug_traces_endpoint(api_client, container_id):
+    """Docker calls made while serving a request show up in its trace"""
+    from core.app import active_containers, observe_docker_call, tracer
+
+    def exec_run(*args, **kwargs):
+        for operation in ('exec_create', 'exec_start'):
+            with observe_docker_call(operation):
+                pass
+        return active_containers[container_id]['container_obj'].exec_run.return_value
+
+    active_containers[container_id]['container_obj'].exec_run.side_effect = exec_run
+    threshold = tracer.n_plus_one_threshold
+    tracer.n_plus_one_threshold = 1
+    try:
+        api_client.post(f'/api/containers/{container_id}/exec', json={'command': 'ls'})
+    finally:
+        tracer.n_plus_one_threshold = threshold
+
+    response = api_client.get('/api/debug/traces?n_plus_one=true&limit=1')
+    assert response.status_code == 200
+    trace = response.json['traces'][0]
+    assert trace['attributes']['endpoint'] == 'exec_command'
+    assert trace['docker_calls_by_operation'] == {'exec_create': 1, 'exec_start': 1}
+
+    response = api_client.get(f"/api/debug/traces/{trace['trace_id']}")
+    assert response.status_code == 200
+    assert response.json['trace_id'] == trace['trace_id']
+    assert api_client.get('/api/debug/traces/missing').status_code == 404
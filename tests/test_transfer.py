@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test direct container-to-container file transfers
+"""
+import pytest
+from unittest.mock import MagicMock
+
+from core.transfer import transfer_path
+
+def test_transfer_path_streams_chunks():
+    """The source archive is passed to the destination as an iterator, not a buffer"""
+    source = MagicMock()
+    source.get_archive.return_value = (iter([b"a" * 10, b"b" * 5]), {'size': 12})
+    destination = MagicMock()
+    received = []
+
+    def put_archive(path, data):
+        assert not isinstance(data, (bytes, bytearray))
+        received.extend(data)
+        return True
+    destination.put_archive.side_effect = put_archive
+
+    result = transfer_path(source, '/workspace/out', destination, '/workspace/in')
+
+    assert b"".join(received) == b"a" * 10 + b"b" * 5
+    assert result['bytes'] == 15
+    assert result['source_size'] == 12
+    assert destination.put_archive.call_args[0][0] == '/workspace/in'
+
+def test_transfer_endpoint(container_id, api_client):
+    """The endpoint moves data between two tracked containers and reports throughput"""
+    from core.app import active_containers
+    source = active_containers[container_id]['container_obj']
+    source.get_archive.return_value = (iter([b"x" * 2048]), {'size': 1024})
+
+    destination_id = 'transfer-destination'
+    destination = MagicMock()
+    destination.exec_run.return_value.exit_code = 0
+    destination.put_archive.side_effect = lambda path, data: bool(list(data))
+    active_containers[destination_id] = {'id': destination_id, 'name': 'ai-container-dest', 'container_obj': destination}
+
+    try:
+        response = api_client.post('/api/transfer', json={
+            'source': {'container': container_id, 'path': '/workspace/results'},
+            'destination': {'container': destination_id, 'path': '/workspace/inbox'}
+        })
+    finally:
+        del active_containers[destination_id]
+
+    assert response.status_code == 200
+    assert response.json['bytes'] == 2048
+    assert 'throughput_bytes_per_sec' in response.json
+    destination.exec_run.assert_called_with(["mkdir", "-p", "/workspace/inbox"])
+
+def test_transfer_requires_paths(container_id, api_client):
+    """Missing fields are rejected"""
+    response = api_client.post('/api/transfer', json={'source': {'container': container_id}})
+    assert response.status_code == 400
+
+def test_transfer_unknown_container(container_id, api_client):
+    """Unknown containers return 404"""
+    response = api_client.post('/api/transfer', json={
+        'source': {'container': container_id, 'path': '/workspace'},
+        'destination': {'container': 'missing', 'path': '/workspace'}
+    })
+    assert response.status_code == 404
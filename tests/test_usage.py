@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test the resource usage sampler, its ring buffers and the usage endpoints
+"""
+import math
+
+import pytest
+
+from core.usage import RingBuffer, Rollup, UsageSampler, parse_stats, usage_row, USAGE_FIELDS
+
+def docker_stats(seconds, memory=100 * 1024 ** 2):
+    """Docker stats after `seconds` of one busy core out of four"""
+    return {
+        'cpu_stats': {'cpu_usage': {'total_usage': int(seconds * 1e9)},
+                      'system_cpu_usage': int(seconds * 4e9), 'online_cpus': 4},
+        'memory_stats': {'usage': memory + 10 * 1024 ** 2, 'limit': 1024 ** 3, 'stats': {'inactive_file': 10 * 1024 ** 2}},
+        'networks': {'eth0': {'rx_bytes': int(seconds * 1000), 'tx_bytes': int(seconds * 500)}},
+        'blkio_stats': {'io_service_bytes_recursive': [{'op': 'Read', 'value': int(seconds * 200)},
+                                                      {'op': 'Write', 'value': int(seconds * 400)}]}
+    }
+
+def test_ring_buffer_keeps_newest_rows():
+    """Old rows are overwritten once the buffer is full"""
+    buffer = RingBuffer(3, 2)
+    for step in range(5):
+        buffer.append(step, [step, step * 10])
+    assert buffer.rows() == [(2.0, (2.0, 20.0)), (3.0, (3.0, 30.0)), (4.0, (4.0, 40.0))]
+    assert buffer.rows(since=4) == [(4.0, (4.0, 40.0))]
+    assert len(buffer.values) == 6
+
+def test_rollup_averages_buckets_and_skips_missing_values():
+    """Samples are averaged per bucket; NaN means no value"""
+    rollup = Rollup(60, 10, 2)
+    rollup.add(0, [10.0, float('nan')])
+    rollup.add(30, [20.0, 4.0])
+    rollup.add(60, [50.0, 6.0])
+    assert rollup.buffer.rows() == [(0.0, (15.0, 4.0))]
+    assert rollup.points() == [(0.0, (15.0, 4.0)), (60, (50.0, 6.0))]
+
+def test_usage_row_from_counters():
+    """CPU and rates come from the difference between two readings"""
+    first = parse_stats(docker_stats(10))
+    second = parse_stats(docker_stats(20))
+    row = dict(zip(USAGE_FIELDS, usage_row(first, second, 10)))
+    assert row['cpu_percent'] == pytest.approx(100.0)
+    assert row['memory_bytes'] == 100 * 1024 ** 2
+    assert row['net_rx_bps'] == pytest.approx(1000)
+    assert row['blk_write_bps'] == pytest.approx(400)
+    assert math.isnan(usage_row(None, second, 0)[0])
+
+def test_sampler_rounds_and_export(tmp_path):
+    """Rounds build bounded series, drop untracked containers and round-trip through the export file"""
+    readings = {'a': iter([docker_stats(10), docker_stats(20)]), 'b': iter([docker_stats(5)])}
+    sampler = UsageSampler(lambda container_id: next(readings[container_id]), interval=1,
+                           export_path=str(tmp_path / 'usage'))
+    sampler.sample(['a', 'b'])
+    sampler.sample(['a'])
+
+    assert set(sampler.usage) == {'a'}
+    history = sampler.container('a', '1s')
+    assert len(history['timestamps']) >= 1
+    assert history['latest']['memory_bytes'] == 100 * 1024 ** 2
+    assert sampler.fleet()['totals']['memory_bytes'] == 100 * 1024 ** 2
+
+    follower = UsageSampler(None, export_path=str(tmp_path / 'usage'))
+    assert follower.container('a', '1s') == history
+    assert follower.fleet()['containers'] == sampler.fleet()['containers']
+
+def test_usage_endpoints(api_client, container_id):
+    """Per-container history and fleet totals are served from the sampler"""
+    from core.app import usage_sampler, client, active_containers
+
+    client.api.stats.return_value = docker_stats(10)
+    try:
+        usage_sampler.sample([container_id])
+        client.api.stats.return_value = docker_stats(20)
+        usage_sampler.sample([container_id])
+        # Docker is asked by container name; the manager's ID means nothing to it
+        client.api.stats.assert_called_with(f'ai-container-{container_id[:8]}', stream=False, one_shot=True)
+        active_containers.update(container_id, docker_id='d1')
+        client.api.stats.return_value = docker_stats(30)
+        usage_sampler.sample([container_id])
+        client.api.stats.assert_called_with('d1', stream=False, one_shot=True)
+
+        response = api_client.get(f'/api/containers/{container_id}/metrics?resolution=1s')
+        assert response.status_code == 200
+        assert response.json['resolution'] == '1s'
+        assert response.json['latest']['cpu_percent'] == pytest.approx(100.0)
+        assert set(response.json['series']) == set(USAGE_FIELDS)
+
+        fleet = api_client.get('/api/containers/metrics').json
+        assert container_id in fleet['containers']
+        assert fleet['totals']['cpu_percent'] == pytest.approx(100.0)
+        assert 'fleet_resource_usage{resource="memory_bytes"} 104857600' in api_client.get('/metrics').get_data(as_text=True)
+
+        assert api_client.get(f'/api/containers/{container_id}/metrics?resolution=5m').status_code == 400
+        assert api_client.get('/api/containers/unknown/metrics').status_code == 404
+    finally:
+        usage_sampler.sample([])